@@ -0,0 +1,229 @@
+"""
+Load test the Robyn, FastAPI and Flask backends against the same seeded SQLite file.
+
+Each backend is started in its own process on a free local port, against a fresh copy of a
+seeded database, and driven by a fixed number of concurrent clients issuing a weighted mix
+of list/get/create/update/delete requests. Throughput and p50/p95/p99 latency are printed
+as a table and, with --json, written out per backend, concurrency level and operation.
+
+Run with: python benchmarks/bench_backends.py --backends robyn,fastapi,flask --concurrency 1,8,32
+
+The client is a single asyncio process, so at high concurrency it can saturate before a
+fast backend does; compare backends at the same settings rather than reading absolutes.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections.abc import Iterator
+from contextlib import closing, contextmanager
+from pathlib import Path
+from typing import Any
+
+import httpx
+from sqlalchemy.orm import Session
+
+from tasklist3000 import crud
+from tasklist3000.config import COLOR_VALUES, PRIORITY_VALUES, STATUS_VALUES
+from tasklist3000.models import Base, create_sqlite_engine
+
+# How each backend is started on a given port; the database and process count come from
+# DATABASE_URL and WORKERS
+SERVERS = {
+    "robyn": "from tasklist3000.main import create_app; create_app().start(host='127.0.0.1', port={port})",
+    "fastapi": "import uvicorn; from tasklist3000.config import WORKERS; "
+    "uvicorn.run('tasklist3000.main_fastapi:create_app', factory=True, host='127.0.0.1', port={port}, "
+    "workers=WORKERS, log_level='warning')",
+    "flask": "from tasklist3000.config import WORKERS; from tasklist3000.main_flask import create_app; "
+    "from tasklist3000.prefork import serve_prefork; serve_prefork(create_app, '127.0.0.1', {port}, WORKERS)",
+}
+OPERATIONS = ("list", "get", "create", "update", "delete")
+DEFAULT_MIX = "list=40,get=40,create=10,update=5,delete=5"
+
+
+def parse_mix(mix: str) -> dict[str, int]:
+    weights = {}
+    for item in mix.split(","):
+        name, _, weight = item.partition("=")
+        if name not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"Unknown operation in mix: {name}")  # noqa: TRY003 - benchmark script
+        weights[name] = int(weight)
+    return weights
+
+
+def make_task(rng: random.Random, n: int) -> dict[str, str]:
+    return {
+        "title": f"Task {n}",
+        "description": "Load test description",
+        "full_text": "Lorem ipsum dolor sit amet " * rng.randint(1, 40),
+        "color": rng.choice(COLOR_VALUES),
+        "priority": rng.choice(PRIORITY_VALUES),
+        "status": rng.choice(STATUS_VALUES),
+    }
+
+
+def seed_database(path: Path, rows: int) -> None:
+    engine = create_sqlite_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    rng = random.Random(0)  # noqa: S311 - repeatable test data, not security
+    with Session(engine) as db:
+        for start in range(0, rows, 1000):
+            crud.create_tasks(db, [make_task(rng, n) for n in range(start, min(start + 1000, rows))])
+    engine.dispose()
+
+
+def free_port() -> int:
+    with closing(socket.socket(socket.AF_INET, socket.SOCK_STREAM)) as s:
+        s.bind(("127.0.0.1", 0))
+        return int(s.getsockname()[1])
+
+
+@contextmanager
+def running_server(backend: str, database: Path, workers: int) -> Iterator[str]:
+    port = free_port()
+    env = {**os.environ, "DATABASE_URL": f"sqlite:///{database}", "WORKERS": str(workers)}
+    process = subprocess.Popen(  # noqa: S603 - fixed interpreter and snippet
+        [sys.executable, "-c", SERVERS[backend].format(port=port)],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                if httpx.get(f"{base_url}/status").status_code == 200:
+                    break
+            except httpx.TransportError:
+                pass
+            if process.poll() is not None or time.monotonic() > deadline:
+                raise RuntimeError(f"{backend} did not start")  # noqa: TRY003 - benchmark script
+            time.sleep(0.2)
+        yield base_url
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+async def client(
+    http: httpx.AsyncClient,
+    rng: random.Random,
+    mix: dict[str, int],
+    ids: list[int],
+    deadline: float,
+    samples: dict[str, list[float]],
+    errors: dict[str, int],
+) -> None:
+    names, weights = list(mix), list(mix.values())
+    while time.monotonic() < deadline:
+        op = rng.choices(names, weights)[0]
+        if op in ("get", "update", "delete") and not ids:
+            op = "create"
+        if op == "list":
+            request = http.get("/tasks", params={"limit": 100})
+        elif op == "get":
+            request = http.get(f"/tasks/{rng.choice(ids)}")
+        elif op == "create":
+            request = http.post("/tasks", json=make_task(rng, rng.randrange(1_000_000)))
+        elif op == "update":
+            request = http.put(f"/tasks/{rng.choice(ids)}", json={"status": rng.choice(STATUS_VALUES)})
+        else:
+            request = http.delete(f"/tasks/{ids.pop(rng.randrange(len(ids)))}")
+        started = time.perf_counter()
+        try:
+            response = await request
+            ok = response.status_code < 400
+        except httpx.HTTPError:
+            response, ok = None, False
+        elapsed = time.perf_counter() - started
+        if not ok:
+            errors[op] += 1
+            continue
+        samples[op].append(elapsed)
+        if op == "create" and response is not None:
+            ids.append(response.json()["id"])
+
+
+def summarize(latencies: list[float], duration: float) -> dict[str, float]:
+    if len(latencies) < 2:
+        return {"requests": len(latencies), "rps": len(latencies) / duration, "p50": 0.0, "p95": 0.0, "p99": 0.0}
+    cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {
+        "requests": len(latencies),
+        "rps": len(latencies) / duration,
+        "p50": cuts[49] * 1000,
+        "p95": cuts[94] * 1000,
+        "p99": cuts[98] * 1000,
+    }
+
+
+async def run_load(
+    base_url: str, concurrency: int, duration: float, mix: dict[str, int], ids: list[int]
+) -> dict[str, Any]:
+    # Clients share the id pool, so a deleted id is never picked again
+    samples: dict[str, list[float]] = {op: [] for op in mix}
+    errors = dict.fromkeys(mix, 0)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as http:
+        deadline = time.monotonic() + duration
+        await asyncio.gather(
+            *(client(http, random.Random(n), mix, ids, deadline, samples, errors) for n in range(concurrency))  # noqa: S311
+        )
+    every = [latency for op_samples in samples.values() for latency in op_samples]
+    return {
+        **summarize(every, duration),
+        "errors": sum(errors.values()),
+        "operations": {op: {**summarize(samples[op], duration), "errors": errors[op]} for op in mix},
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--backends", default=",".join(SERVERS), help="comma separated backends to test")
+    parser.add_argument("--concurrency", default="1,8,32", help="comma separated client counts")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of load per run")
+    parser.add_argument("--warmup", type=float, default=2.0, help="seconds of unrecorded load before each run")
+    parser.add_argument("--workers", type=int, default=1, help="server processes per backend, 0 for one per CPU")
+    parser.add_argument("--rows", type=int, default=10_000, help="tasks seeded before each backend starts")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX), help=f"weights, e.g. {DEFAULT_MIX}")
+    parser.add_argument("--json", dest="json_path", help="also write the results to this file")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        seeded = Path(workdir) / "seed.db"
+        seed_database(seeded, args.rows)
+        print(f"{'backend':<8} {'clients':>7} {'requests':>9} {'errors':>6} {'req/s':>9} "
+              f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+        for backend in args.backends.split(","):
+            for concurrency in (int(level) for level in args.concurrency.split(",")):
+                # Every run starts from the same data so deletes and inserts don't skew later runs
+                database = Path(workdir) / f"{backend}-{concurrency}.db"
+                shutil.copy(seeded, database)
+                ids = list(range(1, args.rows + 1))
+                with running_server(backend, database, args.workers) as base_url:
+                    if args.warmup > 0:
+                        asyncio.run(run_load(base_url, concurrency, args.warmup, args.mix, ids))
+                    result = asyncio.run(run_load(base_url, concurrency, args.duration, args.mix, ids))
+                results.append({"backend": backend, "concurrency": concurrency, **result})
+                print(f"{backend:<8} {concurrency:>7} {result['requests']:>9} {result['errors']:>6} "
+                      f"{result['rps']:>9.1f} {result['p50']:>8.2f} {result['p95']:>8.2f} {result['p99']:>8.2f}")
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps({"settings": vars(args), "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Measure the CPU cost and size saving of each response encoding and level.
+
+The payloads are built the way the endpoints build them: a 100-row list page with the
+default fields, the same page with full_text, and an NDJSON export compressed as a stream
+in the export's chunks. For every available encoding and level the script prints the
+compressed size, the ratio, and the compression time and throughput, so the levels picked
+in compression.DEFAULT_LEVELS and ROUTE_LEVELS can be checked against the tradeoff.
+
+Run with: python benchmarks/bench_compression.py
+"""
+
+import argparse
+import random
+import time
+from typing import Callable
+
+from tasklist3000 import compression, serialization
+from tasklist3000.config import COLOR_VALUES, PRIORITY_VALUES, STATUS_VALUES
+from tasklist3000.models import Task
+
+LEVELS = {"gzip": (1, 4, 6, 9), "br": (1, 4, 5, 7, 11), "zstd": (1, 3, 6, 12, 19)}
+WORDS = ("lorem", "ipsum", "dolor", "sit", "amet", "consectetur", "adipiscing", "elit", "sed", "do", "eiusmod", "tempor")
+
+
+def make_tasks(count: int) -> list[Task]:
+    rng = random.Random(0)  # noqa: S311 - repeatable test data, not security
+    return [
+        Task(
+            id=n,
+            title=f"Task {n}",
+            description=" ".join(rng.choices(WORDS, k=8)),
+            full_text=" ".join(rng.choices(WORDS, k=rng.randint(20, 400))),
+            color=rng.choice(COLOR_VALUES),
+            priority=rng.choice(PRIORITY_VALUES),
+            status=rng.choice(STATUS_VALUES),
+        )
+        for n in range(1, count + 1)
+    ]
+
+
+def best_time(run: Callable[[], bytes], repeat: int) -> tuple[float, bytes]:
+    timings, result = [], b""
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = run()
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--rows", type=int, default=10_000, help="tasks in the export payload")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per measurement, the fastest is kept")
+    args = parser.parse_args()
+
+    tasks = make_tasks(args.rows)
+    export_chunks = list(serialization.iter_ndjson(tasks))
+    payloads = {
+        "list": lambda encoding, level: compression.compress(body_list, encoding, level),
+        "list+full_text": lambda encoding, level: compression.compress(body_full, encoding, level),
+        "export": lambda encoding, level: b"".join(compression.iter_compress(export_chunks, encoding, level)),
+    }
+    body_list = serialization.dumps_tasks(tasks[:100], serialization.LIST_FIELDS)
+    body_full = serialization.dumps_tasks(tasks[:100])
+    sizes = {"list": len(body_list), "list+full_text": len(body_full), "export": sum(map(len, export_chunks))}
+
+    print(f"encodings available: {', '.join(compression.ENCODINGS)}")
+    print(f"{'payload':<15} {'encoding':<8} {'level':>5} {'bytes':>10} {'ratio':>7} {'ms':>9} {'MB/s':>8}")
+    for name, run in payloads.items():
+        print(f"{name:<15} {'identity':<8} {'':>5} {sizes[name]:>10}")
+        for encoding in compression.ENCODINGS:
+            for level in LEVELS[encoding]:
+                elapsed, body = best_time(lambda: run(encoding, level), args.repeat)  # noqa: B023
+                print(
+                    f"{name:<15} {encoding:<8} {level:>5} {len(body):>10} {sizes[name] / len(body):>7.1f} "
+                    f"{elapsed * 1000:>9.2f} {sizes[name] / elapsed / 1e6:>8.1f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Compare the string and the compact (COMPACT_ENUMS=1) storage of color, priority and status.
+
+A database is seeded with the same random tasks in each mode and vacuumed, then the script
+prints the file size and the time of queries that run on the enum indexes: a count over
+one status, the first page of a status filtered list by creation date, and a group by over
+all three columns. Last it times converting the string database to compact storage, which
+is what the first start with COMPACT_ENUMS=1 does to an existing database. COMPACT_ENUMS
+is read at import, so every measurement runs in its own interpreter.
+
+Run with: python benchmarks/bench_enum_storage.py
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable
+
+WORDS = ("lorem", "ipsum", "dolor", "sit", "amet", "consectetur", "adipiscing", "elit", "sed", "do", "eiusmod", "tempor")
+
+
+def best_time(run: Callable[[], Any], repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def seed(rows: int) -> None:
+    from sqlalchemy import insert
+    from sqlalchemy.orm import Session
+
+    from tasklist3000 import models
+    from tasklist3000.config import COLOR_VALUES, PRIORITY_VALUES, STATUS_VALUES
+    from tasklist3000.models import Task
+
+    rng = random.Random(0)  # noqa: S311 - repeatable test data, not security
+    models.Base.metadata.create_all(bind=models.engine)
+    with Session(models.engine) as db:
+        db.execute(
+            insert(Task),
+            [
+                {
+                    "title": f"Task {n}",
+                    "description": " ".join(rng.choices(WORDS, k=8)),
+                    "full_text": " ".join(rng.choices(WORDS, k=20)),
+                    "color": rng.choice(COLOR_VALUES),
+                    "priority": rng.choice(PRIORITY_VALUES),
+                    "status": rng.choice(STATUS_VALUES),
+                }
+                for n in range(rows)
+            ],
+        )
+        db.commit()
+    # VACUUM cannot run in a transaction, and the engine begins one for every statement. The
+    # checkpoint moves the pages out of the WAL, so the file size is the whole database.
+    raw = models.engine.raw_connection()
+    raw.cursor().execute("VACUUM")
+    raw.cursor().execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    raw.close()
+
+
+def measure(repeat: int) -> dict[str, float]:
+    from sqlalchemy import func, select
+    from sqlalchemy.orm import Session
+
+    from tasklist3000 import crud, models
+    from tasklist3000.models import Task
+
+    with Session(models.engine) as db:
+        queries = {
+            "count status": lambda: db.scalar(select(func.count()).where(Task.status == "In Progress")),
+            "list status": lambda: crud.list_tasks(db, order_by="-created_at", filters={"status": ["In Progress"]}),
+            "group by all": lambda: db.execute(
+                select(Task.status, Task.priority, Task.color, func.count()).group_by(
+                    Task.status, Task.priority, Task.color
+                )
+            ).all(),
+        }
+        return {name: best_time(run, repeat) for name, run in queries.items()}
+
+
+def child(command: str, rows: int, repeat: int) -> None:
+    result: dict[str, Any] = {}
+    if command == "seed":
+        seed(rows)
+    elif command == "migrate":
+        from tasklist3000 import models
+
+        started = time.perf_counter()
+        models.Base.metadata.create_all(bind=models.engine)
+        result["migrate"] = time.perf_counter() - started
+    result.update(measure(repeat))
+    print(json.dumps(result))
+
+
+def run_child(command: str, database: Path, compact: bool, args: argparse.Namespace) -> dict[str, float]:
+    env = {**os.environ, "DATABASE_URL": f"sqlite:///{database}", "COMPACT_ENUMS": "1" if compact else "0"}
+    result = subprocess.run(  # noqa: S603 - fixed interpreter and arguments
+        [sys.executable, __file__, "--child", command, "--rows", str(args.rows), "--repeat", str(args.repeat)],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return dict(json.loads(result.stdout.splitlines()[-1]))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--rows", type=int, default=200_000, help="tasks to seed")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per query, the fastest is kept")
+    parser.add_argument("--child", choices=("seed", "migrate"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args.child, args.rows, args.repeat)
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        strings, compact, converted = (Path(directory) / name for name in ("strings.db", "compact.db", "converted.db"))
+        results = {
+            "strings": run_child("seed", strings, False, args),
+            "compact": run_child("seed", compact, True, args),
+        }
+        sizes = {"strings": strings.stat().st_size, "compact": compact.stat().st_size}
+        shutil.copy(strings, converted)
+        migration = run_child("migrate", converted, True, args)
+
+    print(f"{args.rows} tasks")
+    print(f"{'storage':<10} {'bytes':>12} " + " ".join(f"{name + ' ms':>16}" for name in results["strings"]))
+    for mode, timings in results.items():
+        print(f"{mode:<10} {sizes[mode]:>12} " + " ".join(f"{elapsed * 1000:>16.2f}" for elapsed in timings.values()))
+    print(f"converting the string database to compact storage took {migration['migrate'] * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Measure the cold import cost of each backend module with python -X importtime.
+
+Every module is imported in a fresh interpreter several times and the fastest run is kept.
+For each one the script prints the cumulative import time, which web frameworks ended up
+imported, and the heaviest top-level dependencies, so a framework leaking into a module
+that should not need it shows up straight away.
+
+Run with: python benchmarks/bench_importtime.py
+"""
+
+import argparse
+import subprocess
+import sys
+
+MODULES = (
+    "tasklist3000.crud",
+    "tasklist3000.__main__",
+    "tasklist3000.main",
+    "tasklist3000.main_fastapi",
+    "tasklist3000.main_flask",
+)
+FRAMEWORKS = ("robyn", "fastapi", "flask", "uvicorn")
+
+
+def import_times(module: str) -> dict[str, tuple[int, int]]:
+    # package -> (cumulative microseconds, nesting depth); depth 0 is imported by the -c
+    # statement itself, depth 1 by those, and so on
+    result = subprocess.run(  # noqa: S603 - fixed interpreter and arguments
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, cumulative_us, name = line[len("import time:") :].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        times[name.strip()] = (int(cumulative_us), depth)
+    return times
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per module, the fastest is kept")
+    parser.add_argument("--top", type=int, default=5, help="heaviest dependencies listed per module")
+    args = parser.parse_args()
+
+    for module in MODULES:
+        runs = [import_times(module) for _ in range(args.runs)]
+        best = min(runs, key=lambda times: times[module][0])
+        frameworks = sorted(name for name in FRAMEWORKS if name in best)
+        print(f"{module:<26} {best[module][0] / 1000:>8.1f} ms   frameworks: {', '.join(frameworks) or 'none'}")
+        dependencies = [(name, cumulative) for name, (cumulative, depth) in best.items() if depth == 1]
+        for name, cumulative in sorted(dependencies, key=lambda item: -item[1])[: args.top]:
+            print(f"    {name:<30} {cumulative / 1000:>8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Compare task list encoders at 100, 1k and 10k rows.
+
+Run with: python benchmarks/bench_serialization.py
+"""
+
+import json
+import timeit
+from collections.abc import Callable
+from unittest import mock
+
+from tasklist3000 import serialization
+from tasklist3000.models import Task
+
+SIZES = (100, 1_000, 10_000)
+
+
+def make_tasks(count: int) -> list[Task]:
+    return [
+        Task(
+            id=i,
+            title=f"Task {i}",
+            description="Benchmark description",
+            full_text="Lorem ipsum dolor sit amet " * 20,
+            color="Red",
+            priority="Medium",
+            status="In Progress",
+        )
+        for i in range(count)
+    ]
+
+
+# The handlers before the shared serializer: a dict per row, then json.dumps into a str
+def legacy(tasks: list[Task]) -> str:
+    return json.dumps([serialization.serialize_task(task) for task in tasks])
+
+
+def measure(encoder: Callable[[list[Task]], object], tasks: list[Task]) -> float:
+    number = max(1, 20_000 // len(tasks))
+    timings = timeit.repeat(lambda encoder=encoder, tasks=tasks: encoder(tasks), number=number, repeat=5)
+    return min(timings) / number * 1000
+
+
+def main() -> None:
+    print(f"{'rows':>8} {'encoder':<20} {'ms/call':>10} {'speedup':>8}")
+    for size in SIZES:
+        tasks = make_tasks(size)
+        results = {"legacy json.dumps": measure(legacy, tasks)}
+        # Patch once around the timing so the fallback figures carry no patching overhead
+        with mock.patch.object(serialization, "orjson", None):
+            results["stdlib fallback"] = measure(serialization.dumps_tasks, tasks)
+        if serialization.orjson is not None:
+            results["orjson"] = measure(serialization.dumps_tasks, tasks)
+        baseline = results["legacy json.dumps"]
+        for name, elapsed in results.items():
+            print(f"{size:>8} {name:<20} {elapsed:>10.3f} {baseline / elapsed:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
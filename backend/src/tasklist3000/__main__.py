@@ -2,18 +2,127 @@
 Entry point for the tasklist3000 package.
 This allows the package to be run directly with 'python -m tasklist3000'.
 """
-from tasklist3000.config import BACKEND_FRAMEWORK
+import argparse
+import logging
+import sys
 
- # Start the Robyn app on port 8080
-if __name__ == "__main__" and BACKEND_FRAMEWORK == "robyn":
-    from tasklist3000.main import app
-    app.start("0.0.0.0", port=8080)
+from tasklist3000.config import ARCHIVE_AFTER, BACKEND_FRAMEWORK, TOMBSTONE_RETENTION
 
-# Start the FastAPI app on port 8080
-if __name__ == "__main__" and BACKEND_FRAMEWORK == "fastapi":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8080)
+parser = argparse.ArgumentParser(prog="python -m tasklist3000", description="Run the tasklist3000 backend.")
+subparsers = parser.add_subparsers(dest="command")
+export_parser = subparsers.add_parser("export", help="write every task as newline-delimited JSON")
+export_parser.add_argument("-o", "--output", default="-", help="file to write to, '-' for stdout (default)")
+export_parser.add_argument("--batch-size", type=int, default=1000, help="rows fetched per database round trip")
 
-# Start the Flask app on port 8080
-if __name__ == "__main__" and BACKEND_FRAMEWORK == "flask":
-    app.run(host="0.0.0.0", port=8080)
+subparsers.add_parser("rebuild-search", help="create the full-text search index if missing and repopulate it")
+archive_parser = subparsers.add_parser("archive", help="move completed tasks older than the given age to the archive")
+archive_parser.add_argument(
+    "--older-than", type=float, default=ARCHIVE_AFTER, help="seconds since last modified (default ARCHIVE_AFTER)"
+)
+subparsers.add_parser("reconcile-stats", help="recount the task counts behind /tasks/stats from scratch")
+prune_parser = subparsers.add_parser("prune-tombstones", help="drop deleted task records older than the retention")
+prune_parser.add_argument(
+    "--retention", type=float, default=TOMBSTONE_RETENTION, help="seconds to keep them (default TOMBSTONE_RETENTION)"
+)
+
+
+def export_tasks(output: str, batch_size: int) -> None:
+    from tasklist3000 import crud, serialization
+    from tasklist3000.models import SessionLocal, create_schema
+
+    create_schema()
+    out = sys.stdout.buffer if output == "-" else open(output, "wb")  # noqa: SIM115
+    try:
+        with SessionLocal() as db:
+            for chunk in serialization.iter_ndjson(crud.iter_tasks(db, batch_size=batch_size)):
+                out.write(chunk)
+    finally:
+        if out is not sys.stdout.buffer:
+            out.close()
+
+
+def rebuild_search() -> None:
+    from tasklist3000 import crud
+    from tasklist3000.models import SessionLocal, create_schema
+
+    create_schema()
+    with SessionLocal() as db:
+        crud.rebuild_search_index(db)
+
+
+def archive_tasks(older_than: float) -> int:
+    from tasklist3000.archive import Archiver
+    from tasklist3000.config import ARCHIVE_BATCH_SIZE
+    from tasklist3000.models import SessionLocal, create_schema
+
+    create_schema()
+    moved = Archiver(SessionLocal, older_than, ARCHIVE_BATCH_SIZE, 0, TOMBSTONE_RETENTION).run_pass()
+    logging.getLogger(__name__).info("Archived %d completed tasks", moved)
+    return moved
+
+
+def reconcile_stats() -> int:
+    from tasklist3000 import crud
+    from tasklist3000.models import SessionLocal, create_schema
+
+    create_schema()
+    with SessionLocal() as db:
+        corrected = crud.reconcile_task_stats(db)
+    logging.getLogger(__name__).info("Recounted task stats, %d counts corrected", corrected)
+    return corrected
+
+
+def prune_tombstones(retention: float) -> int:
+    from tasklist3000 import crud
+    from tasklist3000.models import SessionLocal, create_schema
+
+    create_schema()
+    with SessionLocal() as db:
+        pruned = crud.prune_tombstones(db, retention)
+    logging.getLogger(__name__).info("Pruned %d tombstones", pruned)
+    return pruned
+
+
+def serve(framework: str) -> None:
+    # Only the selected framework is imported
+    from tasklist3000.config import HOST, PORT, WORKERS
+    from tasklist3000.startup import prepare_server
+
+    prepare_server()
+    if framework == "robyn":
+        from tasklist3000.main import create_app
+
+        create_app().start(HOST, port=int(PORT))
+    elif framework == "fastapi":
+        import uvicorn
+
+        uvicorn.run("tasklist3000.main_fastapi:create_app", factory=True, host=HOST, port=int(PORT), workers=WORKERS)
+    elif framework == "flask":
+        from tasklist3000.main_flask import create_app as create_flask_app
+        from tasklist3000.prefork import serve_prefork
+
+        serve_prefork(create_flask_app, HOST, int(PORT), WORKERS)
+    else:
+        sys.exit(f"Unknown BACKEND_FRAMEWORK: {framework}")
+
+
+# Subcommands run instead of the server; unknown flags are left for the framework's own parser
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    args, _ = parser.parse_known_args()
+    if args.command == "export":
+        export_tasks(args.output, args.batch_size)
+        sys.exit(0)
+    if args.command == "rebuild-search":
+        rebuild_search()
+        sys.exit(0)
+    if args.command == "archive":
+        archive_tasks(args.older_than)
+        sys.exit(0)
+    if args.command == "reconcile-stats":
+        reconcile_stats()
+        sys.exit(0)
+    if args.command == "prune-tombstones":
+        prune_tombstones(args.retention)
+        sys.exit(0)
+    serve(BACKEND_FRAMEWORK)
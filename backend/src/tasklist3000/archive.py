@@ -0,0 +1,113 @@
+# Background archiving of completed tasks and pruning of old tombstones.
+#
+# The server runs an archive pass on a daemon thread at startup and every ARCHIVE_INTERVAL
+# after that. A pass moves completed tasks not modified for ARCHIVE_AFTER to tasks_archive
+# with crud.archive_tasks, one transaction of ARCHIVE_BATCH_SIZE tasks at a time, so a
+# request never waits on more than one batch for the write lock. Each tick then drops the
+# tombstones older than TOMBSTONE_RETENTION. The archive and prune-tombstones commands do the
+# same once, for deployments that set the interval to 0 and schedule them instead.
+#
+# The thread lives in the process that starts the server, which then forks its workers.
+# A fork waits for the batch in progress, so no worker starts with SQLite's locks held
+# by a thread it does not have.
+
+import atexit
+import logging
+import os
+import threading
+from typing import Callable, Optional
+
+from sqlalchemy.orm import Session
+
+from . import crud
+from .config import ARCHIVE_AFTER, ARCHIVE_BATCH_SIZE, ARCHIVE_INTERVAL, TOMBSTONE_RETENTION
+from .models import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+
+class Archiver:
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        older_than: float,
+        batch_size: int,
+        interval: float,
+        retention: float,
+    ) -> None:
+        self.session_factory = session_factory
+        self.older_than = older_than
+        self.batch_size = batch_size
+        self.interval = interval
+        self.retention = retention
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self._batch_lock = threading.Lock()
+
+    def run_pass(self) -> int:
+        # Batches until one comes back short; returns how many tasks moved
+        moved = 0
+        while not self._stopping.is_set():
+            with self._batch_lock, self.session_factory() as db:
+                batch = crud.archive_tasks(db, self.older_than, self.batch_size)
+            moved += batch
+            if batch < self.batch_size:
+                break
+        return moved
+
+    def prune(self) -> int:
+        with self._batch_lock, self.session_factory() as db:
+            return crud.prune_tombstones(db, self.retention)
+
+    def start(self) -> None:
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="archiver", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        # Lets the batch in progress finish
+        thread, self._thread = self._thread, None
+        self._stopping.set()
+        if thread is not None:
+            thread.join()
+
+    def before_fork(self) -> None:
+        self._batch_lock.acquire()
+
+    def after_fork_in_parent(self) -> None:
+        self._batch_lock.release()
+
+    def after_fork_in_child(self) -> None:
+        # The thread does not survive a fork; workers leave archiving to the parent
+        self._thread = None
+        self._batch_lock = threading.Lock()
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                moved = self.run_pass()
+            except Exception:
+                logger.exception("Archive pass failed")
+            else:
+                if moved:
+                    logger.info("Archived %d completed tasks", moved)
+            try:
+                pruned = self.prune()
+            except Exception:
+                logger.exception("Tombstone pruning failed")
+            else:
+                if pruned:
+                    logger.info("Pruned %d tombstones", pruned)
+            self._stopping.wait(self.interval)
+
+
+archiver = Archiver(SessionLocal, ARCHIVE_AFTER, ARCHIVE_BATCH_SIZE, ARCHIVE_INTERVAL, TOMBSTONE_RETENTION)
+atexit.register(archiver.stop)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(
+        before=archiver.before_fork,
+        after_in_parent=archiver.after_fork_in_parent,
+        after_in_child=archiver.after_fork_in_child,
+    )
@@ -0,0 +1,102 @@
+# In-process read-through cache for single task lookups.
+#
+# Entries are the serialized JSON payloads served by GET /tasks/:task_id together with
+# their ETags, so a hit costs neither a database round trip nor serialization. The cache
+# is bounded both in size (least recently used entries are evicted first) and in age
+# (entries expire after a TTL).
+# The crud write functions invalidate the ids they touch, but only in their own process, so
+# the cache is turned off when the server runs more than one worker process. The TTL bounds
+# staleness for writes made by other programs sharing the same database file.
+
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional, TypedDict
+
+from .config import TASK_CACHE_SIZE, TASK_CACHE_TTL, WORKERS
+
+
+class CachedTask(NamedTuple):
+    etag: str
+    payload: bytes
+
+
+class CacheStatsDict(TypedDict):
+    size: int
+    max_size: int
+    hits: int
+    misses: int
+    evictions: int
+
+
+class TaskCache:
+    def __init__(self, max_size: int, ttl: float) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Bumped by every invalidation so a reader that raced a write can tell its
+        # payload may be stale and skip storing it
+        self.generation = 0
+        self._entries: OrderedDict[int, tuple[float, CachedTask]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0 and self.ttl > 0
+
+    def get(self, task_id: int) -> Optional[CachedTask]:
+        with self._lock:
+            entry = self._entries.get(task_id)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    del self._entries[task_id]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(task_id)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, task_id: int, entry: CachedTask, generation: int) -> None:
+        # generation is the value read before the database lookup that produced entry
+        if not self.enabled:
+            return
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._entries[task_id] = (time.monotonic() + self.ttl, entry)
+            self._entries.move_to_end(task_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, task_id: int) -> None:
+        with self._lock:
+            self.generation += 1
+            self._entries.pop(task_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+    def disable(self) -> None:
+        # For servers that only learn their process count after the cache is built
+        with self._lock:
+            self.max_size = 0
+            self.generation += 1
+            self._entries.clear()
+
+    def stats(self) -> CacheStatsDict:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+task_cache = TaskCache(TASK_CACHE_SIZE if WORKERS == 1 else 0, TASK_CACHE_TTL)
@@ -0,0 +1,283 @@
+# Negotiated response compression shared by the three backends.
+#
+# The encoding is picked from Accept-Encoding: the client's highest q-value wins, and ties
+# go to the server's order in COMPRESSION_ENCODINGS. gzip comes with the standard library;
+# br and zstd are offered only when brotli and zstandard are installed (pip install
+# tasklist3000[compression]). Bodies below COMPRESSION_MIN_SIZE go out as they are, since
+# the headers and CPU would cost more than they save. Streamed bodies (the export) are
+# compressed chunk by chunk as they are produced; the event stream is never compressed,
+# as a compressor holding events back would defeat it.
+
+import functools
+import inspect
+import zlib
+from collections.abc import Iterable, Iterator, MutableMapping
+from typing import Any, Callable, Optional
+
+from .config import COMPRESSION_ENCODINGS, COMPRESSION_MIN_SIZE
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - exercised only without the compression extra
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - exercised only without the compression extra
+    zstandard = None  # type: ignore[assignment]
+
+# Only text formats are worth compressing
+COMPRESSIBLE_TYPES = frozenset({"application/json", "application/x-ndjson", "text/plain", "text/html"})
+
+# Levels per route, by encoding. Interactive responses are compressed on every request and
+# take a fast level; the export runs once over the whole table and is worth more CPU per
+# byte saved. See benchmarks/bench_compression.py for the tradeoff.
+DEFAULT_LEVELS = {"gzip": 4, "br": 4, "zstd": 3}
+ROUTE_LEVELS = {"/tasks/export": {"gzip": 6, "br": 5, "zstd": 6}}
+
+
+def available_encodings() -> tuple[str, ...]:
+    installed = {"gzip": True, "br": brotli is not None, "zstd": zstandard is not None}
+    return tuple(encoding for encoding in COMPRESSION_ENCODINGS if installed.get(encoding))
+
+
+ENCODINGS = available_encodings()
+
+
+def negotiate(accept_encoding: Optional[str], encodings: tuple[str, ...] = ENCODINGS) -> Optional[str]:
+    # The encoding to use, or None to send the body as is
+    if not accept_encoding or not encodings:
+        return None
+    weights: dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key.lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[name.strip().lower()] = q
+    wildcard = weights.get("*", 0.0)
+    best, best_q = None, 0.0
+    for encoding in encodings:
+        q = weights.get(encoding, wildcard)
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def compressible(content_type: Optional[str]) -> bool:
+    if not content_type:
+        return False
+    return content_type.split(";", 1)[0].strip().lower() in COMPRESSIBLE_TYPES
+
+
+def weak_etag(etag: str) -> str:
+    # A compressed body is not byte-for-byte the tagged one, so its tag is only weak;
+    # If-None-Match compares weakly, so 304s keep working
+    return etag if etag.startswith("W/") else f"W/{etag}"
+
+
+def level_for(path: str, encoding: str) -> int:
+    return ROUTE_LEVELS.get(path, DEFAULT_LEVELS)[encoding]
+
+
+def compress(body: bytes, encoding: str, level: int) -> bytes:
+    if encoding == "gzip":
+        compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+        return compressor.compress(body) + compressor.flush()
+    if encoding == "br":
+        return bytes(brotli.compress(body, quality=level))
+    if encoding == "zstd":
+        return bytes(zstandard.ZstdCompressor(level=level).compress(body))
+    raise ValueError(encoding)
+
+
+class StreamCompressor:
+    # One interface over the three incremental compressors
+    def __init__(self, encoding: str, level: int) -> None:
+        self._compress: Callable[[bytes], bytes]
+        self._finish: Callable[[], bytes]
+        if encoding == "gzip":
+            deflate = zlib.compressobj(level, zlib.DEFLATED, 31)
+            self._compress, self._finish = deflate.compress, deflate.flush
+        elif encoding == "br":
+            brotli_stream = brotli.Compressor(quality=level)
+            self._compress, self._finish = brotli_stream.process, brotli_stream.finish
+        elif encoding == "zstd":
+            zstd_stream = zstandard.ZstdCompressor(level=level).compressobj()
+            self._compress, self._finish = zstd_stream.compress, zstd_stream.flush
+        else:
+            raise ValueError(encoding)
+
+    def compress(self, chunk: bytes) -> bytes:
+        # May return nothing while the compressor fills a block
+        return bytes(self._compress(chunk))
+
+    def finish(self) -> bytes:
+        return bytes(self._finish())
+
+
+def iter_compress(chunks: Iterable[bytes], encoding: str, level: int) -> Iterator[bytes]:
+    compressor = StreamCompressor(encoding, level)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.finish()
+
+
+def _header_value(headers: list[tuple[bytes, bytes]], name: bytes) -> Optional[str]:
+    for key, value in headers:
+        if key.lower() == name:
+            return value.decode("latin-1")
+    return None
+
+
+class _CompressingSend:
+    # The send callable handed to the app for one response. The response start is held back
+    # until the first body message shows whether the body is complete (compressed whole, if
+    # big enough) or streamed (compressed as it goes).
+    def __init__(self, send: Callable, encoding: str, level: int) -> None:
+        self.send = send
+        self.encoding = encoding
+        self.level = level
+        self.start: MutableMapping[str, Any] = {}
+        self.compressor: Optional[StreamCompressor] = None
+        self.passthrough = False
+
+    async def __call__(self, message: MutableMapping[str, Any]) -> None:
+        if message["type"] == "http.response.start":
+            self.start = message
+        elif message["type"] != "http.response.body" or self.passthrough:
+            await self.send(message)
+        elif self.compressor is not None:
+            await self._send_chunk(self.compressor, message)
+        else:
+            await self._send_first(message)
+
+    async def _send_first(self, message: MutableMapping[str, Any]) -> None:
+        body, more_body = message.get("body", b""), message.get("more_body", False)
+        headers = [
+            (key, weak_etag(value.decode("latin-1")).encode("latin-1") if key.lower() == b"etag" else value)
+            for key, value in self.start.get("headers", [])
+            if key.lower() != b"content-length"
+        ]
+        if (
+            not compressible(_header_value(headers, b"content-type"))
+            or _header_value(headers, b"content-encoding") is not None
+            or (not more_body and len(body) < COMPRESSION_MIN_SIZE)
+        ):
+            self.passthrough = True
+            await self.send(self.start)
+            await self.send(message)
+            return
+        headers += [(b"content-encoding", self.encoding.encode()), (b"vary", b"Accept-Encoding")]
+        if more_body:
+            self.compressor = StreamCompressor(self.encoding, self.level)
+            body = self.compressor.compress(body)
+        else:
+            body = compress(body, self.encoding, self.level)
+            headers.append((b"content-length", str(len(body)).encode()))
+        await self.send({**self.start, "headers": headers})
+        await self.send({**message, "body": body})
+
+    async def _send_chunk(self, compressor: StreamCompressor, message: MutableMapping[str, Any]) -> None:
+        more_body = message.get("more_body", False)
+        body = compressor.compress(message.get("body", b""))
+        if not more_body:
+            body += compressor.finish()
+        # Nothing to send while the compressor fills a block
+        if body or not more_body:
+            await self.send({**message, "body": body})
+
+
+class CompressionMiddleware:
+    # Plain ASGI middleware for the FastAPI backend
+    def __init__(self, app: Callable) -> None:
+        self.app = app
+
+    async def __call__(self, scope: MutableMapping[str, Any], receive: Callable, send: Callable) -> None:
+        encoding = None
+        if scope["type"] == "http":
+            encoding = negotiate(_header_value(scope["headers"], b"accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await self.app(scope, receive, _CompressingSend(send, encoding, level_for(scope["path"], encoding)))
+
+
+def instrument_flask(app: Any) -> None:
+    from flask import Response, request
+
+    @app.after_request
+    def compress_response(response: Response) -> Response:
+        if not compressible(response.content_type) or "Content-Encoding" in response.headers:
+            return response
+        response.vary.add("Accept-Encoding")
+        encoding = negotiate(request.headers.get("Accept-Encoding"))
+        if encoding is None or response.status_code in (204, 304) or response.direct_passthrough:
+            return response
+        level = level_for(request.path, encoding)
+        if response.is_streamed:
+            response.response = iter_compress(response.iter_encoded(), encoding, level)
+            response.headers.pop("Content-Length", None)
+        else:
+            body = response.get_data()
+            if len(body) < COMPRESSION_MIN_SIZE:
+                return response
+            response.set_data(compress(body, encoding, level))
+        response.headers["Content-Encoding"] = encoding
+        if "ETag" in response.headers:
+            response.headers["ETag"] = weak_etag(response.headers["ETag"])
+        return response
+
+
+def _robyn_compressed(route: str, handler: Callable) -> Callable:
+    # Robyn responses are complete bodies, the export included
+    def finish(result: Any, request: Any) -> Any:
+        description = getattr(result, "description", None)
+        if not isinstance(description, (bytes, str)) or request is None:
+            return result
+        headers = result.headers
+        if not compressible(headers.get("Content-Type")) or headers.get("Content-Encoding"):
+            return result
+        headers.set("Vary", "Accept-Encoding")
+        encoding = negotiate(request.headers.get("accept-encoding"))
+        body = description.encode() if isinstance(description, str) else description
+        if encoding is None or result.status_code in (204, 304) or len(body) < COMPRESSION_MIN_SIZE:
+            return result
+        result.description = compress(body, encoding, level_for(route, encoding))
+        headers.set("Content-Encoding", encoding)
+        etag = headers.get("ETag")
+        if etag:
+            headers.set("ETag", weak_etag(etag))
+        return result
+
+    if inspect.iscoroutinefunction(handler):
+
+        @functools.wraps(handler)
+        async def async_compressed(*args: Any, **kwargs: Any) -> Any:
+            return finish(await handler(*args, **kwargs), kwargs.get("request"))
+
+        return async_compressed
+
+    @functools.wraps(handler)
+    def compressed(*args: Any, **kwargs: Any) -> Any:
+        return finish(handler(*args, **kwargs), kwargs.get("request"))
+
+    return compressed
+
+
+def instrument_robyn(app: Any) -> None:
+    # Wraps every handler registered from here on, like metrics.instrument_robyn; call it
+    # after that one so the compression is part of the measured handler time
+    add_route = app.add_route
+
+    def compressing_add_route(route_type: Any, endpoint: str, handler: Callable, *args: Any, **kwargs: Any) -> Any:
+        return add_route(route_type, endpoint, _robyn_compressed(endpoint, handler), *args, **kwargs)
+
+    app.add_route = compressing_add_route
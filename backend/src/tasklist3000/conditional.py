@@ -0,0 +1,32 @@
+# ETags and If-None-Match handling shared by the three backends.
+#
+# A single task is tagged from its id and modified_at, so a poll for an unchanged task can
+# be answered with 304 Not Modified. List responses are tagged from the table-level change
+# counter in tasks_version, which every insert, update and delete bumps, so an unchanged
+# list poll is answered after one primary key lookup without running the list query.
+
+import zlib
+from datetime import datetime
+from typing import Optional
+
+
+def task_etag(task_id: int, modified_at: datetime, payload: bytes) -> str:
+    # modified_at has one second resolution; the payload checksum keeps two edits
+    # within the same second from sharing a tag
+    return f'"{task_id}-{modified_at:%Y%m%d%H%M%S}-{zlib.crc32(payload):08x}"'
+
+
+def list_etag(version: int) -> str:
+    return f'"tasks-{version}"'
+
+
+def not_modified(if_none_match: Optional[str], etag: str) -> bool:
+    # If-None-Match uses the weak comparison: W/ prefixes are ignored, and the header
+    # may carry a list of tags or "*"
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
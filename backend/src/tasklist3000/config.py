@@ -4,9 +4,71 @@ BACKEND_FRAMEWORK = "robyn" # "fastapi" or "flask" or "robyn"
 
 # For Docker, use a path in /data which will be mounted as a volume
 DB_PATH = os.getenv("DATABASE_URL", "sqlite:////data/tasks.db")
+
+# SQLite engine profile, applied as PRAGMAs on every new connection.
+# WAL lets readers run while a write is in progress, and synchronous=NORMAL is durable under WAL
+# without an fsync per commit. busy_timeout comes first so the journal_mode switch waits on a lock.
+SQLITE_PRAGMAS = {
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT", "5000")),  # milliseconds
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),  # bytes
+    "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", "-65536")),  # negative means KiB
+    "temp_store": os.getenv("SQLITE_TEMP_STORE", "MEMORY"),
+}
+# Connections kept open per process for a file database
+SQLITE_POOL_SIZE = int(os.getenv("SQLITE_POOL_SIZE", "5"))
+SQLITE_MAX_OVERFLOW = int(os.getenv("SQLITE_MAX_OVERFLOW", "10"))
+
+# Serialized payloads kept by the single task lookup cache; a size or TTL of 0 disables it,
+# and so does running more than one worker process
+TASK_CACHE_SIZE = int(os.getenv("TASK_CACHE_SIZE", "1024"))
+TASK_CACHE_TTL = float(os.getenv("TASK_CACHE_TTL", "30"))  # seconds
+
+# Group commit for single task writes: up to WRITE_BATCH_SIZE creates, updates and deletes
+# arriving within WRITE_BATCH_WINDOW of each other share one transaction; a size of 0 disables it
+WRITE_BATCH_SIZE = int(os.getenv("WRITE_BATCH_SIZE", "0"))
+WRITE_BATCH_WINDOW = float(os.getenv("WRITE_BATCH_WINDOW", "0.002"))  # seconds
+
+# Change notifications at /tasks/events: events buffered per subscriber before it is dropped,
+# recent events kept for replay to reconnecting clients, the keepalive interval (also the
+# timeout of Robyn's JSON long poll) and the reconnect delay suggested to clients
+EVENTS_QUEUE_SIZE = int(os.getenv("EVENTS_QUEUE_SIZE", "256"))
+EVENTS_HISTORY = int(os.getenv("EVENTS_HISTORY", "1024"))
+EVENTS_HEARTBEAT = float(os.getenv("EVENTS_HEARTBEAT", "15"))  # seconds
+EVENTS_RETRY_MS = int(os.getenv("EVENTS_RETRY_MS", "1000"))
+
+# Tombstones of deleted tasks are kept this long for /tasks/changes; a client whose last sync
+# is older gets 410 Gone and reloads the list
+TOMBSTONE_RETENTION = float(os.getenv("TOMBSTONE_RETENTION", str(30 * 24 * 3600)))  # seconds
+
+# Completed tasks not modified for ARCHIVE_AFTER are moved to tasks_archive, in transactions
+# of ARCHIVE_BATCH_SIZE tasks, by a background thread of the server every ARCHIVE_INTERVAL,
+# which also prunes tombstones past TOMBSTONE_RETENTION; an interval of 0 leaves both to the
+# archive and prune-tombstones commands
+ARCHIVE_AFTER = float(os.getenv("ARCHIVE_AFTER", str(30 * 24 * 3600)))  # seconds
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "200"))
+ARCHIVE_INTERVAL = float(os.getenv("ARCHIVE_INTERVAL", "3600"))  # seconds
+
+# Response compression: the encodings offered, in server preference order (br and zstd need
+# the compression extra; empty disables compression), and the smallest body worth compressing
+COMPRESSION_ENCODINGS = tuple(filter(None, os.getenv("COMPRESSION_ENCODINGS", "zstd,br,gzip").split(",")))
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))  # bytes
+
+# Statements slower than this are logged, with their parameter values redacted
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
+
+# Server processes, each with its own connection pool and metrics; 0 means one
+# per CPU. Robyn's --processes and --workers flags take precedence for the Robyn backend.
+WORKERS = int(os.getenv("WORKERS", "1")) or os.cpu_count() or 1
+
 PORT="8080"
 HOST="0.0.0.0" # Listen on all interfaces
 CORS_ALLOWED_ORIGINS = ["http://localhost:5173"]
+# With COMPACT_ENUMS=1, priority, status and color are stored as their position in these lists
+# instead of the strings, so values may be appended but never reordered or removed. Switching
+# the setting converts an existing database the next time the schema is created.
+COMPACT_ENUMS = os.getenv("COMPACT_ENUMS", "0") == "1"
 PRIORITY_VALUES = ["Low", "Medium", "High"]
 STATUS_VALUES = ["Pending", "In Progress", "Completed"]
 COLOR_VALUES = ["Red", "Green", "Blue", "Yellow", "Purple"]
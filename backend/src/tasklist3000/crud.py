@@ -1,49 +1,678 @@
-from typing import Optional
+import base64
+import binascii
+import json
+from collections.abc import Iterator, Mapping
+from datetime import datetime, timedelta, timezone
+from typing import Any, NamedTuple, Optional
 
-from robyn import Request
+from sqlalchemy import (
+    Float,
+    Integer,
+    Row,
+    Select,
+    String,
+    delete,
+    event,
+    insert,
+    literal,
+    select,
+    text,
+    tuple_,
+    union_all,
+    update,
+)
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Query, Session, aliased
+from sqlalchemy.sql.elements import UnaryExpression
+from sqlalchemy.sql.operators import custom_op
 
-from .models import Task
+from . import events
+from .cache import CachedTask, task_cache
+from .conditional import task_etag
+from .config import ARCHIVE_BATCH_SIZE, COLOR_VALUES, PRIORITY_VALUES, STATUS_VALUES
+from .models import InvalidValue, Task, TaskArchive, TaskColumns, count_task_stats, create_search_index
+from .serialization import LIST_FIELDS, dumps, dumps_task, serialize_fields
+from .serialization import TASK_FIELDS as RESPONSE_FIELDS
 
+# Columns a client must supply when creating a task
+TASK_FIELDS = ("title", "description", "full_text", "color", "priority", "status")
+TASK_CHOICES = {"color": COLOR_VALUES, "priority": PRIORITY_VALUES, "status": STATUS_VALUES}
+# Columns selected by the read-only list path
+LIST_COLUMNS = tuple(getattr(Task, field) for field in RESPONSE_FIELDS)
+# Ranked full-text search; bm25 and snippet only work against the FTS5 table itself, hence raw SQL.
+# The result columns take the task column types, so enum values read back as strings
+# however they are stored.
+SEARCH_STATEMENT = text(
+    f"SELECT {', '.join('tasks.' + field for field in RESPONSE_FIELDS)}, "  # noqa: S608 - fixed column names only
+    "bm25(tasks_fts) AS rank, snippet(tasks_fts, -1, '<mark>', '</mark>', '…', 12) AS snippet "
+    "FROM tasks_fts JOIN tasks ON tasks.id = tasks_fts.rowid "
+    "WHERE tasks_fts MATCH :query ORDER BY rank LIMIT :limit OFFSET :skip"
+).columns(*(Task.__table__.c[field] for field in RESPONSE_FIELDS), rank=Float, snippet=String)
 
-def get_task(db: Session, task_id: int) -> Optional[Task]:
-    return db.query(Task).filter(Task.id == task_id).first()
 
+def get_task(db: Session, task_id: int) -> Optional[TaskColumns]:
+    # Falls through to the archive, which has the same columns
+    return db.query(Task).filter(Task.id == task_id).first() or db.get(TaskArchive, task_id)
 
-def get_tasks(db: Session, skip: int = 0, limit: int = 100) -> list[Task]:
-    return db.query(Task).offset(skip).limit(limit).all()
 
+def get_task_payload(db: Session, task_id: int, fields: tuple[str, ...] = RESPONSE_FIELDS) -> Optional[CachedTask]:
+    # Serialized task and its ETag through the read-through cache; misses are not cached.
+    # Only whole tasks are cached, a projection is read fresh every time.
+    if fields != RESPONSE_FIELDS:
+        return load_task_fields(db, task_id, fields)
+    cached = task_cache.get(task_id)
+    if cached is not None:
+        return cached
+    return load_task_payload(db, task_id)
 
-def create_task(db: Session, task: dict[str, Task]) -> Task:
+
+def load_task_payload(db: Session, task_id: int) -> Optional[CachedTask]:
+    # The miss path of get_task_payload: read, serialize and fill the cache
+    generation = task_cache.generation
+    task = get_task(db, task_id)
+    if task is None:
+        return None
+    payload = dumps_task(task)
+    cached = CachedTask(task_etag(task.id, task.modified_at, payload), payload)
+    task_cache.put(task_id, cached, generation)
+    return cached
+
+
+def load_task_fields(db: Session, task_id: int, fields: tuple[str, ...]) -> Optional[CachedTask]:
+    # Selects just the requested columns; modified_at rides along for the ETag
+    for model in (Task, TaskArchive):
+        row = db.execute(
+            select(*(getattr(model, field) for field in fields), model.modified_at).where(model.id == task_id)
+        ).first()
+        if row is not None:
+            break
+    else:
+        return None
+    payload = dumps(serialize_fields(row, fields))
+    return CachedTask(task_etag(task_id, row.modified_at, payload), payload)
+
+
+def tasks_version(db: Session) -> int:
+    # Table-level change counter kept by the tasks_version triggers
+    return int(db.execute(text("SELECT version FROM tasks_version WHERE id = 1")).scalar_one())
+
+
+# A freshly created or dropped table reuses ids, so nothing cached can still be valid
+event.listen(Task.__table__, "after_create", lambda *_args, **_kw: task_cache.clear())
+event.listen(Task.__table__, "after_drop", lambda *_args, **_kw: task_cache.clear())
+
+
+# Sort orders accepted by the list endpoints; a leading "-" means descending.
+# Every order is tie-broken on id so keyset cursors stay stable.
+ORDER_COLUMNS = {"id": Task.id, "created_at": Task.created_at, "modified_at": Task.modified_at}
+# Query parameters understood by parse_filters
+FILTER_PARAMS = (
+    "status",
+    "priority",
+    "color",
+    "created_after",
+    "created_before",
+    "modified_after",
+    "modified_before",
+)
+
+
+def parse_order(order_by: str) -> tuple[Any, bool]:
+    descending = order_by.startswith("-")
+    column = ORDER_COLUMNS.get(order_by.lstrip("-"))
+    if column is None:
+        raise InvalidValue("order_by", order_by)
+    return column, descending
+
+
+def parse_fields(value: Optional[str], default: tuple[str, ...] = RESPONSE_FIELDS) -> tuple[str, ...]:
+    # fields= is a comma separated subset of the response fields. id is always included
+    # and the fields keep their usual response order.
+    if not value:
+        return default
+    requested = {field.strip() for field in value.split(",") if field.strip()}
+    unknown = requested.difference(RESPONSE_FIELDS)
+    if unknown:
+        raise InvalidValue("fields", ", ".join(sorted(unknown)))
+    return tuple(field for field in RESPONSE_FIELDS if field == "id" or field in requested)
+
+
+def parse_flag(value: Optional[str]) -> bool:
+    # Boolean query parameters, spelled any of the ways FastAPI accepts
+    if not value:
+        return False
+    if value.lower() in ("1", "true", "yes", "on"):
+        return True
+    if value.lower() in ("0", "false", "no", "off"):
+        return False
+    raise InvalidValue("flag", value)
+
+
+def parse_filters(params: Mapping[str, Optional[str]]) -> dict[str, Any]:
+    # Turn raw query string values into list filters. Enum filters take a comma separated
+    # list of allowed values, the range filters take ISO 8601 timestamps.
+    filters: dict[str, Any] = {}
+    for field, choices in TASK_CHOICES.items():
+        raw = params.get(field)
+        if not raw:
+            continue
+        values = raw.split(",")
+        invalid = [value for value in values if value not in choices]
+        if invalid:
+            raise InvalidValue(field, ", ".join(invalid))
+        filters[field] = values
+    for name in FILTER_PARAMS[3:]:
+        raw = params.get(name)
+        if not raw:
+            continue
+        try:
+            filters[name] = datetime.fromisoformat(raw)
+        except ValueError as e:
+            raise InvalidValue(name, raw) from e
+    return filters
+
+
+# The entity the list functions query is Task, or Task aliased over both tables
+def _with_archive() -> Any:
+    names = Task.__table__.columns.keys()
+    both = union_all(*(select(*(getattr(model, name) for name in names)) for model in (Task, TaskArchive)))
+    return aliased(Task, both.subquery("tasks_with_archive"))
+
+
+def _filter(query: Query, filters: Optional[dict[str, Any]], order_by: str = "id", entity: Any = Task) -> Query:
+    if not filters:
+        return query
+    date_sort = order_by.lstrip("-") != "id"
+    for field in TASK_CHOICES:
+        if field not in filters:
+            continue
+        column: Any = getattr(entity, field)
+        if date_sort and len(filters[field]) > 1:
+            # Several values would be several index ranges merged by a temp B-tree sort.
+            # A unary + keeps SQLite off the filter index, so it walks the date index
+            # in order and stops once the page is full.
+            column = UnaryExpression(column, operator=custom_op("+"), type_=column.type)
+        query = query.filter(column.in_(filters[field]))
+    if "created_after" in filters:
+        query = query.filter(entity.created_at >= filters["created_after"])
+    if "created_before" in filters:
+        query = query.filter(entity.created_at < filters["created_before"])
+    if "modified_after" in filters:
+        query = query.filter(entity.modified_at >= filters["modified_after"])
+    if "modified_before" in filters:
+        query = query.filter(entity.modified_at < filters["modified_before"])
+    return query
+
+
+def encode_cursor(task_id: int, key: Any = None, order_by: str = "id") -> str:
+    # Opaque, URL-safe token pointing just past the given task in the given order
+    payload: dict[str, Any] = {"id": task_id}
+    if order_by != "id":
+        payload["key"] = key.isoformat() if isinstance(key, datetime) else key
+        payload["order_by"] = order_by
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+
+def decode_cursor(cursor: str, order_by: str = "id") -> tuple[int, Any]:
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        task_id = int(payload["id"])
+        key = datetime.fromisoformat(payload["key"]) if order_by != "id" else task_id
+        issued_for = payload.get("order_by", "id")
+    except (AttributeError, binascii.Error, KeyError, TypeError, ValueError) as e:
+        raise InvalidValue("cursor") from e
+    # A cursor only makes sense in the order it was issued for
+    if issued_for != order_by:
+        raise InvalidValue("cursor")
+    return task_id, key
+
+
+def next_cursor(tasks: list, limit: int, order_by: str = "id") -> Optional[str]:
+    # A short page means there is nothing left to fetch
+    if not tasks or len(tasks) < limit:
+        return None
+    last = tasks[-1]
+    column, _ = parse_order(order_by)
+    return encode_cursor(last.id, getattr(last, column.key), order_by)
+
+
+def _paginate(
+    query: Query, skip: int, limit: int, cursor: Optional[str], order_by: str, entity: Any = Task
+) -> list:
+    column, descending = parse_order(order_by)
+    column, task_id_column = getattr(entity, column.key), entity.id
+    if descending:
+        query = query.order_by(column.desc(), task_id_column.desc())
+    else:
+        query = query.order_by(column, task_id_column)
+    if cursor is not None:
+        # Keyset pagination: seek on (sort key, id) instead of scanning past skipped rows.
+        # The key is bound with the column's own type so it is stored-format compatible.
+        task_id, key = decode_cursor(cursor, order_by)
+        if column.key == "id":
+            position = task_id_column < task_id if descending else task_id_column > task_id
+        else:
+            seek = tuple_(literal(key, column.type), literal(task_id, Task.id.type))
+            position = tuple_(column, task_id_column) < seek if descending else tuple_(column, task_id_column) > seek
+        return query.filter(position).limit(limit).all()
+    return query.offset(skip).limit(limit).all()
+
+
+def get_tasks(
+    db: Session,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    order_by: str = "id",
+    filters: Optional[dict[str, Any]] = None,
+) -> list[Task]:
+    return _paginate(_filter(db.query(Task), filters, order_by), skip, limit, cursor, order_by)
+
+
+def list_tasks(
+    db: Session,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    order_by: str = "id",
+    filters: Optional[dict[str, Any]] = None,
+    fields: tuple[str, ...] = LIST_FIELDS,
+    include_archived: bool = False,
+) -> list[Row]:
+    # Read-only listing: selects just the requested columns as plain rows, so no ORM
+    # instances are built or tracked in the identity map, and full_text is neither read
+    # nor sent unless asked for. The sort column rides along when it is not one of the
+    # fields so next_cursor can read it. Archived tasks are left out unless asked for.
+    entity = _with_archive() if include_archived else Task
+    column, _ = parse_order(order_by)
+    columns = [getattr(entity, field) for field in fields]
+    if column.key not in fields:
+        columns.append(getattr(entity, column.key))
+    query = _filter(db.query(*columns), filters, order_by, entity)
+    return _paginate(query, skip, limit, cursor, order_by, entity)
+
+
+def export_statement(batch_size: int = 1000, model: Any = Task) -> Select:
+    # yield_per streams rows off a server-side cursor in batches instead of buffering the table
+    columns = (getattr(model, field) for field in RESPONSE_FIELDS)
+    return select(*columns).order_by(model.id).execution_options(yield_per=batch_size)
+
+
+def iter_tasks(db: Session, batch_size: int = 1000) -> Iterator[Row]:
+    # Every task, the archived ones after the rest
+    for model in (Task, TaskArchive):
+        yield from db.execute(export_statement(batch_size, model))
+
+
+# Delta sync. A change token is a tasks_version value: the changes since one are the tasks
+# stamped with a later change_seq plus the later tombstones. Only changes up to the version
+# read first are returned, so a write that lands between the statements is left for the
+# next call rather than risking a token past a change the response did not include.
+
+
+class ChangeTokenExpired(Exception):
+    # The token predates the pruned tombstones or is not from this database; reload the list
+    def __init__(self) -> None:
+        super().__init__("Change token expired")
+
+
+class TaskChanges(NamedTuple):
+    tasks: list[Row]
+    deleted: list[int]
+    token: str
+    more: bool
+
+
+def list_changes(db: Session, since: Optional[str], limit: int = 1000) -> TaskChanges:
+    version, pruned = db.execute(text("SELECT version, pruned FROM tasks_version WHERE id = 1")).one()
+    if not since:
+        # A first sync only learns where to start from; the client loads the list itself
+        return TaskChanges([], [], str(version), False)
+    try:
+        seq = int(since)
+    except ValueError:
+        raise InvalidValue("since", since) from None
+    if seq < pruned or seq > version:
+        raise ChangeTokenExpired()
+    limit = max(limit, 1)
+    tasks = db.execute(
+        select(*LIST_COLUMNS, Task.change_seq)
+        .where(Task.change_seq > seq, Task.change_seq <= version)
+        .order_by(Task.change_seq)
+        .limit(limit + 1)
+    ).all()
+    tombstones = db.execute(
+        text(
+            "SELECT id, change_seq FROM tasks_tombstones WHERE change_seq > :since AND change_seq <= :version "
+            "ORDER BY change_seq LIMIT :limit"
+        ),
+        {"since": seq, "version": version, "limit": limit + 1},
+    ).all()
+    # Each version stamps at most one row or tombstone, so the first limit changes of both
+    # together are exactly those up to the limit-th change_seq
+    changes = sorted([*tasks, *tombstones], key=lambda row: row.change_seq)
+    more = len(changes) > limit
+    last = changes[limit - 1].change_seq if more else version
+    return TaskChanges(
+        [row for row in tasks if row.change_seq <= last],
+        [row.id for row in tombstones if row.change_seq <= last],
+        str(last),
+        more,
+    )
+
+
+def prune_tombstones(db: Session, retention: float) -> int:
+    # Drop tombstones older than retention seconds and raise the pruned horizon to match;
+    # deleted_at is CURRENT_TIMESTAMP, UTC in SQLite's text format. The delete comes first so
+    # the transaction takes the write lock before it reads anything.
+    cutoff = (datetime.now(timezone.utc) - timedelta(seconds=retention)).strftime("%Y-%m-%d %H:%M:%S")
+    pruned = db.execute(
+        text(
+            "DELETE FROM tasks_tombstones WHERE change_seq <= "
+            "(SELECT max(change_seq) FROM tasks_tombstones WHERE deleted_at < :cutoff) RETURNING change_seq"
+        ),
+        {"cutoff": cutoff},
+    ).scalars().all()
+    if not pruned:
+        db.rollback()
+        return 0
+    db.execute(text("UPDATE tasks_version SET pruned = max(pruned, :horizon) WHERE id = 1"), {"horizon": max(pruned)})
+    db.commit()
+    return len(pruned)
+
+
+# Task counts. The tasks_stats triggers keep a count per status, priority and color
+# combination, so every breakdown is summed from those few rows rather than grouped from
+# tasks. The columns take the task column types, so compact values read back as strings.
+STATS_FIELDS = ("status", "priority", "color")
+STATS_STATEMENT = text("SELECT status, priority, color, count FROM tasks_stats WHERE count > 0").columns(
+    *(Task.__table__.c[field] for field in STATS_FIELDS), count=Integer
+)
+
+
+def parse_crosstab(value: Optional[str]) -> tuple[str, ...]:
+    # crosstab= names two or three of status, priority and color, comma separated; the
+    # counts are nested in that order
+    if not value:
+        return ()
+    fields = tuple(field.strip() for field in value.split(","))
+    unknown = [field for field in fields if field not in STATS_FIELDS]
+    if unknown:
+        raise InvalidValue("crosstab", value)
+    if len(fields) < 2 or len(set(fields)) != len(fields):
+        raise InvalidValue("crosstab", value)
+    return fields
+
+
+def _count_by(rows: list[Row], fields: tuple[str, ...]) -> dict[str, Any]:
+    # Counts nested by fields in order, with every value present, 0 included
+    def zeros(depth: int) -> dict[str, Any]:
+        if depth == len(fields) - 1:
+            return dict.fromkeys(TASK_CHOICES[fields[depth]], 0)
+        return {value: zeros(depth + 1) for value in TASK_CHOICES[fields[depth]]}
+
+    counts = zeros(0)
+    for row in rows:
+        level = counts
+        for field in fields[:-1]:
+            level = level[getattr(row, field)]
+        level[getattr(row, fields[-1])] += row.count
+    return counts
+
+
+def task_stats(db: Session, crosstab: tuple[str, ...] = ()) -> dict[str, Any]:
+    rows = list(db.execute(STATS_STATEMENT).all())
+    stats: dict[str, Any] = {"total": sum(row.count for row in rows)}
+    for field in STATS_FIELDS:
+        stats[field] = _count_by(rows, (field,))
+    if crosstab:
+        stats["crosstab"] = _count_by(rows, crosstab)
+    return stats
+
+
+def reconcile_task_stats(db: Session) -> int:
+    # Recounts tasks_stats from tasks and the archive and returns how many counts had drifted, which only
+    # happens if tasks was written with the triggers missing
+    previous = count_task_stats(db.connection())
+    current = {tuple(row[:3]): row[3] for row in db.execute(text("SELECT status, priority, color, count FROM tasks_stats"))}
+    db.commit()
+    return sum(1 for key in previous.keys() | current.keys() if previous.get(key, 0) != current.get(key, 0))
+
+
+def search_query(q: str) -> str:
+    # Quote every term so user input is matched literally instead of parsed as FTS5 syntax;
+    # the terms are ANDed and the last one also matches as a prefix for search-as-you-type
+    terms = ['"' + term.replace('"', '""') + '"' for term in q.split()]
+    if not terms:
+        raise InvalidValue("q")
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+def search_tasks(db: Session, q: str, skip: int = 0, limit: int = 20) -> list[Row]:
+    # Best bm25 matches first, each with a highlighted snippet from whichever column matched
+    return list(db.execute(SEARCH_STATEMENT, {"query": search_query(q), "skip": skip, "limit": limit}).all())
+
+
+def rebuild_search_index(db: Session) -> None:
+    # Creates the index on databases that predate it and repopulates it from tasks
+    create_search_index(db.connection())
+    db.execute(text("INSERT INTO tasks_fts(tasks_fts) VALUES ('rebuild')"))
+    db.commit()
+
+
+# The stage_* functions make a write in the session's current transaction without
+# committing it, so the write queue can group several into one commit; create_task,
+# update_task and delete_task commit each one on its own. The ids a transaction touched are
+# dropped from the task cache once it commits, never before, so a concurrent read cannot
+# cache the old row again, and the changes are published to /tasks/events subscribers.
+
+
+def mark_changed(db: Session, change: str, task_id: int) -> None:
+    # change is the event type published once the transaction commits
+    db.info.setdefault("task_changes", []).append((change, task_id))
+
+
+def publish_changes(session: Session) -> None:
+    changes = session.info.pop("task_changes", None)
+    if not changes:
+        return
+    for _, task_id in changes:
+        task_cache.invalidate(task_id)
+    events.broker.publish(changes)
+
+
+# after_rollback only fires for a real rollback, not for a savepoint released by a failed
+# write, so the writes that stay in a group commit keep their changes
+event.listen(Session, "after_commit", publish_changes)
+event.listen(Session, "after_rollback", lambda session: session.info.pop("task_changes", None))
+
+
+def stage_create_task(db: Session, task: dict[str, Any]) -> Optional[Task]:
+    # None if the task is not valid, so nothing that cannot be read back is written
+    if validate_task(task) is not None:
+        return None
     # Create a copy of the task data and remove the id field to let the database auto-assign it
     task_data = {k: v for k, v in task.items() if k != 'id'}
     db_task = Task(**task_data)
     db.add(db_task)
     try:
-        db.commit()
-        db.refresh(db_task)
+        db.flush()
     except IntegrityError as e:
-        db.rollback()
         raise ValueError("Task creation failed due to missing required fields") from e
+    mark_changed(db, "created", db_task.id)
+    return db_task
+
+
+def create_task(db: Session, task: dict[str, Any]) -> Optional[Task]:
+    try:
+        db_task = stage_create_task(db, task)
+        db.commit()
+    except ValueError:
+        db.rollback()
+        raise
+    if db_task is not None:
+        db.refresh(db_task)
     return db_task
 
 
-def update_task(db: Session, task_id: int, task: dict[str, Request]) -> Optional[Task]:
-    db_task = get_task(db, task_id)
-    if db_task is None:
+def validate_task(task: object, partial: bool = False) -> Optional[str]:
+    # Return a human readable reason the task cannot be written, or None if it is valid. A
+    # partial task is an update: only the writable fields it carries are checked, anything
+    # else in it is ignored rather than rejected.
+    if not isinstance(task, dict):
+        return "Task must be an object"
+    fields = [field for field in TASK_FIELDS if field in task]
+    if not partial:
+        unknown = sorted(set(task) - set(TASK_FIELDS) - {"id"})
+        if unknown:
+            return f"Unknown fields: {', '.join(unknown)}"
+        missing = [field for field in TASK_FIELDS if task.get(field) is None]
+        if missing:
+            return f"Missing required fields: {', '.join(missing)}"
+    not_text = [field for field in fields if not isinstance(task[field], str)]
+    if not_text:
+        return f"Fields must be strings: {', '.join(not_text)}"
+    for field, choices in TASK_CHOICES.items():
+        if field in task and task[field] not in choices:
+            return f"Invalid {field}: {task[field]}"
+    return None
+
+
+def stage_create_tasks(db: Session, tasks: list[dict]) -> tuple[list[Optional[int]], dict[int, str]]:
+    # Validate the whole batch up front, then insert the valid rows with a single
+    # executemany. Returns the new ids in input order (None for rejected items) and the
+    # rejection reason per input index.
+    if not isinstance(tasks, list):
+        raise InvalidValue("tasks", "expected a list")
+    ids: list[Optional[int]] = [None] * len(tasks)
+    errors: dict[int, str] = {}
+    rows: list[dict] = []
+    positions: list[int] = []
+    for index, task in enumerate(tasks):
+        error = validate_task(task)
+        if error is not None:
+            errors[index] = error
+            continue
+        rows.append({field: task[field] for field in TASK_FIELDS})
+        positions.append(index)
+    if not rows:
+        return ids, errors
+    result = db.execute(insert(Task).returning(Task.id, sort_by_parameter_order=True), rows)
+    new_ids = result.scalars().all()
+    for index, task_id in zip(positions, new_ids):
+        ids[index] = task_id
+        mark_changed(db, "created", task_id)
+    return ids, errors
+
+
+def create_tasks(db: Session, tasks: list[dict]) -> tuple[list[Optional[int]], dict[int, str]]:
+    # All the valid rows in one transaction
+    try:
+        created = stage_create_tasks(db, tasks)
+        db.commit()
+    except BaseException:
+        # Never leave a half-inserted batch behind for a later commit to persist
+        db.rollback()
+        raise
+    return created
+
+
+def stage_update_task(db: Session, task_id: int, task: dict[str, Any]) -> Optional[TaskColumns]:
+    # One UPDATE ... RETURNING round trip. Only the writable columns are set, anything else
+    # the client sends back (id included) is ignored, and modified_at is bumped by the
+    # column's onupdate in the same statement. No returned row means the task is archived
+    # or does not exist; an archived one is moved back and updated. None as well if the
+    # values are not valid.
+    if validate_task(task, partial=True) is not None:
         return None
-    for key, value in task.items():
-        setattr(db_task, key, value)
+    values = {key: value for key, value in task.items() if key in TASK_FIELDS}
+    if not values:
+        return get_task(db, task_id)
+    statement = (
+        update(Task)
+        .where(Task.id == task_id)
+        .values(values)
+        .returning(Task)
+        .execution_options(populate_existing=True)
+    )
+    db_task = db.execute(statement).scalar_one_or_none()
+    if db_task is None and restore_task(db, task_id):
+        db_task = db.execute(statement).scalar_one_or_none()
+    if db_task is not None:
+        mark_changed(db, "updated", task_id)
+    return db_task
+
+
+def update_task(db: Session, task_id: int, task: dict[str, Any]) -> Optional[TaskColumns]:
+    db_task = stage_update_task(db, task_id, task)
     db.commit()
-    db.refresh(db_task)
     return db_task
 
 
-def delete_task(db: Session, task_id: int) -> bool:
-    db_task = get_task(db, task_id)
-    if db_task is None:
+def stage_delete_task(db: Session, task_id: int) -> bool:
+    # One DELETE ... RETURNING round trip; the returned id is the not-found check. A task
+    # that is not in tasks may be in the archive.
+    deleted = db.execute(delete(Task).where(Task.id == task_id).returning(Task.id)).first()
+    if deleted is None:
+        deleted = db.execute(delete(TaskArchive).where(TaskArchive.id == task_id).returning(TaskArchive.id)).first()
+    if deleted is None:
         return False
-    db.delete(db_task)
+    mark_changed(db, "deleted", task_id)
+    return True
+
+
+def delete_task(db: Session, task_id: int) -> bool:
+    deleted = stage_delete_task(db, task_id)
     db.commit()
+    return deleted
+
+
+# Archiving. Completed tasks that have not been modified for a while move to tasks_archive
+# under the same ids, which AUTOINCREMENT keeps from being handed out again, so get_task
+# can fall through to the archive on a miss. Leaving tasks goes through its delete
+# triggers: the version moves, delta sync clients get a tombstone and the search index
+# drops the task. Updating an archived task moves it back, deleting one deletes it there.
+ARCHIVED_STATUS = "Completed"
+ARCHIVE_COLUMNS = tuple(Task.__table__.columns.keys())
+
+
+def archive_tasks(db: Session, older_than: float, batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    # Moves up to batch_size completed tasks unmodified for older_than seconds, the longest
+    # untouched first, in one transaction; returns how many moved. The batch is picked off
+    # ix_tasks_status_modified_at and by the DELETE itself, so concurrent runs never move
+    # a task twice.
+    cutoff = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(seconds=older_than)
+    batch = (
+        select(Task.id)
+        .where(Task.status == ARCHIVED_STATUS, Task.modified_at < cutoff)
+        .order_by(Task.modified_at)
+        .limit(batch_size)
+    )
+    statement = (
+        delete(Task)
+        .where(Task.id.in_(batch.scalar_subquery()))
+        .returning(*(getattr(Task, name) for name in ARCHIVE_COLUMNS))
+        .execution_options(synchronize_session=False)
+    )
+    moved = db.execute(statement).all()
+    if moved:
+        db.execute(insert(TaskArchive), [row._asdict() for row in moved])
+    for row in moved:
+        mark_changed(db, "archived", row.id)
+    db.commit()
+    return len(moved)
+
+
+def restore_task(db: Session, task_id: int) -> bool:
+    # Moves an archived task back to tasks without committing; False if it is not archived
+    statement = (
+        delete(TaskArchive)
+        .where(TaskArchive.id == task_id)
+        .returning(*(getattr(TaskArchive, name) for name in ARCHIVE_COLUMNS))
+    )
+    row = db.execute(statement).first()
+    if row is None:
+        return False
+    db.execute(insert(Task), [row._asdict()])
     return True
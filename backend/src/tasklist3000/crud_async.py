@@ -0,0 +1,98 @@
+# Async variants of the crud functions for the Robyn and FastAPI backends.
+#
+# Each one runs the matching sync function from crud through AsyncSession.run_sync,
+# so the query logic lives in one place while the I/O goes through the aiosqlite
+# driver thread and the event loop stays free to serve other requests. Writes go through
+# write_queue.run_async, so with group commit enabled they are queued and db goes unused.
+
+from collections.abc import AsyncIterator
+from typing import Any, Optional
+
+from sqlalchemy import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import crud
+from .cache import CachedTask, task_cache
+from .models import Task, TaskArchive, TaskColumns
+from .serialization import LIST_FIELDS, TASK_FIELDS
+from .writequeue import write_queue
+
+
+async def get_task(db: AsyncSession, task_id: int) -> Optional[TaskColumns]:
+    return await db.run_sync(crud.get_task, task_id)
+
+
+async def get_task_payload(
+    db: AsyncSession, task_id: int, fields: tuple[str, ...] = TASK_FIELDS
+) -> Optional[CachedTask]:
+    # Answer hits without handing off to the driver thread
+    if fields != TASK_FIELDS:
+        return await db.run_sync(crud.load_task_fields, task_id, fields)
+    cached = task_cache.get(task_id)
+    if cached is not None:
+        return cached
+    return await db.run_sync(crud.load_task_payload, task_id)
+
+
+async def tasks_version(db: AsyncSession) -> int:
+    return await db.run_sync(crud.tasks_version)
+
+
+async def get_tasks(
+    db: AsyncSession,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    order_by: str = "id",
+    filters: Optional[dict[str, Any]] = None,
+) -> list[Task]:
+    return await db.run_sync(crud.get_tasks, skip, limit, cursor, order_by, filters)
+
+
+async def list_tasks(
+    db: AsyncSession,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    order_by: str = "id",
+    filters: Optional[dict[str, Any]] = None,
+    fields: tuple[str, ...] = LIST_FIELDS,
+    include_archived: bool = False,
+) -> list[Row]:
+    return await db.run_sync(crud.list_tasks, skip, limit, cursor, order_by, filters, fields, include_archived)
+
+
+async def iter_tasks(db: AsyncSession, batch_size: int = 1000) -> AsyncIterator[Row]:
+    # Generators cannot go through run_sync, so stream the shared statements directly
+    for model in (Task, TaskArchive):
+        result = await db.stream(crud.export_statement(batch_size, model))
+        async for row in result:
+            yield row
+
+
+async def list_changes(db: AsyncSession, since: Optional[str], limit: int = 1000) -> crud.TaskChanges:
+    return await db.run_sync(crud.list_changes, since, limit)
+
+
+async def task_stats(db: AsyncSession, crosstab: tuple[str, ...] = ()) -> dict[str, Any]:
+    return await db.run_sync(crud.task_stats, crosstab)
+
+
+async def search_tasks(db: AsyncSession, q: str, skip: int = 0, limit: int = 20) -> list[Row]:
+    return await db.run_sync(crud.search_tasks, q, skip, limit)
+
+
+async def create_task(db: AsyncSession, task: dict) -> Optional[Task]:
+    return await write_queue.run_async(db, crud.stage_create_task, task)
+
+
+async def create_tasks(db: AsyncSession, tasks: list[dict]) -> tuple[list[Optional[int]], dict[int, str]]:
+    return await write_queue.run_async(db, crud.stage_create_tasks, tasks)
+
+
+async def update_task(db: AsyncSession, task_id: int, task: dict) -> Optional[TaskColumns]:
+    return await write_queue.run_async(db, crud.stage_update_task, task_id, task)
+
+
+async def delete_task(db: AsyncSession, task_id: int) -> bool:
+    return await write_queue.run_async(db, crud.stage_delete_task, task_id)
@@ -0,0 +1,219 @@
+# In-process change notifications behind GET /tasks/events.
+#
+# Every committed create, update and delete is published to the broker by the crud commit
+# hook, whichever backend, thread or write queue made it. Each event gets the next number
+# of a per-process sequence, which is sent as the server-sent event id, so a reconnecting
+# EventSource reports the last one it saw in Last-Event-ID and the events it missed are
+# replayed from a short history. A client too far behind, or coming from another process
+# or an earlier run, gets a single "reset" event instead and should reload the list.
+#
+# Subscribers each have a bounded queue. One that falls further behind than that is
+# dropped rather than slowing down the writers or buffering without limit; its stream
+# ends and the EventSource reconnects and catches up through the replay above. Events only
+# reach subscribers of the process that made the write.
+#
+# Robyn cannot stream a response, so there /tasks/events is a JSON long poll rather than an
+# event stream: see poll for the contract.
+
+import abc
+import asyncio
+import contextlib
+import json
+import threading
+from collections import deque
+from collections.abc import AsyncIterator, Iterator
+from typing import NamedTuple, Optional
+
+from .config import EVENTS_HEARTBEAT, EVENTS_HISTORY, EVENTS_QUEUE_SIZE, EVENTS_RETRY_MS
+
+CONTENT_TYPE = "text/event-stream"
+KEEPALIVE = b": keepalive\n\n"
+
+
+class TaskEvent(NamedTuple):
+    id: int
+    type: str  # "created", "updated", "deleted", "archived" or "reset"
+    task_id: Optional[int]
+
+
+def format_event(event: TaskEvent) -> bytes:
+    data = "{}" if event.task_id is None else f'{{"id": {event.task_id}}}'
+    return f"id: {event.id}\nevent: {event.type}\ndata: {data}\n\n".encode()
+
+
+def stream_preamble(sequence: int) -> bytes:
+    # The reconnect delay, and the current position so a client that sees no events
+    # before reconnecting still resumes from here
+    return f"retry: {EVENTS_RETRY_MS}\nid: {sequence}\n\n".encode()
+
+
+def parse_last_event_id(value: Optional[str]) -> Optional[int]:
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
+
+
+class Subscription(abc.ABC):
+    def __init__(self, max_queued: int) -> None:
+        self.max_queued = max_queued
+        self.dropped = False
+        self._events: deque[TaskEvent] = deque()
+
+    def deliver(self, event: TaskEvent) -> bool:
+        # Called by the broker with its lock held; False drops the subscriber
+        if len(self._events) >= self.max_queued:
+            self.dropped = True
+            self._events.clear()
+        else:
+            self._events.append(event)
+        self._wake()
+        return not self.dropped
+
+    def drain(self) -> list[TaskEvent]:
+        events = []
+        while self._events:
+            events.append(self._events.popleft())
+        return events
+
+    @abc.abstractmethod
+    def _wake(self) -> None:
+        """Let the waiting reader know there are events to drain."""
+
+
+class AsyncSubscription(Subscription):
+    # Publishers may run on any thread, so the event loop is woken thread-safely
+    def __init__(self, max_queued: int) -> None:
+        super().__init__(max_queued)
+        self._loop = asyncio.get_running_loop()
+        self._ready = asyncio.Event()
+
+    def _wake(self) -> None:
+        try:
+            self._loop.call_soon_threadsafe(self._ready.set)
+        except RuntimeError:
+            # The loop is closed, nobody is listening any more
+            self.dropped = True
+
+    async def wait(self, timeout: float) -> list[TaskEvent]:
+        # Events queued so far, waiting up to timeout for the first one
+        if not self._events and not self.dropped:
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._ready.wait(), timeout)
+        self._ready.clear()
+        return self.drain()
+
+
+class SyncSubscription(Subscription):
+    def __init__(self, max_queued: int) -> None:
+        super().__init__(max_queued)
+        self._ready = threading.Event()
+
+    def _wake(self) -> None:
+        self._ready.set()
+
+    def wait(self, timeout: float) -> list[TaskEvent]:
+        if not self._events and not self.dropped:
+            self._ready.wait(timeout)
+        self._ready.clear()
+        return self.drain()
+
+
+class EventBroker:
+    def __init__(self, history: int, max_queued: int) -> None:
+        self.max_queued = max_queued
+        self.sequence = 0
+        self.dropped = 0
+        self._history: deque[TaskEvent] = deque(maxlen=history)
+        self._subscribers: set[Subscription] = set()
+        self._lock = threading.Lock()
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+    def publish(self, changes: list[tuple[str, int]]) -> None:
+        # changes are (event type, task id) pairs in commit order
+        with self._lock:
+            for change, task_id in changes:
+                self.sequence += 1
+                event = TaskEvent(self.sequence, change, task_id)
+                self._history.append(event)
+                for subscription in list(self._subscribers):
+                    if not subscription.deliver(event):
+                        self._subscribers.discard(subscription)
+                        self.dropped += 1
+
+    def subscribe(self, subscription: Subscription, last_event_id: Optional[int] = None) -> int:
+        # Registers the subscription, queues whatever it missed since last_event_id, and
+        # returns the current sequence number
+        with self._lock:
+            if last_event_id is not None and last_event_id != self.sequence:
+                missed = [event for event in self._history if event.id > last_event_id]
+                complete = bool(missed) and missed[0].id == last_event_id + 1
+                if last_event_id < self.sequence and complete and len(missed) < subscription.max_queued:
+                    for event in missed:
+                        subscription.deliver(event)
+                else:
+                    subscription.deliver(TaskEvent(self.sequence, "reset", None))
+            self._subscribers.add(subscription)
+            return self.sequence
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+
+broker = EventBroker(EVENTS_HISTORY, EVENTS_QUEUE_SIZE)
+
+
+async def aiter_stream(last_event_id: Optional[int] = None, heartbeat: float = EVENTS_HEARTBEAT) -> AsyncIterator[bytes]:
+    # The event stream for an async backend; the keepalive comments also let the server
+    # notice a client that has gone away
+    subscription = AsyncSubscription(broker.max_queued)
+    sequence = broker.subscribe(subscription, last_event_id)
+    try:
+        yield stream_preamble(sequence)
+        while not subscription.dropped:
+            events = await subscription.wait(heartbeat)
+            yield b"".join(map(format_event, events)) or KEEPALIVE
+    finally:
+        broker.unsubscribe(subscription)
+
+
+def iter_stream(last_event_id: Optional[int] = None, heartbeat: float = EVENTS_HEARTBEAT) -> Iterator[bytes]:
+    # The same for a threaded server, holding its worker thread for as long as it lasts
+    subscription = SyncSubscription(broker.max_queued)
+    sequence = broker.subscribe(subscription, last_event_id)
+    try:
+        yield stream_preamble(sequence)
+        while not subscription.dropped:
+            events = subscription.wait(heartbeat)
+            yield b"".join(map(format_event, events)) or KEEPALIVE
+    finally:
+        broker.unsubscribe(subscription)
+
+
+def format_poll(sequence: int, events: list[TaskEvent]) -> bytes:
+    last_event_id = events[-1].id if events else sequence
+    return json.dumps(
+        {
+            "last_event_id": last_event_id,
+            "events": [{"id": event.id, "type": event.type, "task_id": event.task_id} for event in events],
+        }
+    ).encode()
+
+
+async def poll(last_event_id: Optional[int] = None, timeout: float = EVENTS_HEARTBEAT) -> bytes:
+    # For servers without streaming responses: waits up to timeout for events and returns a
+    # JSON body of {"last_event_id": N, "events": [{"id", "type", "task_id"}, ...]}. The
+    # events list is empty when the timeout passed quietly. The client polls again at once
+    # with the last_event_id it got, and anything published in between is replayed, or a
+    # "reset" event (task_id null) tells it to reload the list.
+    subscription = AsyncSubscription(broker.max_queued)
+    sequence = broker.subscribe(subscription, last_event_id)
+    try:
+        events = await subscription.wait(timeout)
+    finally:
+        broker.unsubscribe(subscription)
+    return format_poll(sequence, events)
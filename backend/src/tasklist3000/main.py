@@ -1,18 +1,31 @@
 # robyn implementation
 
+import functools
 import json
-from typing import Any, List, TypedDict
+import logging
+from collections.abc import Callable
+from typing import Any, Optional, TypedDict
+from urllib.parse import unquote_plus
 
-from robyn import ALLOW_CORS, Request, Robyn
+from robyn import ALLOW_CORS, Request, Response, Robyn
 
-from tasklist3000 import crud
-from tasklist3000.config import HOST, PORT, CORS_ALLOWED_ORIGINS, COLOR_VALUES, PRIORITY_VALUES, STATUS_VALUES
-from tasklist3000.models import Base, SessionLocal, Task, engine
+from tasklist3000 import compression, conditional, crud, crud_async, events, metrics, serialization
+from tasklist3000.cache import task_cache
+from tasklist3000.config import HOST, PORT, WORKERS, CORS_ALLOWED_ORIGINS, COLOR_VALUES, PRIORITY_VALUES, STATUS_VALUES
+from tasklist3000.models import AsyncSessionLocal
+from tasklist3000.startup import prepare_server
 
-app = Robyn(__file__)
-ALLOW_CORS(app, origins=CORS_ALLOWED_ORIGINS)
+# Handlers are collected here on import and only attached to an app by create_app, so
+# importing this module neither builds a Robyn app nor touches the database
+ROUTES: list[tuple[str, str, Callable]] = []
 
-Base.metadata.create_all(bind=engine)
+
+def route(method: str, endpoint: str) -> Callable[[Callable], Callable]:
+    def register(handler: Callable) -> Callable:
+        ROUTES.append((method, endpoint, handler))
+        return handler
+
+    return register
 
 
 class TaskNotFoundException(Exception):
@@ -31,20 +44,52 @@ class TaskNotUpdatedException(Exception):
     pass
 
 
-class TaskDict(TypedDict):
-    id: int
-    title: str
-    description: str
-    status: str
-    priority: str
-    color: str
-    full_text: str
+class InvalidQueryException(Exception):
+    pass
+
+
+class InvalidSearchQueryException(Exception):
+    pass
+
+
+# The status each exception is answered with, as the Flask backend does
+ERROR_STATUS: dict[type[Exception], int] = {
+    TaskNotFoundException: 404,
+    TaskNotAddedException: 400,
+    TaskIdMissingException: 400,
+    TaskNotUpdatedException: 400,
+    InvalidQueryException: 400,
+    InvalidSearchQueryException: 400,
+}
+
+
+def answer_errors(handler: Callable) -> Callable:
+    # Robyn answers any exception with a 500. Its app-wide exception handler runs outside the
+    # metrics wrapper, which would still count a 500, so each handler is wrapped instead.
+    @functools.wraps(handler)
+    async def answered(*args: Any, **kwargs: Any) -> Any:
+        try:
+            return await handler(*args, **kwargs)
+        except tuple(ERROR_STATUS) as e:
+            return Response(
+                status_code=ERROR_STATUS[type(e)],
+                headers={"Content-Type": "application/json"},
+                description=serialization.dumps({"error": str(e)}),
+            )
+
+    return answered
+
+
+def query_param(request: Request, name: str) -> str:
+    # Robyn passes query values on still form-encoded, so "In Progress" arrives as
+    # "In+Progress" and commas, colons and base64 padding as %2C, %3A and %3D
+    return unquote_plus(request.query_params.get(name) or "")
 
 
 class ConfigDict(TypedDict):
-    priority_values: List[Any]
-    status_values: List[Any]
-    color_values: List[Any]
+    priority_values: list[Any]
+    status_values: list[Any]
+    color_values: list[Any]
 
 
 class AddTaskResponseDict(TypedDict):
@@ -53,60 +98,96 @@ class AddTaskResponseDict(TypedDict):
     id: int
 
 
-class UpdateTaskResponseDict(TypedDict):
+class TaskErrorDict(TypedDict):
+    index: int
+    error: str
+
+
+class AddTasksResponseDict(TypedDict):
     description: str
+    status_code: int
+    ids: list[Optional[int]]
+    errors: list[TaskErrorDict]
 
 
-class DeleteTaskResponseDict(TypedDict):
+class UpdateTaskResponseDict(TypedDict):
     description: str
 
 
-# Return a dictionary with all task fields.
-def serialize_task(task: Task) -> TaskDict:
-    return {
-        "id": task.id,
-        "title": task.title,
-        "description": task.description,
-        "status": task.status,
-        "priority": task.priority,
-        "color": task.color,
-        "full_text": task.full_text,
-    }
+class DeleteTaskResponseDict(TypedDict):
+    description: str
 
 
 # Define the root endpoint
-@app.get("/")
+@route("GET", "/")
 async def root(request: Request) -> str:
     return "Hello, world!"
 
 
 # Define the status endpoint (renamed to avoid duplicate function names)
-@app.get("/status")
+@route("GET", "/status")
 async def status_endpoint(request: Request) -> str:
     return "Up and running"
 
 
-@app.get("/config")
+@route("GET", "/config")
 async def get_config(request: Request) -> ConfigDict:
     return {"priority_values": PRIORITY_VALUES, "status_values": STATUS_VALUES, "color_values": COLOR_VALUES}
 
 
-@app.get("/tasks")
-async def get_tasks(request: Request) -> List[TaskDict]:
-    with SessionLocal() as db:
-        # Force fallback in case query_params returns None.
-        skip = int(request.query_params.get("skip") or "0")
-        limit = int(request.query_params.get("limit") or "100")
-        tasks = crud.get_tasks(db, skip=skip, limit=limit)
-    tasks_serialized = [serialize_task(task) for task in tasks]
-    return json.dumps(tasks_serialized)
+# Request counts, latencies and cache counters in Prometheus text format
+@route("GET", "/metrics")
+async def get_metrics(request: Request) -> Response:
+    return Response(
+        status_code=200,
+        headers={"Content-Type": metrics.CONTENT_TYPE},
+        description=metrics.request_metrics.render(),
+    )
+
+
+@route("GET", "/tasks")
+async def get_tasks(request: Request) -> Response:
+    async with AsyncSessionLocal() as db:
+        # The version is read first, in the same read transaction as the list, so the tag
+        # never claims a newer state than the body carries
+        etag = conditional.list_etag(await crud_async.tasks_version(db))
+        if conditional.not_modified(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers={"ETag": etag}, description=b"")
+        cursor = query_param(request, "cursor") or None
+        order_by = query_param(request, "order_by") or "id"
+        try:
+            # Force fallback in case query_params returns None.
+            skip = int(query_param(request, "skip") or "0")
+            limit = int(query_param(request, "limit") or "100")
+            fields = crud.parse_fields(query_param(request, "fields"), serialization.LIST_FIELDS)
+            filters = crud.parse_filters({name: query_param(request, name) for name in crud.FILTER_PARAMS})
+            include_archived = crud.parse_flag(query_param(request, "include_archived"))
+            tasks = await crud_async.list_tasks(
+                db,
+                skip=skip,
+                limit=limit,
+                cursor=cursor,
+                order_by=order_by,
+                filters=filters,
+                fields=fields,
+                include_archived=include_archived,
+            )
+        except ValueError as e:
+            raise InvalidQueryException(str(e)) from e
+    # The next page cursor travels in a header so the body stays a plain list
+    headers = {"Content-Type": "application/json", "ETag": etag}
+    next_cursor = crud.next_cursor(tasks, limit, order_by)
+    if next_cursor is not None:
+        headers["X-Next-Cursor"] = next_cursor
+    return Response(status_code=200, headers=headers, description=serialization.dumps_tasks(tasks, fields))
+
 
 # Endpoint to create a new task
-@app.post("/tasks")
+@route("POST", "/tasks")
 async def add_task(request: Request) -> AddTaskResponseDict:
-    with SessionLocal() as db:
+    async with AsyncSessionLocal() as db:
         task_data = request.json()
-        insertion = crud.create_task(db, task_data)
+        insertion = await crud_async.create_task(db, task_data)
 
     if insertion is None:
         raise TaskNotAddedException("Task not added")
@@ -118,51 +199,178 @@ async def add_task(request: Request) -> AddTaskResponseDict:
     }
 
 
+# Endpoint to create many tasks in a single transaction
+@route("POST", "/tasks/bulk")
+async def add_tasks(request: Request) -> AddTasksResponseDict:
+    # request.json() only accepts JSON objects, so parse the array body directly
+    task_data = json.loads(request.body)
+    async with AsyncSessionLocal() as db:
+        try:
+            ids, errors = await crud_async.create_tasks(db, task_data)
+        except ValueError as e:
+            raise TaskNotAddedException(str(e)) from e
+
+    return {
+        "description": f"{len(task_data) - len(errors)} tasks added successfully",
+        "status_code": 200,
+        "ids": ids,  # New task IDs in request order, null for rejected items
+        "errors": [{"index": index, "error": error} for index, error in errors.items()],
+    }
+
+
+# Endpoint to search task text, best matches first
+@route("GET", "/tasks/search")
+async def search_tasks(request: Request) -> Response:
+    q = query_param(request, "q") or ""
+    skip = int(query_param(request, "skip") or "0")
+    limit = int(query_param(request, "limit") or "20")
+    async with AsyncSessionLocal() as db:
+        try:
+            results = await crud_async.search_tasks(db, q, skip=skip, limit=limit)
+        except ValueError as e:
+            raise InvalidSearchQueryException(str(e)) from e
+    return Response(
+        status_code=200,
+        headers={"Content-Type": "application/json"},
+        description=serialization.dumps_search_results(results),
+    )
+
+
+# Endpoint to export every task as newline-delimited JSON
+@route("GET", "/tasks/export")
+async def export_tasks(request: Request) -> Response:
+    # Robyn has no streaming response body, so the chunks are read off the server-side
+    # cursor and joined once; no per-task dicts or intermediate list are kept around
+    async with AsyncSessionLocal() as db:
+        chunks = [chunk async for chunk in serialization.aiter_ndjson(crud_async.iter_tasks(db))]
+    return Response(status_code=200, headers={"Content-Type": "application/x-ndjson"}, description=b"".join(chunks))
+
+
+# Endpoint to count tasks by status, priority and color, optionally cross-tabulated
+@route("GET", "/tasks/stats")
+async def task_stats(request: Request) -> Response:
+    try:
+        fields = crud.parse_crosstab(query_param(request, "crosstab"))
+    except ValueError as e:
+        raise InvalidQueryException(str(e)) from e
+    async with AsyncSessionLocal() as db:
+        # Any write can change the counts, so they are tagged from the change counter like the list
+        etag = conditional.list_etag(await crud_async.tasks_version(db))
+        if conditional.not_modified(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers={"ETag": etag}, description=b"")
+        stats = await crud_async.task_stats(db, fields)
+    headers = {"Content-Type": "application/json", "ETag": etag}
+    return Response(status_code=200, headers=headers, description=serialization.dumps(stats))
+
+
+# Endpoint to sync the tasks changed and deleted since a token from an earlier call
+@route("GET", "/tasks/changes")
+async def task_changes(request: Request) -> Response:
+    since = query_param(request, "since") or None
+    limit = int(query_param(request, "limit") or "1000")
+    async with AsyncSessionLocal() as db:
+        try:
+            changes = await crud_async.list_changes(db, since, limit)
+        except crud.ChangeTokenExpired as e:
+            return Response(
+                status_code=410,
+                headers={"Content-Type": "application/json"},
+                description=serialization.dumps({"error": str(e)}),
+            )
+        except ValueError as e:
+            raise InvalidQueryException(str(e)) from e
+    return Response(
+        status_code=200, headers={"Content-Type": "application/json"}, description=serialization.dumps_changes(changes)
+    )
+
+
+# Endpoint to follow task changes
+@route("GET", "/tasks/events")
+async def task_events(request: Request) -> Response:
+    # Robyn cannot stream a response, so unlike the other backends this is a JSON long poll,
+    # not an event stream (see events.poll); the position comes from ?last_event_id= or the
+    # Last-Event-ID header
+    value = query_param(request, "last_event_id")
+    try:
+        last_event_id = int(value) if value else events.parse_last_event_id(request.headers.get("last-event-id"))
+    except ValueError as e:
+        raise InvalidQueryException(str(e)) from e
+    body = await events.poll(last_event_id)
+    headers = {"Content-Type": "application/json", "Cache-Control": "no-cache"}
+    return Response(status_code=200, headers=headers, description=body)
+
+
 # Endpoint to get a single task
-@app.get("/tasks/:task_id")
-async def get_task(request: Request) -> TaskDict:
+@route("GET", "/tasks/:task_id")
+async def get_task(request: Request) -> Response:
     task_id_str = request.path_params.get("task_id")
     if task_id_str is None:
         raise TaskIdMissingException("Task id missing")
     task_id = int(task_id_str)
-    with SessionLocal() as db:
-        task = crud.get_task(db, task_id=task_id)
-
-    if task is None:
+    try:
+        fields = crud.parse_fields(query_param(request, "fields"))
+    except ValueError as e:
+        raise InvalidQueryException(str(e)) from e
+    async with AsyncSessionLocal() as db:
+        cached = await crud_async.get_task_payload(db, task_id=task_id, fields=fields)
+
+    if cached is None:
         raise TaskNotFoundException("Task not found")
 
-    return serialize_task(task)
+    if conditional.not_modified(request.headers.get("if-none-match"), cached.etag):
+        return Response(status_code=304, headers={"ETag": cached.etag}, description=b"")
+    headers = {"Content-Type": "application/json", "ETag": cached.etag}
+    return Response(status_code=200, headers=headers, description=cached.payload)
 
 
 # Endpoint to update an existing task
-@app.put("/tasks/:task_id")
+@route("PUT", "/tasks/:task_id")
 async def update_task(request: Request) -> UpdateTaskResponseDict:
     task_id_str = request.path_params.get("task_id")
     if task_id_str is None:
         raise TaskIdMissingException("Task id missing")
     task_id = int(task_id_str)
-    with SessionLocal() as db:
+    async with AsyncSessionLocal() as db:
         task_data = request.json()
-        updated = crud.update_task(db, task_id=task_id, task=task_data)
+        updated = await crud_async.update_task(db, task_id=task_id, task=task_data)
     if not updated:
         raise TaskNotUpdatedException("Task not updated")
     return {"description": "Task updated successfully"}
 
 
 # Endpoint to delete a task
-@app.delete("/tasks/:task_id")
+@route("DELETE", "/tasks/:task_id")
 async def delete_task(request: Request) -> DeleteTaskResponseDict:
     task_id_str = request.path_params.get("task_id")
     if task_id_str is None:
         raise TaskIdMissingException("Task id missing")
     task_id = int(task_id_str)
-    with SessionLocal() as db:
-        success = crud.delete_task(db, task_id=task_id)
+    async with AsyncSessionLocal() as db:
+        success = await crud_async.delete_task(db, task_id=task_id)
     if not success:
         raise TaskNotFoundException("Task not found")
     return {"description": "Task deleted successfully"}
 
 
+def create_app() -> Robyn:
+    app = Robyn(__file__)
+    # Robyn defaults to one process, so WORKERS applies unless --processes or --fast was given
+    if app.config.parser.parse_known_args()[0].processes is None and not app.config.fast:
+        app.config.processes = WORKERS
+    if app.config.processes > 1:
+        # A write only invalidates the cache of the process that made it
+        task_cache.disable()
+    ALLOW_CORS(app, origins=CORS_ALLOWED_ORIGINS)
+    # Before any route is added, so every handler gets timed
+    metrics.instrument_robyn(app)
+    compression.instrument_robyn(app)
+    for method, endpoint, handler in ROUTES:
+        app.add_route(method, endpoint, answer_errors(handler))
+    return app
+
+
 # Start the Robyn app on port 8080
 if __name__ == "__main__":
-    app.start(HOST, port=PORT)
+    logging.basicConfig(level=logging.INFO)
+    prepare_server()
+    create_app().start(HOST, port=int(PORT))
@@ -1,30 +1,24 @@
 # fastapi implementation
 
-import json
-from typing import Any, Dict, List, Optional
+import logging
+from collections.abc import AsyncIterator
+from typing import Any, Optional
 
 from typing_extensions import TypedDict
 
-from fastapi import FastAPI, HTTPException, Query, Request, Response
+from fastapi import APIRouter, FastAPI, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 
-from tasklist3000 import crud
-from tasklist3000.config import HOST, PORT, CORS_ALLOWED_ORIGINS, COLOR_VALUES, PRIORITY_VALUES, STATUS_VALUES
-from tasklist3000.models import Base, SessionLocal, Task, engine
+from tasklist3000 import compression, conditional, crud, crud_async, events, metrics, serialization
+from tasklist3000.config import HOST, PORT, WORKERS, CORS_ALLOWED_ORIGINS, COLOR_VALUES, PRIORITY_VALUES, STATUS_VALUES
+from tasklist3000.models import AsyncSessionLocal
+from tasklist3000.startup import prepare_server
 
-app = FastAPI()
-
-# Add CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=CORS_ALLOWED_ORIGINS,
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-Base.metadata.create_all(bind=engine)
+# Routes are declared on a router and attached to an app by create_app, so importing this
+# module neither builds an app nor touches the database
+router = APIRouter()
 
 
 # Pydantic models for request and response validation
@@ -45,16 +39,6 @@ class TaskUpdate(TaskBase):
     pass
 
 
-class TaskDict(TypedDict):
-    id: int
-    title: str
-    description: str
-    status: str
-    priority: str
-    color: str
-    full_text: str
-
-
 class ConfigDict(TypedDict):
     priority_values: list[Any]
     status_values: list[Any]
@@ -67,67 +51,95 @@ class AddTaskResponseDict(TypedDict):
     id: int
 
 
-class UpdateTaskResponseDict(TypedDict):
-    description: str
+class TaskErrorDict(TypedDict):
+    index: int
+    error: str
 
 
-class DeleteTaskResponseDict(TypedDict):
+class AddTasksResponseDict(TypedDict):
     description: str
+    status_code: int
+    ids: list[Optional[int]]
+    errors: list[TaskErrorDict]
 
 
-# Return a dictionary with all task fields.
-def serialize_task(task: Task) -> TaskDict:
-    return {
-        "id": task.id,
-        "title": task.title,
-        "description": task.description,
-        "status": task.status,
-        "priority": task.priority,
-        "color": task.color,
-        "full_text": task.full_text,
-    }
+class UpdateTaskResponseDict(TypedDict):
+    description: str
 
 
-# Dependency to get the database session
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+class DeleteTaskResponseDict(TypedDict):
+    description: str
 
 
 # Define the root endpoint
-@app.get("/")
+@router.get("/")
 async def root():
     return Response(content="Hello, world!", media_type="text/plain")
 
 
 # Define the status endpoint
-@app.get("/status")
+@router.get("/status")
 async def status_endpoint():
     return Response(content="Up and running", media_type="text/plain")
 
 
-@app.get("/config")
+@router.get("/config")
 async def get_config() -> ConfigDict:
     return {"priority_values": PRIORITY_VALUES, "status_values": STATUS_VALUES, "color_values": COLOR_VALUES}
 
 
-@app.get("/tasks")
-async def get_tasks(skip: int = Query(0), limit: int = Query(100)) -> str:
-    with SessionLocal() as db:
-        tasks = crud.get_tasks(db, skip=skip, limit=limit)
-    tasks_serialized = [serialize_task(task) for task in tasks]
-    return json.dumps(tasks_serialized)
+# Request counts, latencies and cache counters in Prometheus text format
+@router.get("/metrics")
+async def get_metrics() -> Response:
+    return Response(content=metrics.request_metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+@router.get("/tasks")
+async def get_tasks(
+    request: Request,
+    skip: int = Query(0),
+    limit: int = Query(100),
+    cursor: Optional[str] = Query(None),
+    order_by: str = Query("id"),
+    fields: Optional[str] = Query(None),
+    include_archived: bool = Query(False),
+) -> Response:
+    async with AsyncSessionLocal() as db:
+        # The version is read first, in the same read transaction as the list, so the tag
+        # never claims a newer state than the body carries
+        etag = conditional.list_etag(await crud_async.tasks_version(db))
+        if conditional.not_modified(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers={"ETag": etag})
+        try:
+            selected = crud.parse_fields(fields, serialization.LIST_FIELDS)
+            # status, priority, color and the created/modified ranges come straight off the query string
+            filters = crud.parse_filters(request.query_params)
+            tasks = await crud_async.list_tasks(
+                db,
+                skip=skip,
+                limit=limit,
+                cursor=cursor,
+                order_by=order_by,
+                filters=filters,
+                fields=selected,
+                include_archived=include_archived,
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e)) from e
+    # The next page cursor travels in a header so the body stays a plain list
+    headers = {"ETag": etag}
+    next_cursor = crud.next_cursor(tasks, limit, order_by)
+    if next_cursor is not None:
+        headers["X-Next-Cursor"] = next_cursor
+    return Response(content=serialization.dumps_tasks(tasks, selected), media_type="application/json", headers=headers)
 
 
 # Endpoint to create a new task
-@app.post("/tasks")
+@router.post("/tasks")
 async def add_task(task: Request) -> AddTaskResponseDict:
     task_data = await task.json()
-    with SessionLocal() as db:
-        insertion = crud.create_task(db, task_data)
+    async with AsyncSessionLocal() as db:
+        insertion = await crud_async.create_task(db, task_data)
 
     if insertion is None:
         raise HTTPException(status_code=400, detail="Task not added")
@@ -139,41 +151,143 @@ async def add_task(task: Request) -> AddTaskResponseDict:
     }
 
 
+# Endpoint to create many tasks in a single transaction
+@router.post("/tasks/bulk")
+async def add_tasks(request: Request) -> AddTasksResponseDict:
+    task_data = await request.json()
+    if not isinstance(task_data, list):
+        raise HTTPException(status_code=400, detail="Expected a list of tasks")
+    async with AsyncSessionLocal() as db:
+        ids, errors = await crud_async.create_tasks(db, task_data)
+
+    return {
+        "description": f"{len(task_data) - len(errors)} tasks added successfully",
+        "status_code": 200,
+        "ids": ids,  # New task IDs in request order, null for rejected items
+        "errors": [{"index": index, "error": error} for index, error in errors.items()],
+    }
+
+
+# Endpoint to search task text, best matches first
+@router.get("/tasks/search")
+async def search_tasks(q: str = Query(""), skip: int = Query(0), limit: int = Query(20)) -> Response:
+    async with AsyncSessionLocal() as db:
+        try:
+            results = await crud_async.search_tasks(db, q, skip=skip, limit=limit)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail="Search query missing") from e
+    return Response(content=serialization.dumps_search_results(results), media_type="application/json")
+
+
+# Endpoint to export every task as newline-delimited JSON
+@router.get("/tasks/export")
+async def export_tasks() -> StreamingResponse:
+    async def generate() -> AsyncIterator[bytes]:
+        # The session lives as long as the stream, so rows go out as the cursor yields them
+        async with AsyncSessionLocal() as db:
+            async for chunk in serialization.aiter_ndjson(crud_async.iter_tasks(db)):
+                yield chunk
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+
+# Endpoint to count tasks by status, priority and color, optionally cross-tabulated
+@router.get("/tasks/stats")
+async def task_stats(request: Request, crosstab: Optional[str] = Query(None)) -> Response:
+    try:
+        fields = crud.parse_crosstab(crosstab)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+    async with AsyncSessionLocal() as db:
+        # Any write can change the counts, so they are tagged from the change counter like the list
+        etag = conditional.list_etag(await crud_async.tasks_version(db))
+        if conditional.not_modified(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers={"ETag": etag})
+        stats = await crud_async.task_stats(db, fields)
+    return Response(content=serialization.dumps(stats), media_type="application/json", headers={"ETag": etag})
+
+
+# Endpoint to sync the tasks changed and deleted since a token from an earlier call
+@router.get("/tasks/changes")
+async def task_changes(since: Optional[str] = Query(None), limit: int = Query(1000)) -> Response:
+    async with AsyncSessionLocal() as db:
+        try:
+            changes = await crud_async.list_changes(db, since, limit)
+        except crud.ChangeTokenExpired as e:
+            raise HTTPException(status_code=410, detail=str(e)) from e
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e)) from e
+    return Response(content=serialization.dumps_changes(changes), media_type="application/json")
+
+
+# Endpoint to follow task changes as server-sent events
+@router.get("/tasks/events")
+async def task_events(request: Request) -> StreamingResponse:
+    last_event_id = events.parse_last_event_id(request.headers.get("last-event-id"))
+    return StreamingResponse(
+        events.aiter_stream(last_event_id), media_type=events.CONTENT_TYPE, headers={"Cache-Control": "no-cache"}
+    )
+
+
 # Endpoint to get a single task
-@app.get("/tasks/{task_id}")
-async def get_task(task_id: int) -> TaskDict:
-    with SessionLocal() as db:
-        task = crud.get_task(db, task_id=task_id)
+@router.get("/tasks/{task_id}")
+async def get_task(task_id: int, request: Request, fields: Optional[str] = Query(None)) -> Response:
+    try:
+        selected = crud.parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+    async with AsyncSessionLocal() as db:
+        cached = await crud_async.get_task_payload(db, task_id=task_id, fields=selected)
 
-    if task is None:
+    if cached is None:
         raise HTTPException(status_code=404, detail="Task not found")
 
-    # Serialize the SQLAlchemy model to a dictionary
-    return serialize_task(task)
+    if conditional.not_modified(request.headers.get("if-none-match"), cached.etag):
+        return Response(status_code=304, headers={"ETag": cached.etag})
+    return Response(content=cached.payload, media_type="application/json", headers={"ETag": cached.etag})
 
 
 # Endpoint to update an existing task
-@app.put("/tasks/{task_id}")
+@router.put("/tasks/{task_id}")
 async def update_task(task_id: int, request: Request) -> UpdateTaskResponseDict:
     task_data = await request.json()
-    with SessionLocal() as db:
-        updated = crud.update_task(db, task_id=task_id, task=task_data)
+    async with AsyncSessionLocal() as db:
+        updated = await crud_async.update_task(db, task_id=task_id, task=task_data)
     if not updated:
         raise HTTPException(status_code=400, detail="Task not updated")
     return {"description": "Task updated successfully"}
 
 
 # Endpoint to delete a task
-@app.delete("/tasks/{task_id}")
+@router.delete("/tasks/{task_id}")
 async def delete_task(task_id: int) -> DeleteTaskResponseDict:
-    with SessionLocal() as db:
-        success = crud.delete_task(db, task_id=task_id)
+    async with AsyncSessionLocal() as db:
+        success = await crud_async.delete_task(db, task_id=task_id)
     if not success:
         raise HTTPException(status_code=404, detail="Task not found")
     return {"description": "Task deleted successfully"}
 
 
+def create_app() -> FastAPI:
+    app = FastAPI()
+    # Add CORS middleware
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=CORS_ALLOWED_ORIGINS,
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    app.add_middleware(compression.CompressionMiddleware)
+    app.add_middleware(metrics.MetricsMiddleware)
+    app.include_router(router)
+    return app
+
+
 # Start the FastAPI app
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    prepare_server()
     import uvicorn
-    uvicorn.run(app, host=HOST, port=PORT)
+    # Workers are separate interpreters, so uvicorn needs the factory's import string
+    uvicorn.run("tasklist3000.main_fastapi:create_app", factory=True, host=HOST, port=int(PORT), workers=WORKERS)
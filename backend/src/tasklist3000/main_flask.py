@@ -1,19 +1,22 @@
 # flask implementation
 
-import json
-from typing import Any, TypedDict
+import logging
+from collections.abc import Iterator
+from typing import Any, Optional, TypedDict
 
-from flask import Flask, jsonify, request
+from flask import Blueprint, Flask, Response, jsonify, request
 from flask_cors import CORS
 
-from tasklist3000 import crud
-from tasklist3000.config import HOST, PORT, CORS_ALLOWED_ORIGINS, COLOR_VALUES, PRIORITY_VALUES, STATUS_VALUES
-from tasklist3000.models import Base, SessionLocal, Task, engine
+from tasklist3000 import compression, conditional, crud, events, metrics, serialization
+from tasklist3000.config import HOST, PORT, WORKERS, CORS_ALLOWED_ORIGINS, COLOR_VALUES, PRIORITY_VALUES, STATUS_VALUES
+from tasklist3000.models import SessionLocal
+from tasklist3000.prefork import serve_prefork
+from tasklist3000.startup import prepare_server
+from tasklist3000.writequeue import write_queue
 
-app = Flask(__name__)
-CORS(app, resources={r"/*": {"origins": CORS_ALLOWED_ORIGINS}})
-
-Base.metadata.create_all(bind=engine)
+# Routes are declared on a blueprint and attached to an app by create_app, so importing
+# this module neither builds an app nor touches the database
+api = Blueprint("api", __name__)
 
 
 class TaskNotFoundException(Exception):
@@ -32,14 +35,12 @@ class TaskNotUpdatedException(Exception):
     pass
 
 
-class TaskDict(TypedDict):
-    id: int
-    title: str
-    description: str
-    status: str
-    priority: str
-    color: str
-    full_text: str
+class InvalidQueryException(Exception):
+    pass
+
+
+class InvalidSearchQueryException(Exception):
+    pass
 
 
 class ConfigDict(TypedDict):
@@ -54,83 +55,122 @@ class AddTaskResponseDict(TypedDict):
     id: int
 
 
-class UpdateTaskResponseDict(TypedDict):
+class TaskErrorDict(TypedDict):
+    index: int
+    error: str
+
+
+class AddTasksResponseDict(TypedDict):
     description: str
+    status_code: int
+    ids: list[Optional[int]]
+    errors: list[TaskErrorDict]
 
 
-class DeleteTaskResponseDict(TypedDict):
+class UpdateTaskResponseDict(TypedDict):
     description: str
 
 
-# Return a dictionary with all task fields.
-def serialize_task(task: Task) -> TaskDict:
-    return {
-        "id": task.id,
-        "title": task.title,
-        "description": task.description,
-        "status": task.status,
-        "priority": task.priority,
-        "color": task.color,
-        "full_text": task.full_text,
-    }
+class DeleteTaskResponseDict(TypedDict):
+    description: str
 
 
 # Error handlers
-@app.errorhandler(TaskNotFoundException)
+@api.errorhandler(TaskNotFoundException)
 def handle_task_not_found(e):
     return jsonify({"error": str(e)}), 404
 
 
-@app.errorhandler(TaskNotAddedException)
+@api.errorhandler(TaskNotAddedException)
 def handle_task_not_added(e):
     return jsonify({"error": str(e)}), 400
 
 
-@app.errorhandler(TaskIdMissingException)
+@api.errorhandler(TaskIdMissingException)
 def handle_task_id_missing(e):
     return jsonify({"error": str(e)}), 400
 
 
-@app.errorhandler(TaskNotUpdatedException)
+@api.errorhandler(TaskNotUpdatedException)
 def handle_task_not_updated(e):
     return jsonify({"error": str(e)}), 400
 
 
+@api.errorhandler(InvalidQueryException)
+def handle_invalid_query(e: InvalidQueryException) -> tuple[Response, int]:
+    return jsonify({"error": str(e)}), 400
+
+
+@api.errorhandler(InvalidSearchQueryException)
+def handle_invalid_search_query(e: InvalidSearchQueryException) -> tuple[Response, int]:
+    return jsonify({"error": str(e)}), 400
+
+
 # Define the root endpoint
-@app.route("/", methods=["GET"])
+@api.route("/", methods=["GET"])
 def root():
     return "Hello, world!"
 
 
 # Define the status endpoint
-@app.route("/status", methods=["GET"])
+@api.route("/status", methods=["GET"])
 def status_endpoint():
     return "Up and running"
 
 
-@app.route("/config", methods=["GET"])
+@api.route("/config", methods=["GET"])
 def get_config():
     return {"priority_values": PRIORITY_VALUES, "status_values": STATUS_VALUES, "color_values": COLOR_VALUES}
 
 
-@app.route("/tasks", methods=["GET"])
+# Request counts, latencies and cache counters in Prometheus text format
+@api.route("/metrics", methods=["GET"])
+def get_metrics() -> tuple[str, int, dict[str, str]]:
+    return metrics.request_metrics.render(), 200, {"Content-Type": metrics.CONTENT_TYPE}
+
+
+@api.route("/tasks", methods=["GET"])
 def get_tasks():
     with SessionLocal() as db:
         # Force fallback in case query_params returns None.
         skip = int(request.args.get("skip", 0))
         limit = int(request.args.get("limit", 100))
-        tasks = crud.get_tasks(db, skip=skip, limit=limit)
-    tasks_serialized = [serialize_task(task) for task in tasks]
-    return json.dumps(tasks_serialized)
+        cursor = request.args.get("cursor") or None
+        order_by = request.args.get("order_by") or "id"
+        # The version is read first, in the same read transaction as the list, so the tag
+        # never claims a newer state than the body carries
+        etag = conditional.list_etag(crud.tasks_version(db))
+        if conditional.not_modified(request.headers.get("If-None-Match"), etag):
+            return b"", 304, {"ETag": etag}
+        try:
+            fields = crud.parse_fields(request.args.get("fields"), serialization.LIST_FIELDS)
+            filters = crud.parse_filters(request.args)
+            include_archived = crud.parse_flag(request.args.get("include_archived"))
+            tasks = crud.list_tasks(
+                db,
+                skip=skip,
+                limit=limit,
+                cursor=cursor,
+                order_by=order_by,
+                filters=filters,
+                fields=fields,
+                include_archived=include_archived,
+            )
+        except ValueError as e:
+            raise InvalidQueryException(str(e)) from e
+    # The next page cursor travels in a header so the body stays a plain list
+    headers = {"Content-Type": "application/json", "ETag": etag}
+    next_cursor = crud.next_cursor(tasks, limit, order_by)
+    if next_cursor is not None:
+        headers["X-Next-Cursor"] = next_cursor
+    return serialization.dumps_tasks(tasks, fields), 200, headers
 
 
 # Endpoint to create a new task
-@app.route("/tasks", methods=["POST"])
+@api.route("/tasks", methods=["POST"])
 def add_task():
-    with SessionLocal() as db:
-        task_data = request.get_json()
-        insertion = crud.create_task(db, task_data)
-
+    task_data = request.get_json()
+    insertion = write_queue.run(crud.stage_create_task, task_data)
     if insertion is None:
         raise TaskNotAddedException("Task not added")
 
@@ -141,40 +181,137 @@ def add_task():
     }
 
 
+# Endpoint to create many tasks in a single transaction
+@api.route("/tasks/bulk", methods=["POST"])
+def add_tasks() -> AddTasksResponseDict:
+    task_data = request.get_json()
+    try:
+        ids, errors = write_queue.run(crud.stage_create_tasks, task_data)
+    except ValueError as e:
+        raise TaskNotAddedException(str(e)) from e
+
+    return {
+        "description": f"{len(task_data) - len(errors)} tasks added successfully",
+        "status_code": 200,
+        "ids": ids,  # New task IDs in request order, null for rejected items
+        "errors": [{"index": index, "error": error} for index, error in errors.items()],
+    }
+
+
+# Endpoint to search task text, best matches first
+@api.route("/tasks/search", methods=["GET"])
+def search_tasks() -> tuple[bytes, int, dict[str, str]]:
+    q = request.args.get("q", "")
+    skip = int(request.args.get("skip", 0))
+    limit = int(request.args.get("limit", 20))
+    with SessionLocal() as db:
+        try:
+            results = crud.search_tasks(db, q, skip=skip, limit=limit)
+        except ValueError as e:
+            raise InvalidSearchQueryException(str(e)) from e
+    return serialization.dumps_search_results(results), 200, {"Content-Type": "application/json"}
+
+
+# Endpoint to export every task as newline-delimited JSON
+@api.route("/tasks/export", methods=["GET"])
+def export_tasks() -> Response:
+    def generate() -> Iterator[bytes]:
+        # The session lives as long as the stream, so rows go out as the cursor yields them
+        with SessionLocal() as db:
+            yield from serialization.iter_ndjson(crud.iter_tasks(db))
+
+    return Response(generate(), mimetype="application/x-ndjson")
+
+
+# Endpoint to count tasks by status, priority and color, optionally cross-tabulated
+@api.route("/tasks/stats", methods=["GET"])
+def task_stats() -> tuple[Any, ...]:
+    try:
+        fields = crud.parse_crosstab(request.args.get("crosstab"))
+    except ValueError as e:
+        raise InvalidQueryException(str(e)) from e
+    with SessionLocal() as db:
+        # Any write can change the counts, so they are tagged from the change counter like the list
+        etag = conditional.list_etag(crud.tasks_version(db))
+        if conditional.not_modified(request.headers.get("If-None-Match"), etag):
+            return b"", 304, {"ETag": etag}
+        stats = crud.task_stats(db, fields)
+    return serialization.dumps(stats), 200, {"Content-Type": "application/json", "ETag": etag}
+
+
+# Endpoint to sync the tasks changed and deleted since a token from an earlier call
+@api.route("/tasks/changes", methods=["GET"])
+def task_changes() -> tuple[Any, ...]:
+    since = request.args.get("since") or None
+    limit = int(request.args.get("limit", 1000))
+    with SessionLocal() as db:
+        try:
+            changes = crud.list_changes(db, since, limit)
+        except crud.ChangeTokenExpired as e:
+            return jsonify({"error": str(e)}), 410
+        except ValueError as e:
+            raise InvalidQueryException(str(e)) from e
+    return serialization.dumps_changes(changes), 200, {"Content-Type": "application/json"}
+
+
+# Endpoint to follow task changes as server-sent events
+@api.route("/tasks/events", methods=["GET"])
+def task_events() -> Response:
+    last_event_id = events.parse_last_event_id(request.headers.get("Last-Event-ID"))
+    return Response(
+        events.iter_stream(last_event_id), mimetype=events.CONTENT_TYPE, headers={"Cache-Control": "no-cache"}
+    )
+
+
 # Endpoint to get a single task
-@app.route("/tasks/<int:task_id>", methods=["GET"])
+@api.route("/tasks/<int:task_id>", methods=["GET"])
 def get_task(task_id):
+    try:
+        fields = crud.parse_fields(request.args.get("fields"))
+    except ValueError as e:
+        raise InvalidQueryException(str(e)) from e
     with SessionLocal() as db:
-        task = crud.get_task(db, task_id=task_id)
+        cached = crud.get_task_payload(db, task_id=task_id, fields=fields)
 
-    if task is None:
+    if cached is None:
         raise TaskNotFoundException("Task not found")
 
+    if conditional.not_modified(request.headers.get("If-None-Match"), cached.etag):
+        return b"", 304, {"ETag": cached.etag}
     # Return serialized task to match Robyn's behavior
-    return serialize_task(task)
+    return cached.payload, 200, {"Content-Type": "application/json", "ETag": cached.etag}
 
 
 # Endpoint to update an existing task
-@app.route("/tasks/<int:task_id>", methods=["PUT"])
+@api.route("/tasks/<int:task_id>", methods=["PUT"])
 def update_task(task_id):
-    with SessionLocal() as db:
-        task_data = request.get_json()
-        updated = crud.update_task(db, task_id=task_id, task=task_data)
+    task_data = request.get_json()
+    updated = write_queue.run(crud.stage_update_task, task_id, task_data)
     if not updated:
         raise TaskNotUpdatedException("Task not updated")
     return {"description": "Task updated successfully"}
 
 
 # Endpoint to delete a task
-@app.route("/tasks/<int:task_id>", methods=["DELETE"])
+@api.route("/tasks/<int:task_id>", methods=["DELETE"])
 def delete_task(task_id):
-    with SessionLocal() as db:
-        success = crud.delete_task(db, task_id=task_id)
+    success = write_queue.run(crud.stage_delete_task, task_id)
     if not success:
         raise TaskNotFoundException("Task not found")
     return {"description": "Task deleted successfully"}
 
 
+def create_app() -> Flask:
+    app = Flask(__name__)
+    CORS(app, resources={r"/*": {"origins": CORS_ALLOWED_ORIGINS}})
+    metrics.instrument_flask(app)
+    compression.instrument_flask(app)
+    app.register_blueprint(api)
+    return app
+
+
 # Start the Flask app on port 8080
 if __name__ == "__main__":
-    app.run(host=HOST, port=PORT)
+    logging.basicConfig(level=logging.INFO)
+    prepare_server()
+    serve_prefork(create_app, HOST, int(PORT), WORKERS)
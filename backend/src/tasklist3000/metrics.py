@@ -0,0 +1,285 @@
+# Request metrics shared by the three backends, served in Prometheus text format at /metrics.
+#
+# Every request is counted per method, route template and status code and timed into a
+# latency histogram per route template, while an in-flight gauge per method tracks the
+# requests still running (FastAPI only knows the route once routing is done). Routes are
+# labelled by their template ("/tasks/:task_id", "/tasks/{task_id}", "/tasks/<int:task_id>"),
+# never by the raw path, so the number of series stays fixed. Recording is a few dict updates under a
+# lock, cheap enough to leave on permanently.
+#
+# Each framework hooks in its own way: instrument_robyn wraps handlers as they are
+# registered, MetricsMiddleware is a plain ASGI middleware for FastAPI, and instrument_flask
+# adds before/after/teardown request hooks. The same hooks track the request's SQL
+# statements (see querystats) and report them in a Server-Timing header.
+#
+# The write queue reports the size and commit time of every group commit here as well.
+
+import bisect
+import functools
+import inspect
+import threading
+import time
+from collections.abc import Awaitable, Callable, MutableMapping
+from typing import Any, Optional
+
+from . import querystats
+from .cache import task_cache
+from .events import broker
+
+# Histogram upper bounds in seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+# Writes per group commit
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Label for requests that matched no route, so unknown paths don't each get a series
+UNMATCHED = "unmatched"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels: str) -> str:
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+# Bucket counts (the last one is +Inf), sum of observed values, count
+Histogram = tuple[list[int], float, int]
+
+
+def _observe(histogram: Optional[Histogram], bounds: tuple[float, ...], value: float) -> Histogram:
+    buckets, total, count = histogram or ([0] * (len(bounds) + 1), 0.0, 0)
+    buckets[bisect.bisect_left(bounds, value)] += 1
+    return buckets, total + value, count + 1
+
+
+def _copy(histogram: Histogram) -> Histogram:
+    buckets, total, count = histogram
+    return list(buckets), total, count
+
+
+def _render_histogram(name: str, bounds: tuple[float, ...], histogram: Histogram, **labels: str) -> list[str]:
+    buckets, total, count = histogram
+    lines = []
+    cumulative = 0
+    for bound, bucket_count in zip((*bounds, "+Inf"), buckets):
+        cumulative += bucket_count
+        lines.append(f"{name}_bucket{_labels(**labels, le=str(bound))} {cumulative}")
+    lines.append(f"{name}_sum{_labels(**labels) if labels else ''} {total}")
+    lines.append(f"{name}_count{_labels(**labels) if labels else ''} {count}")
+    return lines
+
+
+class Metrics:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.requests: dict[tuple[str, str, int], int] = {}
+        self.in_flight: dict[str, int] = {}
+        self.latency: dict[tuple[str, str], Histogram] = {}
+        self.write_batch_sizes: Optional[Histogram] = None
+        self.write_commit_seconds: Optional[Histogram] = None
+
+    def start(self, method: str) -> float:
+        with self._lock:
+            self.in_flight[method] = self.in_flight.get(method, 0) + 1
+        return time.perf_counter()
+
+    def finish(self, method: str, route: str, status: int, started: float) -> None:
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.in_flight[method] -= 1
+            self.requests[method, route, status] = self.requests.get((method, route, status), 0) + 1
+            self.latency[method, route] = _observe(self.latency.get((method, route)), LATENCY_BUCKETS, elapsed)
+
+    def observe_write_batch(self, size: int, seconds: float) -> None:
+        with self._lock:
+            self.write_batch_sizes = _observe(self.write_batch_sizes, BATCH_SIZE_BUCKETS, size)
+            self.write_commit_seconds = _observe(self.write_commit_seconds, LATENCY_BUCKETS, seconds)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.requests.clear()
+            self.in_flight.clear()
+            self.latency.clear()
+            self.write_batch_sizes = None
+            self.write_commit_seconds = None
+
+    def render(self) -> str:
+        with self._lock:
+            requests = dict(self.requests)
+            in_flight = dict(self.in_flight)
+            latency = {key: _copy(histogram) for key, histogram in self.latency.items()}
+            batch_sizes = self.write_batch_sizes and _copy(self.write_batch_sizes)
+            commit_seconds = self.write_commit_seconds and _copy(self.write_commit_seconds)
+        lines = [
+            "# HELP http_requests_total Requests handled, by route template and status code.",
+            "# TYPE http_requests_total counter",
+        ]
+        for (method, route, status), value in sorted(requests.items()):
+            lines.append(f"http_requests_total{_labels(method=method, route=route, status=str(status))} {value}")
+        lines += [
+            "# HELP http_requests_in_flight Requests currently being handled.",
+            "# TYPE http_requests_in_flight gauge",
+        ]
+        for method, value in sorted(in_flight.items()):
+            lines.append(f"http_requests_in_flight{_labels(method=method)} {value}")
+        lines += [
+            "# HELP http_request_duration_seconds Request latency, by route template.",
+            "# TYPE http_request_duration_seconds histogram",
+        ]
+        for (method, route), histogram in sorted(latency.items()):
+            lines += _render_histogram("http_request_duration_seconds", LATENCY_BUCKETS, histogram, method=method, route=route)
+        # Only present once the write queue has committed something
+        if batch_sizes is not None and commit_seconds is not None:
+            lines += [
+                "# HELP task_write_batch_size Writes applied per group commit.",
+                "# TYPE task_write_batch_size histogram",
+                *_render_histogram("task_write_batch_size", BATCH_SIZE_BUCKETS, batch_sizes),
+                "# HELP task_write_commit_seconds Time to apply and commit one group of writes.",
+                "# TYPE task_write_commit_seconds histogram",
+                *_render_histogram("task_write_commit_seconds", LATENCY_BUCKETS, commit_seconds),
+            ]
+        cache = task_cache.stats()
+        lines += [
+            "# HELP task_cache_requests_total Single task cache lookups, by result.",
+            "# TYPE task_cache_requests_total counter",
+            f'task_cache_requests_total{{result="hit"}} {cache["hits"]}',
+            f'task_cache_requests_total{{result="miss"}} {cache["misses"]}',
+            "# HELP task_cache_evictions_total Entries evicted from the single task cache to make room.",
+            "# TYPE task_cache_evictions_total counter",
+            f"task_cache_evictions_total {cache['evictions']}",
+            "# HELP task_cache_entries Entries currently in the single task cache.",
+            "# TYPE task_cache_entries gauge",
+            f"task_cache_entries {cache['size']}",
+            "# HELP task_events_subscribers Clients currently subscribed to /tasks/events.",
+            "# TYPE task_events_subscribers gauge",
+            f"task_events_subscribers {broker.subscribers}",
+            "# HELP task_events_dropped_total Subscribers dropped for falling too far behind.",
+            "# TYPE task_events_dropped_total counter",
+            f"task_events_dropped_total {broker.dropped}",
+        ]
+        return "\n".join(lines) + "\n"
+
+
+request_metrics = Metrics()
+
+
+def _robyn_finish_response(result: Any, stats: querystats.QueryStats) -> int:
+    # Handlers return a Response, or a dict/str that Robyn turns into a 200 later on;
+    # only a Response can carry the Server-Timing header
+    if hasattr(result, "headers"):
+        result.headers.set("Server-Timing", stats.server_timing())
+    return int(getattr(result, "status_code", 200))
+
+
+def _robyn_timed(method: str, route: str, handler: Callable) -> Callable:
+    if inspect.iscoroutinefunction(handler):
+
+        @functools.wraps(handler)
+        async def async_timed(*args: Any, **kwargs: Any) -> Any:
+            started = request_metrics.start(method)
+            stats, token = querystats.track()
+            status = 500
+            try:
+                result = await handler(*args, **kwargs)
+                status = _robyn_finish_response(result, stats)
+                return result
+            finally:
+                querystats.untrack(token)
+                request_metrics.finish(method, route, status, started)
+
+        return async_timed
+
+    @functools.wraps(handler)
+    def timed(*args: Any, **kwargs: Any) -> Any:
+        started = request_metrics.start(method)
+        stats, token = querystats.track()
+        status = 500
+        try:
+            result = handler(*args, **kwargs)
+            status = _robyn_finish_response(result, stats)
+            return result
+        finally:
+            querystats.untrack(token)
+            request_metrics.finish(method, route, status, started)
+
+    return timed
+
+
+def instrument_robyn(app: Any) -> None:
+    # Robyn's request middlewares see neither the matched route nor a per-request context
+    # to carry the start time, so every handler registered from here on is wrapped instead.
+    # functools.wraps keeps the signature Robyn inspects for injected parameters. Paths
+    # that match no route are answered by Robyn itself and are not counted.
+    add_route = app.add_route
+
+    def instrumented_add_route(route_type: Any, endpoint: str, handler: Callable, *args: Any, **kwargs: Any) -> Any:
+        method = str(route_type).rsplit(".", 1)[-1].upper()
+        return add_route(route_type, endpoint, _robyn_timed(method, endpoint, handler), *args, **kwargs)
+
+    app.add_route = instrumented_add_route
+
+
+ASGIApp = Callable[[MutableMapping[str, Any], Callable, Callable], Awaitable[None]]
+
+
+class MetricsMiddleware:
+    # Plain ASGI middleware rather than BaseHTTPMiddleware, which would add a task and a
+    # response copy to every request
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: MutableMapping[str, Any], receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        method = scope["method"]
+        started = request_metrics.start(method)
+        stats, token = querystats.track()
+        status = 500
+
+        async def send_with_status(message: MutableMapping[str, Any]) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                # Statements a streaming body runs after this point are not included
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", stats.server_timing().encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            querystats.untrack(token)
+            # The router records the matched route in the scope it was handed, this one
+            route = getattr(scope.get("route"), "path", UNMATCHED)
+            request_metrics.finish(method, route, status, started)
+
+
+def instrument_flask(app: Any) -> None:
+    from flask import Response, g, request
+
+    @app.before_request
+    def start_timer() -> None:
+        route = request.url_rule.rule if request.url_rule is not None else UNMATCHED
+        g.metrics = (request.method, route, request_metrics.start(request.method))
+        g.metrics_status = 500
+        g.query_stats, g.query_stats_token = querystats.track()
+
+    @app.after_request
+    def record_status(response: Response) -> Response:
+        g.metrics_status = response.status_code
+        if "query_stats" in g:
+            response.headers["Server-Timing"] = g.query_stats.server_timing()
+        return response
+
+    # Teardown runs even when an error skips the after_request hooks, so the in-flight
+    # gauge always comes back down
+    @app.teardown_request
+    def stop_timer(error: Optional[BaseException]) -> None:
+        if "query_stats_token" in g:
+            querystats.untrack(g.query_stats_token)
+        if "metrics" in g:
+            method, route, started = g.metrics
+            request_metrics.finish(method, route, g.metrics_status, started)
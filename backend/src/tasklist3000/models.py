@@ -1,30 +1,500 @@
+import logging
+import os
+from collections.abc import Sequence
 from datetime import datetime
+from typing import Any
 
-from sqlalchemy import DateTime, Enum, Integer, String, Text, create_engine, func
-from sqlalchemy.engine import Engine
+from sqlalchemy import (
+    DDL,
+    DateTime,
+    Enum,
+    Index,
+    Integer,
+    MetaData,
+    SmallInteger,
+    String,
+    Text,
+    TypeDecorator,
+    case,
+    create_engine,
+    event,
+    func,
+    insert,
+    select,
+    sql,
+)
+from sqlalchemy.dialects.sqlite import DATETIME as SQLITE_DATETIME
+from sqlalchemy.engine import Connection, Dialect, Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, sessionmaker
+from sqlalchemy.pool import Pool, QueuePool, StaticPool
+from sqlalchemy.schema import CreateTable
+
+from . import querystats
+from .config import (
+    COLOR_VALUES,
+    COMPACT_ENUMS,
+    DB_PATH,
+    PRIORITY_VALUES,
+    SQLITE_MAX_OVERFLOW,
+    SQLITE_POOL_SIZE,
+    SQLITE_PRAGMAS,
+    STATUS_VALUES,
+    WORKERS,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def engine_options(url: str) -> dict[str, Any]:
+    # An in-memory database lives and dies with its connection, so every session has to share
+    # that one connection. A file database gets a small pool of reusable connections instead.
+    database = make_url(url).database
+    if not database or database == ":memory:":
+        return {"poolclass": StaticPool, "connect_args": {"check_same_thread": False}}
+    return {"pool_size": SQLITE_POOL_SIZE, "max_overflow": SQLITE_MAX_OVERFLOW}
+
+
+def apply_sqlite_pragmas(dbapi_connection: Any, connection_record: Any) -> None:
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+
+def disable_driver_transactions(dbapi_connection: Any, connection_record: Any) -> None:
+    dbapi_connection.isolation_level = None
+
+
+def begin_transaction(conn: Connection) -> None:
+    # Sent on the driver connection, like the COMMIT, so it is not counted as a query
+    cursor = conn.connection.cursor()
+    cursor.execute("BEGIN")
+    cursor.close()
+
+
+def use_explicit_transactions(sqlite_engine: Engine) -> None:
+    # The sqlite3 driver only sends BEGIN ahead of an INSERT, UPDATE or DELETE. SELECTs then
+    # run outside any transaction, each on its own snapshot, and a SAVEPOINT opened first is
+    # a transaction of its own that commits on RELEASE. SQLAlchemy's documented recipe turns
+    # the driver's handling off and sends BEGIN whenever SQLAlchemy begins a transaction.
+    # Not for an in-memory database, whose one connection every session shares at once.
+    if isinstance(sqlite_engine.pool, StaticPool):
+        return
+    event.listen(sqlite_engine, "connect", disable_driver_transactions)
+    event.listen(sqlite_engine, "begin", begin_transaction)
+
+
+def instrument_queries(sqlite_engine: Engine) -> None:
+    # Statement counts and timings for the current request, and the slow query log
+    event.listen(sqlite_engine, "before_cursor_execute", querystats.before_cursor_execute)
+    event.listen(sqlite_engine, "after_cursor_execute", querystats.after_cursor_execute)
+
+
+def create_sqlite_engine(url: str) -> Engine:
+    sqlite_engine = create_engine(url, **engine_options(url))
+    event.listen(sqlite_engine, "connect", apply_sqlite_pragmas)
+    use_explicit_transactions(sqlite_engine)
+    instrument_queries(sqlite_engine)
+    return sqlite_engine
+
+
+def create_async_sqlite_engine(url: str) -> AsyncEngine:
+    sqlite_engine = create_async_engine(url, **engine_options(url))
+    event.listen(sqlite_engine.sync_engine, "connect", apply_sqlite_pragmas)
+    use_explicit_transactions(sqlite_engine.sync_engine)
+    instrument_queries(sqlite_engine.sync_engine)
+    return sqlite_engine
 
-from .config import COLOR_VALUES, DB_PATH, PRIORITY_VALUES, STATUS_VALUES
 
 DATABASE_URL: str = DB_PATH
-engine: Engine = create_engine(DATABASE_URL)
+engine: Engine = create_sqlite_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Same database through aiosqlite, so async handlers never block the event loop on a query
+ASYNC_DATABASE_URL: str = DATABASE_URL.replace("sqlite://", "sqlite+aiosqlite://", 1)
+async_engine: AsyncEngine = create_async_sqlite_engine(ASYNC_DATABASE_URL)
+
+AsyncSessionLocal = async_sessionmaker(autoflush=False, expire_on_commit=False, bind=async_engine)
+
+
+def dispose_after_fork() -> None:
+    # SQLite connections must not be shared between processes, so a forked worker starts with
+    # empty pools. close=False leaves the inherited connections to the parent that owns them.
+    engine.dispose(close=False)
+    async_engine.sync_engine.dispose(close=False)
+
+
+# Robyn processes and the Flask prefork workers are forked from a parent that has already
+# connected to set up the schema; uvicorn spawns fresh interpreters and needs none of this
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=dispose_after_fork)
+
+
+def _describe_pool(pool: Pool) -> str:
+    if isinstance(pool, QueuePool):
+        return f"{type(pool).__name__}(size={pool.size()}, max_overflow={SQLITE_MAX_OVERFLOW})"
+    return type(pool).__name__
+
+
+def log_engine_profile() -> None:
+    # Called where the server starts, after logging has been configured
+    logger.info(
+        "SQLite engine profile: url=%s workers=%d pool=%s async_pool=%s %s",
+        engine.url,
+        WORKERS,
+        _describe_pool(engine.pool),
+        _describe_pool(async_engine.pool),
+        " ".join(f"{name}={value}" for name, value in SQLITE_PRAGMAS.items()),
+    )
+
 
 # Instead of using declarative_base(), subclass DeclarativeBase.
 class Base(DeclarativeBase):
     pass
 
 
-class Task(Base):
-    __tablename__ = "tasks"
+# CURRENT_TIMESTAMP writes whole seconds, so bound datetimes use the same format. Otherwise
+# a cursor or range filter compares "12:00:00" against "12:00:00.000000" as text and misses rows.
+Timestamp = DateTime().with_variant(
+    SQLITE_DATETIME(storage_format="%(year)04d-%(month)02d-%(day)02d %(hour)02d:%(minute)02d:%(second)02d"),
+    "sqlite",
+)
+
+
+class InvalidValue(ValueError):
+    # A value a column or query parameter does not accept; the message is written for the client
+    def __init__(self, name: str, value: object = None) -> None:
+        super().__init__(f"Invalid {name}" if value is None else f"Invalid {name}: {value}")
+
+
+class CompactEnum(TypeDecorator):
+    # One of a fixed list of strings, stored as its position in the list. An integer takes
+    # a byte in the row and in every index entry where "In Progress" takes eleven.
+    impl = SmallInteger
+    cache_ok = True
+
+    def __init__(self, *values: str, name: str) -> None:
+        super().__init__()
+        self.values = values
+        self.name = name
+        self.codes = {value: code for code, value in enumerate(values)}
 
-    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True, autoincrement=True)
-    title: Mapped[str] = mapped_column(String, index=True)
+    def process_bind_param(self, value: Any, dialect: Dialect) -> Any:
+        if value is None:
+            return None
+        if value not in self.codes:
+            raise InvalidValue(self.name, value)
+        return self.codes[value]
+
+    def process_result_value(self, value: Any, dialect: Dialect) -> Any:
+        return None if value is None else self.values[value]
+
+
+def enum_type(*values: str, name: str) -> Any:
+    return CompactEnum(*values, name=name) if COMPACT_ENUMS else Enum(*values, name=name)
+
+
+class TaskColumns:
+    # Shared by tasks and tasks_archive
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    title: Mapped[str] = mapped_column(String)
     description: Mapped[str] = mapped_column(String)
     full_text: Mapped[str] = mapped_column(Text)
-    color: Mapped[str] = mapped_column(Enum(*COLOR_VALUES, name="color_enum"))
-    priority: Mapped[str] = mapped_column(Enum(*PRIORITY_VALUES, name="priority_enum"))
-    status: Mapped[str] = mapped_column(Enum(*STATUS_VALUES, name="status_enum"))
-    created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
-    modified_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now(), onupdate=func.now())
+    color: Mapped[str] = mapped_column(enum_type(*COLOR_VALUES, name="color_enum"))
+    priority: Mapped[str] = mapped_column(enum_type(*PRIORITY_VALUES, name="priority_enum"))
+    status: Mapped[str] = mapped_column(enum_type(*STATUS_VALUES, name="status_enum"))
+    created_at: Mapped[datetime] = mapped_column(Timestamp, server_default=func.now())
+    modified_at: Mapped[datetime] = mapped_column(Timestamp, server_default=func.now(), onupdate=func.now())
+    # Value of the tasks_version counter at the row's last insert or update, set by trigger
+    change_seq: Mapped[int] = mapped_column(Integer, server_default="0")
+
+
+class Task(TaskColumns, Base):
+    __tablename__ = "tasks"
+    # Composite indexes for the list filters and sort orders: each enum filter paired with
+    # each date sort, plus the bare date columns for unfiltered and range queries. The
+    # leading column also serves plain equality filters, so no single column index is needed.
+    # AUTOINCREMENT keeps SQLite from handing out the id of a deleted or archived task again.
+    __table_args__ = (
+        Index("ix_tasks_id", "id"),
+        Index("ix_tasks_title", "title"),
+        Index("ix_tasks_created_at", "created_at"),
+        Index("ix_tasks_modified_at", "modified_at"),
+        Index("ix_tasks_status_created_at", "status", "created_at"),
+        Index("ix_tasks_status_modified_at", "status", "modified_at"),
+        Index("ix_tasks_priority_created_at", "priority", "created_at"),
+        Index("ix_tasks_priority_modified_at", "priority", "modified_at"),
+        Index("ix_tasks_color_created_at", "color", "created_at"),
+        Index("ix_tasks_color_modified_at", "color", "modified_at"),
+        Index("ix_tasks_change_seq", "change_seq"),
+        {"sqlite_autoincrement": True},
+    )
+
+
+class TaskArchive(TaskColumns, Base):
+    # Completed tasks moved out of tasks by crud.archive_tasks, under the same ids. Looked
+    # up by id when tasks misses, and listed only when a list asks for archived tasks.
+    __tablename__ = "tasks_archive"
+    __table_args__ = (
+        Index("ix_tasks_archive_created_at", "created_at"),
+        Index("ix_tasks_archive_modified_at", "modified_at"),
+    )
+
+    archived_at: Mapped[datetime] = mapped_column(Timestamp, server_default=func.now(), sort_order=1)
+
+
+# Full-text search index over the task text columns. tasks_fts is an external-content FTS5
+# table: it stores only the index and reads the text back from tasks, and the triggers keep
+# it in step with every insert, update and delete, including bulk statements.
+SEARCH_INDEX_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS tasks_fts USING fts5("
+    "title, description, full_text, content='tasks', content_rowid='id')",
+    "CREATE TRIGGER IF NOT EXISTS tasks_fts_insert AFTER INSERT ON tasks BEGIN "
+    "INSERT INTO tasks_fts(rowid, title, description, full_text) "
+    "VALUES (new.id, new.title, new.description, new.full_text); END",
+    "CREATE TRIGGER IF NOT EXISTS tasks_fts_delete AFTER DELETE ON tasks BEGIN "
+    "INSERT INTO tasks_fts(tasks_fts, rowid, title, description, full_text) "
+    "VALUES ('delete', old.id, old.title, old.description, old.full_text); END",
+    "CREATE TRIGGER IF NOT EXISTS tasks_fts_update AFTER UPDATE OF title, description, full_text ON tasks BEGIN "
+    "INSERT INTO tasks_fts(tasks_fts, rowid, title, description, full_text) "
+    "VALUES ('delete', old.id, old.title, old.description, old.full_text); "
+    "INSERT INTO tasks_fts(rowid, title, description, full_text) "
+    "VALUES (new.id, new.title, new.description, new.full_text); END",
+)
+
+
+def create_search_index(connection: Connection) -> None:
+    for statement in SEARCH_INDEX_DDL:
+        connection.execute(DDL(statement))
+
+
+def drop_search_index(connection: Connection) -> None:
+    # Dropping tasks removes its triggers, only the virtual table needs to go
+    connection.execute(DDL("DROP TABLE IF EXISTS tasks_fts"))
+
+
+event.listen(Task.__table__, "after_create", lambda target, connection, **kw: create_search_index(connection))
+event.listen(Task.__table__, "before_drop", lambda target, connection, **kw: drop_search_index(connection))
+
+
+# Table-level change counter behind the list ETags and /tasks/changes. The triggers bump
+# the single row on every insert, update and delete, so reading the current version is one
+# primary key lookup however large tasks grows and whichever process made the change.
+# Inserted and updated rows are stamped with the new version in change_seq, and deleted ids
+# leave a tombstone with theirs, so the changes since any version are two index range scans.
+# The stamping update does not count as a change itself, its change_seq differs. pruned is
+# the newest version whose tombstones have been pruned; tokens older than that cannot sync.
+# Archiving a task deletes it from tasks, so it counts as a change and leaves a tombstone;
+# deleting one from the archive only bumps the version, its tombstone is already there.
+# The triggers are dropped and recreated every time so older databases get the current ones.
+_STAMP_ROW = (
+    "UPDATE tasks_version SET version = version + 1 WHERE id = 1; "
+    "UPDATE tasks SET change_seq = (SELECT version FROM tasks_version WHERE id = 1) WHERE id = new.id; "
+)
+VERSION_COUNTER_DDL = (
+    "CREATE TABLE IF NOT EXISTS tasks_version ("
+    "id INTEGER PRIMARY KEY CHECK (id = 1), version INTEGER NOT NULL, pruned INTEGER NOT NULL DEFAULT 0)",
+    "INSERT OR IGNORE INTO tasks_version (id, version) VALUES (1, 0)",
+    "CREATE TABLE IF NOT EXISTS tasks_tombstones ("
+    "id INTEGER PRIMARY KEY, change_seq INTEGER NOT NULL, deleted_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP)",
+    "CREATE INDEX IF NOT EXISTS ix_tasks_tombstones_change_seq ON tasks_tombstones (change_seq)",
+    "CREATE INDEX IF NOT EXISTS ix_tasks_tombstones_deleted_at ON tasks_tombstones (deleted_at)",
+    "DROP TRIGGER IF EXISTS tasks_version_insert",
+    "DROP TRIGGER IF EXISTS tasks_version_update",
+    "DROP TRIGGER IF EXISTS tasks_version_delete",
+    # A reused id is no longer deleted
+    f"CREATE TRIGGER tasks_version_insert AFTER INSERT ON tasks BEGIN {_STAMP_ROW}"  # noqa: S608 - constant SQL
+    "DELETE FROM tasks_tombstones WHERE id = new.id; END",
+    f"CREATE TRIGGER tasks_version_update AFTER UPDATE ON tasks WHEN new.change_seq IS old.change_seq BEGIN {_STAMP_ROW}END",
+    "CREATE TRIGGER tasks_version_delete AFTER DELETE ON tasks BEGIN "
+    "UPDATE tasks_version SET version = version + 1 WHERE id = 1; "
+    "INSERT OR REPLACE INTO tasks_tombstones (id, change_seq) "
+    "VALUES (old.id, (SELECT version FROM tasks_version WHERE id = 1)); END",
+    "DROP TRIGGER IF EXISTS tasks_archive_version_delete",
+    "CREATE TRIGGER tasks_archive_version_delete AFTER DELETE ON tasks_archive BEGIN "
+    "UPDATE tasks_version SET version = version + 1 WHERE id = 1; END",
+)
+
+
+def create_version_counter(connection: Connection) -> None:
+    for statement in VERSION_COUNTER_DDL:
+        connection.execute(DDL(statement))
+
+
+def drop_version_counter(connection: Connection) -> None:
+    connection.execute(DDL("DROP TABLE IF EXISTS tasks_version"))
+    connection.execute(DDL("DROP TABLE IF EXISTS tasks_tombstones"))
+
+
+# Columns added to existing tables after their first release, as (table, column, definition)
+ADDED_COLUMNS = (
+    ("tasks", "change_seq", "INTEGER NOT NULL DEFAULT 0"),
+    ("tasks_version", "pruned", "INTEGER NOT NULL DEFAULT 0"),
+)
+
+
+def add_missing_columns(connection: Connection) -> None:
+    # Rows that predate change_seq keep 0: every change token is issued later, so they are
+    # only ever part of a full load
+    for table, column, definition in ADDED_COLUMNS:
+        existing = {row[1] for row in connection.exec_driver_sql(f"PRAGMA table_info({table})")}
+        if existing and column not in existing:
+            connection.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+
+event.listen(Task.__table__, "before_drop", lambda target, connection, **kw: drop_version_counter(connection))
+
+
+# Task counts behind GET /tasks/stats: one row per status, priority and color combination,
+# so at most a few dozen rows however large tasks grows. The triggers keep them current on
+# every insert, delete and change of the three columns, bulk statements and other processes
+# included. Archived tasks are counted too; moving one between the tables cancels out. Values are stored as tasks stores them, compact or not; a combination that
+# empties keeps its row with a count of 0. Like the version counter's, the triggers are
+# recreated every time, and the counts are then recomputed when the table is new.
+_COUNT_NEW = (
+    "INSERT INTO tasks_stats (status, priority, color, count) VALUES (new.status, new.priority, new.color, 1) "
+    "ON CONFLICT DO UPDATE SET count = count + 1; "
+)
+_UNCOUNT_OLD = (
+    "UPDATE tasks_stats SET count = count - 1 "
+    "WHERE status = old.status AND priority = old.priority AND color = old.color; "
+)
+TASK_STATS_DDL = (
+    "CREATE TABLE IF NOT EXISTS tasks_stats (status NOT NULL, priority NOT NULL, color NOT NULL, "
+    "count INTEGER NOT NULL, PRIMARY KEY (status, priority, color)) WITHOUT ROWID",
+    "DROP TRIGGER IF EXISTS tasks_stats_insert",
+    "DROP TRIGGER IF EXISTS tasks_stats_update",
+    "DROP TRIGGER IF EXISTS tasks_stats_delete",
+    "DROP TRIGGER IF EXISTS tasks_archive_stats_insert",
+    "DROP TRIGGER IF EXISTS tasks_archive_stats_delete",
+    f"CREATE TRIGGER tasks_stats_insert AFTER INSERT ON tasks BEGIN {_COUNT_NEW}END",
+    "CREATE TRIGGER tasks_stats_update AFTER UPDATE OF status, priority, color ON tasks "
+    "WHEN new.status IS NOT old.status OR new.priority IS NOT old.priority OR new.color IS NOT old.color "
+    f"BEGIN {_UNCOUNT_OLD}{_COUNT_NEW}END",
+    f"CREATE TRIGGER tasks_stats_delete AFTER DELETE ON tasks BEGIN {_UNCOUNT_OLD}END",
+    f"CREATE TRIGGER tasks_archive_stats_insert AFTER INSERT ON tasks_archive BEGIN {_COUNT_NEW}END",
+    f"CREATE TRIGGER tasks_archive_stats_delete AFTER DELETE ON tasks_archive BEGIN {_UNCOUNT_OLD}END",
+)
+
+
+def create_task_stats(connection: Connection) -> None:
+    exists = connection.exec_driver_sql("SELECT 1 FROM sqlite_master WHERE name = 'tasks_stats'").first()
+    for statement in TASK_STATS_DDL:
+        connection.execute(DDL(statement))
+    if not exists:
+        count_task_stats(connection)
+
+
+def count_task_stats(connection: Connection) -> dict[tuple[Any, ...], int]:
+    # Recomputes every count with one scan of tasks and the archive and returns the counts
+    # it replaced. The triggers exist by now and the DELETE starts the write transaction,
+    # so a write from elsewhere lands either before it, and is counted by the scan, or
+    # after the commit, and is counted by its trigger.
+    replaced = connection.exec_driver_sql("DELETE FROM tasks_stats RETURNING status, priority, color, count")
+    previous = {tuple(row[:3]): row[3] for row in replaced}
+    connection.exec_driver_sql(
+        "INSERT INTO tasks_stats (status, priority, color, count) "
+        "SELECT status, priority, color, count(*) FROM "
+        "(SELECT status, priority, color FROM tasks UNION ALL SELECT status, priority, color FROM tasks_archive) "
+        "GROUP BY status, priority, color"
+    )
+    return previous
+
+
+def drop_task_stats(connection: Connection) -> None:
+    # The triggers go first, SQLite will not rename a table while a trigger refers to a
+    # missing one
+    for statement in TASK_STATS_DDL:
+        if statement.startswith("DROP TRIGGER"):
+            connection.execute(DDL(statement))
+    connection.execute(DDL("DROP TABLE IF EXISTS tasks_stats"))
+
+
+event.listen(Task.__table__, "before_drop", lambda target, connection, **kw: drop_task_stats(connection))
+
+
+# Stored as strings or, with COMPACT_ENUMS, as positions in these lists
+ENUM_VALUES = {"color": COLOR_VALUES, "priority": PRIORITY_VALUES, "status": STATUS_VALUES}
+
+
+def rebuild_outdated_tables(connection: Connection) -> None:
+    # SQLite cannot change a column's type or add AUTOINCREMENT in place, so a table whose
+    # enum columns are stored the other way from what COMPACT_ENUMS asks for, or a tasks
+    # table from before AUTOINCREMENT, is rebuilt: copied into a new table of the current
+    # definition with the values converted, then swapped in. The copy and the swap share
+    # one transaction. Dropping the old table takes its indexes and triggers along; the
+    # search triggers are recreated here and the rest by the steps that follow.
+    for table in (Base.metadata.tables["tasks"], Base.metadata.tables["tasks_archive"]):
+        info = connection.exec_driver_sql(f"PRAGMA table_info({table.name})").all()
+        if not info:
+            continue
+        # A declared type containing INT has integer affinity in SQLite; any other is a string
+        declared = {row[1]: row[2].upper() for row in info}
+        stale = [name for name in ENUM_VALUES if name in declared and ("INT" in declared[name]) != COMPACT_ENUMS]
+        definition = connection.exec_driver_sql(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table.name,)
+        ).scalar_one()
+        autoincrement = table.dialect_options["sqlite"]["autoincrement"] and "AUTOINCREMENT" not in definition.upper()
+        if stale or autoincrement:
+            rebuild_table(connection, table, info, stale)
+
+
+def rebuild_table(connection: Connection, table: Any, info: Sequence[Any], stale: list[str]) -> None:
+    storage = "integer" if COMPACT_ENUMS else "string"
+    logger.info("Rebuilding %s, columns converted to %s storage: %s", table.name, storage, ", ".join(stale) or "none")
+    # Untyped columns, so the mapping below is compared as written rather than through the
+    # enum types
+    names = table.columns.keys()
+    old = sql.table(table.name, *map(sql.column, names))
+
+    def converted(name: str) -> Any:
+        if name not in stale:
+            return old.c[name]
+        codes = {value: code for code, value in enumerate(ENUM_VALUES[name])}
+        mapping = codes if COMPACT_ENUMS else {code: value for value, code in codes.items()}
+        return case(mapping, value=old.c[name])
+
+    rebuilt = table.to_metadata(MetaData(), name=f"{table.name}_rebuild")
+    rebuilt.indexes.clear()
+    # Columns keep the nullability they had, older databases may hold NULLs the model
+    # would not accept now
+    for name, nullable in ((row[1], not row[3]) for row in info):
+        if name in rebuilt.c and not rebuilt.c[name].primary_key:
+            rebuilt.c[name].nullable = nullable
+    connection.exec_driver_sql(f"DROP TABLE IF EXISTS {rebuilt.name}")
+    connection.execute(CreateTable(rebuilt))
+    # A value outside the lists becomes NULL and fails the NOT NULL constraint, which rolls
+    # the conversion back and leaves the table as it was
+    connection.execute(insert(rebuilt).from_select(names, select(*map(converted, names))))
+    searchable = connection.exec_driver_sql("SELECT 1 FROM sqlite_master WHERE name = 'tasks_fts'").first()
+    connection.exec_driver_sql(f"DROP TABLE {table.name}")
+    # The counts are keyed by the stored values, so they are recomputed in the new form
+    drop_task_stats(connection)
+    connection.exec_driver_sql(f"ALTER TABLE {rebuilt.name} RENAME TO {table.name}")
+    # The rowids are kept, so an existing search index is still current
+    if table.name == "tasks" and searchable:
+        create_search_index(connection)
+
+
+def create_missing_indexes(connection: Connection) -> None:
+    # create_all skips tables that already exist, indexes included, so databases created
+    # before an index was added get it here
+    for index in Base.metadata.tables["tasks"].indexes:
+        index.create(connection, checkfirst=True)
+
+
+# Runs on every create_all, so databases that predate a column, an index, the version
+# counter or the stats counts get them, and the enum storage follows COMPACT_ENUMS;
+# columns and storage first, the indexes and triggers may refer to them
+event.listen(Base.metadata, "after_create", lambda target, connection, **kw: add_missing_columns(connection))
+event.listen(Base.metadata, "after_create", lambda target, connection, **kw: rebuild_outdated_tables(connection))
+event.listen(Base.metadata, "after_create", lambda target, connection, **kw: create_missing_indexes(connection))
+event.listen(Base.metadata, "after_create", lambda target, connection, **kw: create_version_counter(connection))
+event.listen(Base.metadata, "after_create", lambda target, connection, **kw: create_task_stats(connection))
+
+
+def create_schema() -> None:
+    # Explicit startup step, run by the entry points rather than on import: creates whatever
+    # tables, indexes and triggers the database is missing
+    Base.metadata.create_all(bind=engine)
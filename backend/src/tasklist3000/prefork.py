@@ -0,0 +1,87 @@
+# Prefork server for the Flask backend.
+#
+# The parent binds the listening socket once and forks the workers, each of which builds its
+# own app and accepts connections on the shared socket with a threaded werkzeug server, so
+# the kernel spreads connections across processes. A worker that dies is replaced, unless it
+# died right after starting, which would only repeat. SIGINT and SIGTERM stop every worker.
+# Without fork (Windows) a single process is served instead.
+
+import contextlib
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+from typing import Any, Callable
+
+from werkzeug.serving import make_server
+
+logger = logging.getLogger(__name__)
+
+# A worker exiting sooner than this after being forked is treated as failing to start
+MIN_WORKER_LIFETIME = 1.0  # seconds
+
+
+def _run_worker(app_factory: Callable[[], Any], host: str, port: int, fd: int) -> None:
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    make_server(host, port, app_factory(), threaded=True, fd=fd).serve_forever()
+
+
+def _spawn(app_factory: Callable[[], Any], host: str, port: int, fd: int) -> int:
+    pid = os.fork()
+    if pid == 0:
+        # Never return into the parent's code, whatever happens in the worker
+        code = 1
+        try:
+            _run_worker(app_factory, host, port, fd)
+            code = 0
+        except Exception:
+            logger.exception("Worker %d failed", os.getpid())
+        finally:
+            os._exit(code)
+    return pid
+
+
+def serve_prefork(app_factory: Callable[[], Any], host: str, port: int, workers: int) -> None:
+    if workers <= 1 or not hasattr(os, "fork"):
+        make_server(host, port, app_factory(), threaded=True).serve_forever()
+        return
+
+    listener = socket.create_server((host, port))
+    fd = listener.fileno()
+    children: dict[int, float] = {}
+    stopping = failed = False
+
+    def stop(signum: int, frame: Any) -> None:
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            # Already gone and waiting to be reaped
+            with contextlib.suppress(ProcessLookupError):
+                os.kill(pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    for _ in range(workers):
+        children[_spawn(app_factory, host, port, fd)] = time.monotonic()
+    logger.info("Serving on http://%s:%d with %d worker processes", host, port, workers)
+
+    try:
+        while children:
+            pid, status = os.wait()
+            started = children.pop(pid, None)
+            if stopping or started is None:
+                continue
+            if time.monotonic() - started < MIN_WORKER_LIFETIME:
+                logger.error("Worker %d exited with status %d on startup, shutting down", pid, status)
+                failed = True
+                stop(signal.SIGTERM, None)
+                continue
+            logger.warning("Worker %d exited with status %d, starting a new one", pid, status)
+            children[_spawn(app_factory, host, port, fd)] = time.monotonic()
+    finally:
+        listener.close()
+    if failed:
+        sys.exit(1)
@@ -0,0 +1,72 @@
+# Per-request SQL statement counts and timings, plus a slow query log.
+#
+# Cursor execute events on every engine built by models time each statement. While a request
+# is being tracked (see track), the count and total time are added to that request's
+# QueryStats, which the request hooks in metrics turn into a Server-Timing header. The stats
+# live in a context variable, so concurrent requests on one event loop or thread pool each
+# see their own; SQLAlchemy runs async session work in greenlets that inherit the caller's
+# context, so run_sync queries are attributed to the request that awaited them.
+#
+# Statements slower than SLOW_QUERY_MS are logged with their SQL text only; parameter values
+# can hold task text, so just their count is written.
+
+import logging
+import time
+from contextvars import ContextVar, Token
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from .config import SLOW_QUERY_MS
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class QueryStats:
+    count: int = 0
+    seconds: float = 0.0
+
+    def server_timing(self) -> str:
+        return f'db;dur={self.seconds * 1000:.2f};desc="{self.count} queries"'
+
+
+_current: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+
+def track() -> tuple[QueryStats, Token]:
+    # Start attributing statements in the current context to a fresh QueryStats
+    stats = QueryStats()
+    return stats, _current.set(stats)
+
+
+def untrack(token: Token) -> None:
+    _current.reset(token)
+
+
+def before_cursor_execute(
+    conn: Any, cursor: Any, statement: str, parameters: Any, context: Any, executemany: bool
+) -> None:
+    # Statements on one connection never overlap, so a single start time per connection is
+    # enough; a failed statement's start is simply overwritten by the next one
+    conn.info["query_started"] = time.perf_counter()
+
+
+def after_cursor_execute(
+    conn: Any, cursor: Any, statement: str, parameters: Any, context: Any, executemany: bool
+) -> None:
+    elapsed = time.perf_counter() - conn.info.pop("query_started")
+    stats = _current.get()
+    if stats is not None:
+        stats.count += 1
+        stats.seconds += elapsed
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        rows = len(parameters) if executemany else 1
+        values = len(parameters[0]) if executemany and parameters else len(parameters or ())
+        logger.warning(
+            "Slow query (%.1f ms, %d row(s) of %d redacted parameter(s)): %s",
+            elapsed * 1000,
+            rows,
+            values,
+            " ".join(statement.split()),
+        )
+
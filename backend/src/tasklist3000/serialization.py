@@ -0,0 +1,132 @@
+# Shared JSON encoding for task payloads.
+#
+# The handlers in all three backends encode tasks straight to JSON bytes through here.
+# orjson is used when it is installed (pip install tasklist3000[speedups]), otherwise a
+# preconfigured stdlib encoder produces the same document.
+
+import json
+from collections.abc import AsyncIterable, AsyncIterator, Iterable, Iterator
+from datetime import date, datetime
+from typing import Any, TypedDict
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - exercised only without the speedups extra
+    orjson = None  # type: ignore[assignment]
+
+
+# Columns sent to clients for every task, in response order
+TASK_FIELDS = ("id", "title", "description", "status", "priority", "color", "full_text")
+# What a list response carries unless fields= asks for more: full_text is unbounded and
+# only the single task view shows it
+LIST_FIELDS = tuple(field for field in TASK_FIELDS if field != "full_text")
+
+
+class TaskDict(TypedDict):
+    id: int
+    title: str
+    description: str
+    status: str
+    priority: str
+    color: str
+    full_text: str
+
+
+def _default(obj: Any) -> Any:
+    # Match orjson, which writes datetimes as ISO 8601
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    # Anything else fails the way json.dumps does
+    return json.JSONEncoder.default(_encoder, obj)
+
+
+_encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"), default=_default)
+
+
+def dumps(obj: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return _encoder.encode(obj).encode()
+
+
+# Return a dictionary with all task fields. Works for ORM objects and result rows alike.
+def serialize_task(task: Any) -> TaskDict:
+    return {
+        "id": task.id,
+        "title": task.title,
+        "description": task.description,
+        "status": task.status,
+        "priority": task.priority,
+        "color": task.color,
+        "full_text": task.full_text,
+    }
+
+
+# Only the requested fields, for projected responses
+def serialize_fields(task: Any, fields: tuple[str, ...]) -> dict[str, Any]:
+    return {field: getattr(task, field) for field in fields}
+
+
+class SearchResultDict(TaskDict):
+    rank: float
+    snippet: str
+
+
+def serialize_search_result(row: Any) -> SearchResultDict:
+    return {**serialize_task(row), "rank": row.rank, "snippet": row.snippet}
+
+
+def dumps_search_results(rows: Iterable[Any]) -> bytes:
+    return dumps([serialize_search_result(row) for row in rows])
+
+
+class ChangesDict(TypedDict):
+    tasks: list[TaskDict]
+    deleted: list[int]
+    token: str
+    more: bool
+
+
+def dumps_changes(changes: Any) -> bytes:
+    # changes is a crud.TaskChanges; "more" means there are further changes after token
+    body: ChangesDict = {
+        "tasks": [serialize_task(task) for task in changes.tasks],
+        "deleted": changes.deleted,
+        "token": changes.token,
+        "more": changes.more,
+    }
+    return dumps(body)
+
+
+def dumps_task(task: Any) -> bytes:
+    return dumps(serialize_task(task))
+
+
+def dumps_tasks(tasks: Iterable[Any], fields: tuple[str, ...] = TASK_FIELDS) -> bytes:
+    if fields == TASK_FIELDS:
+        return dumps([serialize_task(task) for task in tasks])
+    return dumps([serialize_fields(task, fields) for task in tasks])
+
+
+# Newline-delimited JSON export. Lines are grouped into chunks so a streaming response
+# makes one write per chunk instead of one per task.
+def iter_ndjson(tasks: Iterable[Any], chunk_size: int = 1000) -> Iterator[bytes]:
+    lines = []
+    for task in tasks:
+        lines.append(dumps_task(task))
+        if len(lines) >= chunk_size:
+            yield b"\n".join(lines) + b"\n"
+            lines = []
+    if lines:
+        yield b"\n".join(lines) + b"\n"
+
+
+async def aiter_ndjson(tasks: AsyncIterable[Any], chunk_size: int = 1000) -> AsyncIterator[bytes]:
+    lines = []
+    async for task in tasks:
+        lines.append(dumps_task(task))
+        if len(lines) >= chunk_size:
+            yield b"\n".join(lines) + b"\n"
+            lines = []
+    if lines:
+        yield b"\n".join(lines) + b"\n"
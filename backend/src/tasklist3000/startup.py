@@ -0,0 +1,13 @@
+# Start-up work shared by every way of running the server: python -m tasklist3000 and the
+# __main__ blocks of main, main_fastapi and main_flask, which the Docker image runs directly.
+
+from .archive import archiver
+from .models import create_schema, log_engine_profile
+
+
+def prepare_server() -> None:
+    # Runs in the process that then starts or forks the workers, after logging is configured
+    create_schema()
+    log_engine_profile()
+    # Archives and prunes tombstones on its first tick and every ARCHIVE_INTERVAL after
+    archiver.start()
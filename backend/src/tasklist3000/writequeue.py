@@ -0,0 +1,163 @@
+# Group commit for single task writes.
+#
+# SQLite has one writer at a time and every commit waits on the disk, so with a transaction
+# per request, write throughput is capped by the commit rate. With WRITE_BATCH_SIZE set,
+# creates, bulk creates, updates and deletes go through this queue instead: a committer thread
+# takes the first pending write, keeps collecting for WRITE_BATCH_WINDOW or until
+# WRITE_BATCH_SIZE writes are in hand, applies them in one transaction and commits once.
+# Every backend writes through run or run_async, which fall back to a transaction of the
+# write's own when the queue is disabled.
+#
+# Every write runs in its own savepoint inside the group's transaction (the engine sends its
+# own BEGIN, see models.use_explicit_transactions), so one that fails only fails its own caller's
+# future; if the commit itself fails, every write in the group gets that error. Futures
+# are resolved only after the commit, so no caller sees a write that could still be lost.
+# The session does not expire on commit, so returned rows stay readable once detached.
+# Statements run on the committer thread do not count toward the caller's Server-Timing.
+
+import asyncio
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, NamedTuple, Optional, TypeVar
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, sessionmaker
+
+from .config import WRITE_BATCH_SIZE, WRITE_BATCH_WINDOW
+from .metrics import request_metrics
+from .models import engine
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+def commit_write(db: Session, write: Callable[..., T], *args: Any) -> T:
+    # write(db, *args) in a transaction of its own, for when the queue is disabled
+    try:
+        result = write(db, *args)
+        db.commit()
+    except BaseException:
+        db.rollback()
+        raise
+    return result
+
+
+class PendingWrite(NamedTuple):
+    apply: Callable[[Session], Any]
+    future: Future
+
+
+class WriteQueue:
+    def __init__(self, session_factory: Callable[[], Session], max_batch: int, window: float) -> None:
+        self.session_factory = session_factory
+        self.max_batch = max_batch
+        self.window = window
+        self._pending: queue.SimpleQueue[Optional[PendingWrite]] = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_batch > 0
+
+    def submit(self, write: Callable[..., T], *args: Any) -> "Future[T]":
+        # write(session, *args) is run on the committer thread, without committing
+        future: Future[T] = Future()
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="write-queue", daemon=True)
+                self._thread.start()
+            self._pending.put(PendingWrite(lambda db: write(db, *args), future))
+        return future
+
+    def run(self, write: Callable[..., T], *args: Any) -> T:
+        # For threaded servers: waits until the write is committed, through the queue or in a
+        # session of its own that does not expire the returned rows
+        if self.enabled:
+            return self.submit(write, *args).result()
+        with self.session_factory() as db:
+            return commit_write(db, write, *args)
+
+    async def run_async(self, db: AsyncSession, write: Callable[..., T], *args: Any) -> T:
+        # For async servers: db is only used when the queue is disabled
+        if self.enabled:
+            return await asyncio.wrap_future(self.submit(write, *args))
+        return await db.run_sync(commit_write, write, *args)
+
+    def close(self) -> None:
+        # Commits whatever is still pending and stops the committer thread
+        with self._lock:
+            thread, self._thread = self._thread, None
+            if thread is not None:
+                self._pending.put(None)
+        if thread is not None:
+            thread.join()
+
+    def after_fork(self) -> None:
+        # The committer thread does not survive a fork; a child starts its own on first use
+        self._pending = queue.SimpleQueue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            write = self._pending.get()
+            if write is None:
+                return
+            batch = [write]
+            deadline = time.monotonic() + self.window
+            # Once the window is over, writes that are already waiting still join the group
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                try:
+                    write = self._pending.get(timeout=timeout) if timeout > 0 else self._pending.get_nowait()
+                except queue.Empty:
+                    break
+                if write is None:
+                    stopping = True
+                    break
+                batch.append(write)
+            self._commit(batch)
+
+    def _commit(self, batch: list[PendingWrite]) -> None:
+        started = time.perf_counter()
+        outcomes: list[tuple[Future, Any, Optional[Exception]]] = []
+        try:
+            with self.session_factory() as db:
+                for write in batch:
+                    if not write.future.set_running_or_notify_cancel():
+                        continue
+                    try:
+                        with db.begin_nested():
+                            outcomes.append((write.future, write.apply(db), None))
+                    except Exception as e:
+                        outcomes.append((write.future, None, e))
+                db.commit()
+        except Exception as e:
+            logger.exception("Group commit of %d writes failed", len(batch))
+            for write in batch:
+                if write.future.running():
+                    write.future.set_exception(e)
+            return
+        request_metrics.observe_write_batch(len(outcomes), time.perf_counter() - started)
+        for future, result, error in outcomes:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+
+write_queue = WriteQueue(
+    sessionmaker(bind=engine, autoflush=False, expire_on_commit=False), WRITE_BATCH_SIZE, WRITE_BATCH_WINDOW
+)
+# Writes accepted before a clean shutdown are still committed
+atexit.register(write_queue.close)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=write_queue.after_fork)
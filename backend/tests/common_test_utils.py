@@ -1,3 +1,7 @@
+import json
+import threading
+import time
+
 import httpx
 import pytest
 
@@ -40,6 +44,26 @@ def test_create_task() -> None:
     assert data.get("description") == "Task added successfully"
 
 
+def test_create_task_with_invalid_values() -> None:
+    """Test that values outside the configured choices are rejected and never stored."""
+    task = {
+        "title": "Test Task",
+        "description": "This is a test task",
+        "full_text": "Sample full text",
+        "color": "Pink",
+        "priority": "Medium",
+        "status": "Pending",
+    }
+    assert httpx.post(f"{BASE_URL}/tasks", json=task).status_code == 400
+    created = httpx.post(f"{BASE_URL}/tasks", json={**task, "color": "Red"}).json()["id"]
+    assert httpx.put(f"{BASE_URL}/tasks/{created}", json={"priority": "Urgent"}).status_code == 400
+    assert httpx.get(f"{BASE_URL}/tasks/{created}").json()["priority"] == "Medium"
+    # The list and the counts still load every stored row
+    assert httpx.get(f"{BASE_URL}/tasks", params={"limit": 100000}).status_code == 200
+    assert httpx.get(f"{BASE_URL}/tasks/stats").status_code == 200
+    assert httpx.delete(f"{BASE_URL}/tasks/{created}").status_code == 200
+
+
 def test_get_tasks() -> None:
     """Test retrieving all tasks."""
     response = httpx.get(f"{BASE_URL}/tasks")
@@ -101,3 +125,408 @@ def test_get_config() -> None:
     assert config["priority_values"] == PRIORITY_VALUES
     assert config["status_values"] == STATUS_VALUES
     assert config["color_values"] == COLOR_VALUES
+
+
+def test_get_tasks_with_cursor() -> None:
+    """Test paging through tasks with the opaque next cursor."""
+    task = {
+        "title": "Cursor Task",
+        "description": "This is a test task",
+        "full_text": "Sample full text",
+        "color": "Red",
+        "priority": "Medium",
+        "status": "Pending",
+    }
+    for _ in range(3):
+        httpx.post(f"{BASE_URL}/tasks", json=task)
+
+    response = httpx.get(f"{BASE_URL}/tasks", params={"limit": 2})
+    assert response.status_code == 200
+    first_page = response.json()
+    assert len(first_page) == 2
+    cursor = response.headers.get("X-Next-Cursor")
+    assert cursor is not None
+
+    response = httpx.get(f"{BASE_URL}/tasks", params={"limit": 2, "cursor": cursor})
+    assert response.status_code == 200
+    second_page = response.json()
+    assert len(second_page) > 0
+    assert second_page[0]["id"] > first_page[-1]["id"]
+
+    # Walk every page in both orders. Cursors for most ids and every sorted cursor end in
+    # base64 padding, which has to survive the query string.
+    for _ in range(12):
+        httpx.post(f"{BASE_URL}/tasks", json=task)
+    every = [item["id"] for item in httpx.get(f"{BASE_URL}/tasks", params={"limit": 100000}).json()]
+    assert max(every) > 10
+    for order_by in ("id", "-created_at"):
+        seen: list = []
+        params = {"limit": 5, "order_by": order_by}
+        while True:
+            response = httpx.get(f"{BASE_URL}/tasks", params=params)
+            assert response.status_code == 200
+            seen += [item["id"] for item in response.json()]
+            if "X-Next-Cursor" not in response.headers:
+                break
+            params["cursor"] = response.headers["X-Next-Cursor"]
+        assert sorted(seen) == sorted(every)
+
+
+def test_task_fields() -> None:
+    """Test that lists leave out full_text unless asked and fields= picks the columns."""
+    task = {
+        "title": "Projected Task",
+        "description": "Listed without its notes",
+        "full_text": "Long notes",
+        "color": "Purple",
+        "priority": "High",
+        "status": "Pending",
+    }
+    task_id = httpx.post(f"{BASE_URL}/tasks", json=task).json()["id"]
+    response = httpx.get(f"{BASE_URL}/tasks", params={"limit": 1000})
+    assert response.status_code == 200
+    assert all("full_text" not in listed for listed in response.json())
+
+    response = httpx.get(f"{BASE_URL}/tasks", params={"limit": 1000, "fields": "title,full_text"})
+    assert response.status_code == 200
+    listed = {item["id"]: item for item in response.json()}
+    assert listed[task_id] == {"id": task_id, "title": "Projected Task", "full_text": "Long notes"}
+
+    response = httpx.get(f"{BASE_URL}/tasks/{task_id}")
+    assert response.json()["full_text"] == "Long notes"
+    response = httpx.get(f"{BASE_URL}/tasks/{task_id}", params={"fields": "status"})
+    assert response.status_code == 200
+    assert response.json() == {"id": task_id, "status": "Pending"}
+    assert httpx.get(f"{BASE_URL}/tasks", params={"fields": "owner"}).status_code == 400
+
+
+def test_compressed_responses() -> None:
+    """Test that large responses are compressed as negotiated and small ones are not."""
+    task = {
+        "title": "Compressed Task",
+        "description": "Sent as gzip",
+        "full_text": "Lorem ipsum dolor sit amet " * 20,
+        "color": "Yellow",
+        "priority": "Low",
+        "status": "Pending",
+    }
+    for _ in range(5):
+        httpx.post(f"{BASE_URL}/tasks", json=task)
+    gzip_only = {"Accept-Encoding": "gzip"}
+    response = httpx.get(f"{BASE_URL}/tasks", params={"fields": "title,full_text"}, headers=gzip_only)
+    assert response.status_code == 200
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["Vary"]
+    assert len(response.json()) >= 5
+
+    response = httpx.get(f"{BASE_URL}/tasks/export", headers=gzip_only)
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert all(json.loads(line)["id"] for line in response.text.splitlines())
+
+    assert "Content-Encoding" not in httpx.get(f"{BASE_URL}/status", headers=gzip_only).headers
+    response = httpx.get(f"{BASE_URL}/tasks", headers={"Accept-Encoding": "identity"})
+    assert "Content-Encoding" not in response.headers
+
+
+def test_create_tasks_bulk() -> None:
+    """Test creating several tasks in one request."""
+    task = {
+        "title": "Bulk Task",
+        "description": "This is a test task",
+        "full_text": "Sample full text",
+        "color": "Red",
+        "priority": "Medium",
+        "status": "Pending",
+    }
+    response = httpx.post(f"{BASE_URL}/tasks/bulk", json=[task, {**task, "status": "Unknown"}, task])
+    assert response.status_code == 200
+    data = response.json()
+    ids = data.get("ids")
+    assert len(ids) == 3
+    assert ids[1] is None
+    assert ids[0] < ids[2]
+    assert [error["index"] for error in data.get("errors")] == [1]
+
+    response = httpx.get(f"{BASE_URL}/tasks/{ids[2]}")
+    assert response.status_code == 200
+    assert response.json()["title"] == "Bulk Task"
+
+
+def test_export_tasks() -> None:
+    """Test exporting every task as newline-delimited JSON."""
+    response = httpx.get(f"{BASE_URL}/tasks")
+    assert response.status_code == 200
+
+    response = httpx.get(f"{BASE_URL}/tasks/export")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = response.text.splitlines()
+    assert len(lines) > 0
+    ids = [json.loads(line)["id"] for line in lines]
+    assert ids == sorted(ids)
+
+
+def test_search_tasks() -> None:
+    """Test full-text search over task text."""
+    task = {
+        "title": "Quarterly zeppelin review",
+        "description": "This is a test task",
+        "full_text": "Sample full text",
+        "color": "Red",
+        "priority": "Medium",
+        "status": "Pending",
+    }
+    response = httpx.post(f"{BASE_URL}/tasks", json=task)
+    assert response.status_code == 200
+    created_task_id = response.json().get("id")
+
+    response = httpx.get(f"{BASE_URL}/tasks/search", params={"q": "zeppelin"})
+    assert response.status_code == 200
+    results = response.json()
+    assert [result["id"] for result in results] == [created_task_id]
+    assert "<mark>zeppelin</mark>" in results[0]["snippet"]
+    assert "rank" in results[0]
+    # Several terms arrive form-encoded, and all of them have to match
+    response = httpx.get(f"{BASE_URL}/tasks/search", params={"q": "review quarterly"})
+    assert [result["id"] for result in response.json()] == [created_task_id]
+    assert httpx.get(f"{BASE_URL}/tasks/search", params={"q": "zeppelin quartz"}).json() == []
+
+
+def test_filter_tasks() -> None:
+    """Test that filter values with spaces, commas and colons reach the list intact."""
+    task = {
+        "title": "Filtered Task",
+        "description": "This is a test task",
+        "full_text": "Sample full text",
+        "color": "Green",
+        "priority": "High",
+        "status": "In Progress",
+    }
+    created = httpx.post(f"{BASE_URL}/tasks", json=task).json()["id"]
+    params = {"order_by": "-id", "limit": 1}
+    for status in ("In Progress", "Pending,In Progress"):
+        response = httpx.get(f"{BASE_URL}/tasks", params={**params, "status": status})
+        assert response.status_code == 200
+        assert [item["id"] for item in response.json()] == [created]
+    response = httpx.get(f"{BASE_URL}/tasks", params={**params, "created_after": "2000-01-01T00:00:00"})
+    assert [item["id"] for item in response.json()] == [created]
+    response = httpx.get(f"{BASE_URL}/tasks", params={**params, "created_before": "2000-01-01T00:00:00"})
+    assert response.json() == []
+    # Values that do not parse are a bad request on every backend
+    for invalid in ({"status": "Done"}, {"created_after": "yesterday"}, {"order_by": "title"}):
+        assert httpx.get(f"{BASE_URL}/tasks", params=invalid).status_code == 400
+
+
+def test_conditional_get() -> None:
+    """Test that unchanged tasks and lists are answered with 304 Not Modified."""
+    task = {
+        "title": "Polled Task",
+        "description": "Read with If-None-Match",
+        "full_text": "Sample full text",
+        "color": "Green",
+        "priority": "Low",
+        "status": "Pending",
+    }
+    response = httpx.post(f"{BASE_URL}/tasks", json=task)
+    assert response.status_code == 200
+    task_id = response.json()["id"]
+
+    response = httpx.get(f"{BASE_URL}/tasks/{task_id}")
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+    response = httpx.get(f"{BASE_URL}/tasks/{task_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+
+    response = httpx.get(f"{BASE_URL}/tasks")
+    assert response.status_code == 200
+    list_etag = response.headers["ETag"]
+    response = httpx.get(f"{BASE_URL}/tasks", headers={"If-None-Match": list_etag})
+    assert response.status_code == 304
+
+    # Any write changes both tags
+    response = httpx.put(f"{BASE_URL}/tasks/{task_id}", json={"title": "Polled Task, edited"})
+    assert response.status_code == 200
+    response = httpx.get(f"{BASE_URL}/tasks/{task_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["title"] == "Polled Task, edited"
+    response = httpx.get(f"{BASE_URL}/tasks", headers={"If-None-Match": list_etag})
+    assert response.status_code == 200
+
+
+def test_metrics_endpoint() -> None:
+    """Test that requests show up in the Prometheus metrics."""
+    response = httpx.get(f"{BASE_URL}/tasks")
+    assert response.status_code == 200
+    response = httpx.get(f"{BASE_URL}/metrics")
+    assert response.status_code == 200
+    assert response.headers["Content-Type"].startswith("text/plain")
+    lines = response.text.splitlines()
+    assert any(line.startswith('http_requests_total{method="GET",route="/tasks",status="200"} ') for line in lines)
+    assert any(line.startswith('http_request_duration_seconds_count{method="GET",route="/tasks"} ') for line in lines)
+    assert any(line.startswith('task_cache_requests_total{result="hit"} ') for line in lines)
+
+
+def test_server_timing_header() -> None:
+    """Test that responses report the request's SQL statements in Server-Timing."""
+    response = httpx.get(f"{BASE_URL}/tasks")
+    assert response.status_code == 200
+    timing = response.headers["Server-Timing"]
+    assert timing.startswith("db;dur=")
+    # The version lookup and the list query
+    assert timing.endswith('desc="2 queries"')
+
+
+def read_task_events(received: list, count: int, headers: dict) -> None:
+    """Collect (id, event, data) from /tasks/events until count events arrived or the stream ended."""
+    with httpx.stream("GET", f"{BASE_URL}/tasks/events", headers=headers, timeout=30) as response:
+        assert response.headers["Content-Type"].startswith("text/event-stream")
+        fields: dict = {}
+        for line in response.iter_lines():
+            if line:
+                name, _, value = line.partition(": ")
+                fields[name] = value
+                continue
+            if "event" in fields:
+                received.append((int(fields["id"]), fields["event"], json.loads(fields["data"])))
+                if len(received) >= count:
+                    return
+            fields = {}
+
+
+def test_task_events() -> None:
+    """Test that writes are announced on /tasks/events and replayed after Last-Event-ID."""
+    received: list = []
+    reader = threading.Thread(target=read_task_events, args=(received, 1, {}))
+    reader.start()
+    # Let the subscription register before writing
+    time.sleep(0.5)
+    task = {
+        "title": "Announced Task",
+        "description": "Watched through the event stream",
+        "full_text": "Sample full text",
+        "color": "Blue",
+        "priority": "High",
+        "status": "Pending",
+    }
+    response = httpx.post(f"{BASE_URL}/tasks", json=task)
+    assert response.status_code == 200
+    task_id = response.json()["id"]
+    reader.join(timeout=20)
+    assert [(event, data) for _, event, data in received] == [("created", {"id": task_id})]
+
+    # Changes made while disconnected come back on reconnect
+    last_event_id = received[0][0]
+    assert httpx.put(f"{BASE_URL}/tasks/{task_id}", json={"status": "Completed"}).status_code == 200
+    assert httpx.delete(f"{BASE_URL}/tasks/{task_id}").status_code == 200
+    replayed: list = []
+    read_task_events(replayed, 2, {"Last-Event-ID": str(last_event_id)})
+    assert [(event, data) for _, event, data in replayed] == [("updated", {"id": task_id}), ("deleted", {"id": task_id})]
+    assert [event_id for event_id, _, _ in replayed] == [last_event_id + 1, last_event_id + 2]
+
+
+def test_task_stats() -> None:
+    """Test that /tasks/stats counts tasks and follows writes."""
+    before = httpx.get(f"{BASE_URL}/tasks/stats", params={"crosstab": "status,color"})
+    assert before.status_code == 200
+    task = {
+        "title": "Counted Task",
+        "description": "Shows up in the stats",
+        "full_text": "Sample full text",
+        "color": "Purple",
+        "priority": "High",
+        "status": "In Progress",
+    }
+    task_id = httpx.post(f"{BASE_URL}/tasks", json=task).json()["id"]
+    # The counts are tagged from the change counter, so the old tag no longer matches
+    response = httpx.get(
+        f"{BASE_URL}/tasks/stats",
+        params={"crosstab": "status,color"},
+        headers={"If-None-Match": before.headers["ETag"]},
+    )
+    assert response.status_code == 200
+    stats, old = response.json(), before.json()
+    assert stats["total"] == old["total"] + 1
+    assert stats["priority"]["High"] == old["priority"]["High"] + 1
+    assert stats["crosstab"]["In Progress"]["Purple"] == old["crosstab"]["In Progress"]["Purple"] + 1
+    response = httpx.get(
+        f"{BASE_URL}/tasks/stats", params={"crosstab": "status,color"}, headers={"If-None-Match": response.headers["ETag"]}
+    )
+    assert response.status_code == 304
+
+    assert httpx.delete(f"{BASE_URL}/tasks/{task_id}").status_code == 200
+    assert httpx.get(f"{BASE_URL}/tasks/stats").json()["total"] == old["total"]
+    assert httpx.get(f"{BASE_URL}/tasks/stats", params={"crosstab": "status,title"}).status_code == 400
+
+
+def test_task_changes() -> None:
+    """Test that /tasks/changes returns only what changed since the token."""
+    response = httpx.get(f"{BASE_URL}/tasks/changes")
+    assert response.status_code == 200
+    token = response.json()["token"]
+    task = {
+        "title": "Synced Task",
+        "description": "Fetched through delta sync",
+        "full_text": "Sample full text",
+        "color": "Green",
+        "priority": "Low",
+        "status": "Pending",
+    }
+    kept = httpx.post(f"{BASE_URL}/tasks", json=task).json()["id"]
+    removed = httpx.post(f"{BASE_URL}/tasks", json=task).json()["id"]
+    assert httpx.put(f"{BASE_URL}/tasks/{kept}", json={"status": "Completed"}).status_code == 200
+    assert httpx.delete(f"{BASE_URL}/tasks/{removed}").status_code == 200
+
+    response = httpx.get(f"{BASE_URL}/tasks/changes", params={"since": token})
+    assert response.status_code == 200
+    changes = response.json()
+    assert [(task["id"], task["status"]) for task in changes["tasks"]] == [(kept, "Completed")]
+    assert changes["deleted"] == [removed]
+    assert changes["more"] is False
+    response = httpx.get(f"{BASE_URL}/tasks/changes", params={"since": changes["token"]})
+    assert response.json()["tasks"] == [] and response.json()["deleted"] == []
+
+    assert httpx.get(f"{BASE_URL}/tasks/changes", params={"since": "nonsense"}).status_code == 400
+    assert httpx.get(f"{BASE_URL}/tasks/changes", params={"since": "999999999"}).status_code == 410
+
+
+def test_include_archived() -> None:
+    """Test that archived tasks are read by id, and listed only with include_archived."""
+    from sqlalchemy import text
+
+    from tasklist3000 import crud
+    from tasklist3000.models import SessionLocal
+
+    task = {
+        "title": "Archived Task",
+        "description": "Completed long ago",
+        "full_text": "Sample full text",
+        "color": "Yellow",
+        "priority": "Low",
+        "status": "Completed",
+    }
+    task_id = httpx.post(f"{BASE_URL}/tasks", json=task).json()["id"]
+    # The server shares the database, so backdate the task and archive it from here
+    with SessionLocal() as db:
+        db.execute(text("UPDATE tasks SET modified_at = '2000-01-01 00:00:00' WHERE id = :id"), {"id": task_id})
+        db.commit()
+        assert crud.archive_tasks(db, 365 * 24 * 3600) == 1
+
+    params = {"status": "Completed", "order_by": "-id", "limit": "1"}
+    response = httpx.get(f"{BASE_URL}/tasks", params=params)
+    assert response.status_code == 200
+    assert [item["id"] for item in response.json()] != [task_id]
+    response = httpx.get(f"{BASE_URL}/tasks", params={**params, "include_archived": "true"})
+    assert response.status_code == 200
+    assert [(item["id"], item["title"]) for item in response.json()] == [(task_id, "Archived Task")]
+    response = httpx.get(f"{BASE_URL}/tasks/{task_id}")
+    assert response.status_code == 200
+    assert response.json()["title"] == "Archived Task"
+    # FastAPI validates the flag itself and answers 422
+    assert httpx.get(f"{BASE_URL}/tasks", params={"include_archived": "maybe"}).status_code in (400, 422)
+
+    # Updating the task brings it back to the live list
+    assert httpx.put(f"{BASE_URL}/tasks/{task_id}", json={"status": "Pending"}).status_code == 200
+    response = httpx.get(f"{BASE_URL}/tasks", params={"status": "Pending", "order_by": "-id", "limit": "1"})
+    assert [item["id"] for item in response.json()] == [task_id]
+    assert httpx.delete(f"{BASE_URL}/tasks/{task_id}").status_code == 200
@@ -0,0 +1,98 @@
+import time
+from pathlib import Path
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+
+import tasklist3000
+from tasklist3000 import crud
+from tasklist3000.archive import Archiver
+from tasklist3000.models import Base, Task, TaskArchive, create_sqlite_engine
+
+TASK_DATA = {
+    "title": "Finished Task",
+    "description": "Done long ago",
+    "full_text": "Sample full text",
+    "color": "Red",
+    "priority": "Low",
+    "status": "Completed",
+}
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_sqlite_engine(f"sqlite:///{tmp_path / 'tasks.db'}")
+    Base.metadata.create_all(bind=engine)
+    yield sessionmaker(bind=engine, autoflush=False)
+    engine.dispose()
+
+
+def make_old_tasks(session_factory, count):
+    with session_factory() as db:
+        ids, errors = crud.create_tasks(db, [TASK_DATA] * count)
+        assert not errors
+        db.execute(text("UPDATE tasks SET modified_at = '2020-01-01 00:00:00'"))
+        db.commit()
+    return ids
+
+
+def counts(session_factory):
+    with session_factory() as db:
+        return db.query(Task).count(), db.query(TaskArchive).count()
+
+
+def tombstones(session_factory):
+    with session_factory() as db:
+        return db.execute(text("SELECT id FROM tasks_tombstones ORDER BY id")).scalars().all()
+
+
+def test_run_pass_moves_every_batch(session_factory):
+    make_old_tasks(session_factory, 5)
+    archiver = Archiver(session_factory, 24 * 3600, 2, 0, 24 * 3600)
+    assert archiver.run_pass() == 5
+    assert counts(session_factory) == (0, 5)
+    assert archiver.run_pass() == 0
+
+
+def test_thread_archives_on_start(session_factory):
+    make_old_tasks(session_factory, 3)
+    disabled = Archiver(session_factory, 24 * 3600, 2, 0, 24 * 3600)
+    disabled.start()
+    assert disabled._thread is None
+    archiver = Archiver(session_factory, 24 * 3600, 2, 60, 24 * 3600)
+    archiver.start()
+    try:
+        deadline = time.monotonic() + 5
+        while counts(session_factory) != (0, 3) and time.monotonic() < deadline:
+            time.sleep(0.05)
+    finally:
+        archiver.stop()
+    assert counts(session_factory) == (0, 3)
+
+
+def test_thread_prunes_old_tombstones(session_factory):
+    with session_factory() as db:
+        ids, _ = crud.create_tasks(db, [TASK_DATA] * 2)
+        for task_id in ids:
+            crud.delete_task(db, task_id)
+        db.execute(text("UPDATE tasks_tombstones SET deleted_at = '2020-01-01 00:00:00' WHERE id = :id"), {"id": ids[0]})
+        db.commit()
+    archiver = Archiver(session_factory, 24 * 3600, 2, 60, 24 * 3600)
+    archiver.start()
+    try:
+        deadline = time.monotonic() + 5
+        while tombstones(session_factory) != [ids[1]] and time.monotonic() < deadline:
+            time.sleep(0.05)
+    finally:
+        archiver.stop()
+    assert tombstones(session_factory) == [ids[1]]
+    assert archiver.prune() == 0
+
+
+@pytest.mark.parametrize("module", ["__main__", "main", "main_fastapi", "main_flask"])
+def test_every_entry_point_prepares_the_server(module):
+    # The schema, the archiver and the tombstone pruning are set up by prepare_server, so
+    # whichever module starts the server has to call it
+    source = (Path(tasklist3000.__file__).parent / f"{module}.py").read_text()
+    assert "prepare_server()" in source
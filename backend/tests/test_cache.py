@@ -0,0 +1,61 @@
+from tasklist3000 import cache, main
+from tasklist3000.cache import CachedTask, TaskCache
+
+
+def test_lru_eviction():
+    task_cache = TaskCache(max_size=2, ttl=60)
+    task_cache.put(1, CachedTask('"one"', b"one"), task_cache.generation)
+    task_cache.put(2, CachedTask('"two"', b"two"), task_cache.generation)
+    # Touching 1 makes 2 the least recently used entry
+    assert task_cache.get(1) == CachedTask('"one"', b"one")
+    task_cache.put(3, CachedTask('"three"', b"three"), task_cache.generation)
+    assert task_cache.get(2) is None
+    assert task_cache.get(3) == CachedTask('"three"', b"three")
+    assert task_cache.stats() == {"size": 2, "max_size": 2, "hits": 2, "misses": 1, "evictions": 1}
+
+
+def test_ttl_expiry(monkeypatch):
+    task_cache = TaskCache(max_size=10, ttl=5)
+    now = 1000.0
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now)
+    task_cache.put(1, CachedTask('"one"', b"one"), task_cache.generation)
+    now += 4
+    assert task_cache.get(1) == CachedTask('"one"', b"one")
+    now += 2
+    assert task_cache.get(1) is None
+    assert task_cache.stats()["size"] == 0
+
+
+def test_put_skipped_after_invalidation():
+    task_cache = TaskCache(max_size=10, ttl=60)
+    generation = task_cache.generation
+    # A write lands between the reader's lookup and its put
+    task_cache.invalidate(1)
+    task_cache.put(1, CachedTask('"stale"', b"stale"), generation)
+    assert task_cache.get(1) is None
+
+
+def test_disabled_cache_stores_nothing():
+    task_cache = TaskCache(max_size=0, ttl=60)
+    task_cache.put(1, CachedTask('"one"', b"one"), task_cache.generation)
+    assert task_cache.get(1) is None
+
+
+def test_disable_drops_entries():
+    task_cache = TaskCache(max_size=10, ttl=60)
+    task_cache.put(1, CachedTask('"one"', b"one"), task_cache.generation)
+    task_cache.disable()
+    assert task_cache.get(1) is None
+    task_cache.put(1, CachedTask('"one"', b"one"), task_cache.generation)
+    assert task_cache.stats()["size"] == 0
+
+
+def test_cache_off_with_several_robyn_processes(monkeypatch):
+    app = main.create_app()
+    assert cache.task_cache.enabled
+    # Robyn apps share one default config; it and the module cache are restored afterwards
+    monkeypatch.setattr(app.config, "processes", app.config.processes)
+    monkeypatch.setattr(cache.task_cache, "max_size", cache.task_cache.max_size)
+    monkeypatch.setattr(main, "WORKERS", 2)
+    main.create_app()
+    assert not cache.task_cache.enabled
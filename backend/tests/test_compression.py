@@ -0,0 +1,45 @@
+import gzip
+
+import pytest
+
+from tasklist3000 import compression
+from tasklist3000.compression import compress, iter_compress, negotiate
+
+ENCODINGS = ("gzip", "br", "zstd")
+
+
+def decompress(body, encoding):
+    if encoding == "gzip":
+        return gzip.decompress(body)
+    if encoding == "br":
+        return compression.brotli.decompress(body)
+    return compression.zstandard.ZstdDecompressor().decompressobj().decompress(body)
+
+
+def test_negotiate_prefers_client_weights_then_server_order():
+    assert negotiate("gzip, br, zstd", ENCODINGS) == "gzip"
+    assert negotiate("zstd, gzip", ENCODINGS) == "gzip"
+    assert negotiate("br;q=1.0, gzip;q=0.5", ENCODINGS) == "br"
+    assert negotiate("gzip;q=0, br", ENCODINGS) == "br"
+    assert negotiate("*;q=0.1, gzip;q=0", ("gzip", "br")) == "br"
+    assert negotiate("identity", ENCODINGS) is None
+    assert negotiate(None, ENCODINGS) is None
+    # Nothing is offered when compression is switched off
+    assert negotiate("gzip", ()) is None
+
+
+@pytest.mark.parametrize("encoding", compression.ENCODINGS)
+def test_compress_round_trips(encoding):
+    body = b'{"title": "Task", "full_text": "Lorem ipsum dolor sit amet"}\n' * 200
+    compressed = compress(body, encoding, compression.level_for("/tasks", encoding))
+    assert len(compressed) < len(body) // 5
+    assert decompress(compressed, encoding) == body
+    streamed = b"".join(iter_compress([body[:1000], b"", body[1000:]], encoding, 1))
+    assert decompress(streamed, encoding) == body
+
+
+def test_compressible_types():
+    assert compression.compressible("application/json")
+    assert compression.compressible("text/plain; version=0.0.4; charset=utf-8")
+    assert not compression.compressible("text/event-stream")
+    assert not compression.compressible(None)
@@ -0,0 +1,20 @@
+from datetime import datetime
+
+from tasklist3000.conditional import list_etag, not_modified, task_etag
+
+
+def test_task_etag_changes_with_content():
+    modified_at = datetime(2024, 1, 1, 12, 0, 0)
+    etag = task_etag(1, modified_at, b'{"title":"a"}')
+    assert etag.startswith('"1-20240101120000-') and etag.endswith('"')
+    assert task_etag(1, modified_at, b'{"title":"b"}') != etag
+    assert task_etag(1, datetime(2024, 1, 1, 12, 0, 1), b'{"title":"a"}') != etag
+
+
+def test_not_modified():
+    etag = list_etag(7)
+    assert not_modified(etag, etag)
+    assert not_modified(f'"tasks-6", W/{etag}', etag)
+    assert not_modified("*", etag)
+    assert not not_modified('"tasks-6"', etag)
+    assert not not_modified(None, etag)
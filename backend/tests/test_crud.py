@@ -1,15 +1,39 @@
+import json
+import subprocess
+import sys
+
 import pytest
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, text
 from sqlalchemy.orm import sessionmaker
 
+from tasklist3000.cache import task_cache
 from tasklist3000.crud import (
+    ChangeTokenExpired,
+    archive_tasks,
     create_task,
+    create_tasks,
     delete_task,
+    encode_cursor,
     get_task,
+    get_task_payload,
     get_tasks,
+    iter_tasks,
+    list_changes,
+    list_tasks,
+    next_cursor,
+    parse_crosstab,
+    parse_fields,
+    parse_filters,
+    parse_flag,
+    prune_tombstones,
+    rebuild_search_index,
+    reconcile_task_stats,
+    search_tasks,
+    task_stats,
+    tasks_version,
     update_task,
 )
-from tasklist3000.models import Base
+from tasklist3000.models import Base, Task, TaskArchive
 
 
 # Create an in-memory SQLite database for testing
@@ -50,8 +74,31 @@ def test_create_task_missing_fields(db_session):
         "priority": "Low",
         "status": "Pending",
     }
-    with pytest.raises(ValueError, match="Task creation failed due to missing required fields"):
-        create_task(db_session, task_data)
+    assert create_task(db_session, task_data) is None
+    assert get_tasks(db_session) == []
+
+
+def test_create_and_update_reject_invalid_values(db_session):
+    task_data = {
+        "title": "Checked",
+        "description": "Only known values are stored",
+        "full_text": "Sample full text",
+        "color": "Red",
+        "priority": "Low",
+        "status": "Pending",
+    }
+    # Nothing is written that the enum columns could not load again
+    for invalid in ({"color": "Pink"}, {"priority": "Urgent"}, {"status": 3}, {"owner": "nobody"}):
+        assert create_task(db_session, {**task_data, **invalid}) is None
+    assert get_tasks(db_session) == []
+
+    created = create_task(db_session, task_data)
+    for invalid in ({"color": "Pink"}, {"status": "Done"}, {"title": None}, {"description": 7}):
+        assert update_task(db_session, created.id, invalid) is None
+    db_session.expire_all()
+    task = get_task(db_session, created.id)
+    assert (task.title, task.description, task.color, task.status) == ("Checked", "Only known values are stored", "Red", "Pending")
+    assert len(list_tasks(db_session)) == 1
 
 
 def test_get_task(db_session):
@@ -138,6 +185,34 @@ def test_delete_nonexistent_task(db_session):
     assert result is False
 
 
+def test_get_task_payload_is_cached_and_invalidated(db_session):
+    created = create_task(
+        db_session,
+        {
+            "title": "Cached",
+            "description": "Read often",
+            "full_text": "Sample full text",
+            "color": "Red",
+            "priority": "Low",
+            "status": "Pending",
+        },
+    )
+    hits = task_cache.hits
+    etag, payload = get_task_payload(db_session, created.id)
+    assert json.loads(payload)["title"] == "Cached"
+    assert get_task_payload(db_session, created.id) == (etag, payload)
+    assert task_cache.hits == hits + 1
+
+    update_task(db_session, created.id, {"title": "Renamed"})
+    renamed_etag, payload = get_task_payload(db_session, created.id)
+    assert json.loads(payload)["title"] == "Renamed"
+    # Same second, different content, so the ETag still changes
+    assert renamed_etag != etag
+
+    delete_task(db_session, created.id)
+    assert get_task_payload(db_session, created.id) is None
+
+
 def test_get_tasks(db_session):
     # Create several tasks
     tasks_data = [
@@ -207,3 +282,566 @@ def test_get_tasks_with_pagination(db_session):
     tasks = get_tasks(db_session, skip=1, limit=1)
     assert len(tasks) == 1
     assert tasks[0].title == "Task 2"
+
+
+def test_get_tasks_with_cursor(db_session):
+    for i in range(5):
+        create_task(
+            db_session,
+            {
+                "title": f"Task {i}",
+                "description": "Description",
+                "full_text": "Sample full text",
+                "color": "Red",
+                "priority": "Low",
+                "status": "Pending",
+            },
+        )
+    first_page = get_tasks(db_session, limit=2)
+    cursor = next_cursor(first_page, 2)
+    assert cursor is not None
+    second_page = get_tasks(db_session, limit=2, cursor=cursor)
+    assert [task.title for task in second_page] == ["Task 2", "Task 3"]
+    last_page = get_tasks(db_session, limit=2, cursor=next_cursor(second_page, 2))
+    assert [task.title for task in last_page] == ["Task 4"]
+    # A short page has no successor
+    assert next_cursor(last_page, 2) is None
+
+
+def test_get_tasks_with_invalid_cursor(db_session):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        get_tasks(db_session, cursor="not-a-cursor")
+
+
+def test_create_tasks(db_session):
+    valid = {
+        "title": "Bulk Task",
+        "description": "Bulk description",
+        "full_text": "Sample full text",
+        "color": "Red",
+        "priority": "Low",
+        "status": "Pending",
+    }
+    tasks_data = [
+        valid,
+        {**valid, "title": None},
+        {**valid, "color": "Magenta"},
+        {**valid, "title": "Bulk Task 2"},
+    ]
+    ids, errors = create_tasks(db_session, tasks_data)
+    # Rejected items keep their slot so ids line up with the input
+    assert ids[1] is None
+    assert ids[2] is None
+    assert ids[0] is not None
+    assert ids[3] is not None
+    assert ids[0] < ids[3]
+    assert set(errors) == {1, 2}
+    assert "title" in errors[1]
+    assert "color" in errors[2]
+    assert get_task(db_session, ids[3]).title == "Bulk Task 2"
+    assert len(get_tasks(db_session)) == 2
+
+
+def test_create_tasks_rejects_non_string_values(db_session):
+    valid = {
+        "title": "Bulk Task",
+        "description": "Bulk description",
+        "full_text": "Sample full text",
+        "color": "Red",
+        "priority": "Low",
+        "status": "Pending",
+    }
+    ids, errors = create_tasks(db_session, [{**valid, "title": {"x": 1}}, valid])
+    assert ids[0] is None
+    assert "title" in errors[0]
+    assert ids[1] is not None
+    db_session.commit()
+    assert len(get_tasks(db_session)) == 1
+
+
+def test_list_tasks_returns_plain_rows(db_session):
+    task_data = {
+        "title": "Row Task",
+        "description": "Row description",
+        "full_text": "Sample full text",
+        "color": "Red",
+        "priority": "Low",
+        "status": "Pending",
+    }
+    create_task(db_session, task_data)
+    create_task(db_session, task_data)
+    db_session.expunge_all()
+    rows = list_tasks(db_session, limit=1)
+    assert len(rows) == 1
+    assert not isinstance(rows[0], Task)
+    assert rows[0].title == "Row Task"
+    # Nothing was loaded into the session
+    assert len(db_session.identity_map) == 0
+    assert [row.id for row in list_tasks(db_session, cursor=next_cursor(rows, 1))] == [rows[0].id + 1]
+
+
+def test_list_tasks_leaves_out_full_text(db_session):
+    task_data = {
+        "title": "Long notes",
+        "description": "Listed without them",
+        "full_text": "Lorem ipsum " * 1000,
+        "color": "Red",
+        "priority": "Low",
+        "status": "Pending",
+    }
+    created = create_task(db_session, task_data)
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    engine = db_session.get_bind()
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        rows = list_tasks(db_session, order_by="-modified_at")
+        projected = list_tasks(db_session, fields=parse_fields("title,full_text"))
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+    assert "full_text" not in statements[0]
+    assert not hasattr(rows[0], "full_text")
+    # The sort column is still selected for the cursor
+    assert rows[0].modified_at is not None
+    assert projected[0]._fields == ("id", "title", "full_text")
+    assert projected[0].full_text == task_data["full_text"]
+
+    cached = get_task_payload(db_session, created.id, fields=("id", "status"))
+    assert json.loads(cached.payload) == {"id": created.id, "status": "Pending"}
+    assert cached.etag != get_task_payload(db_session, created.id).etag
+
+
+def test_parse_fields():
+    assert parse_fields(None) == ("id", "title", "description", "status", "priority", "color", "full_text")
+    assert parse_fields("", ("id", "title")) == ("id", "title")
+    # id is always sent and the response order is kept
+    assert parse_fields("color, title") == ("id", "title", "color")
+    with pytest.raises(ValueError, match="owner"):
+        parse_fields("title,owner")
+
+
+def test_iter_tasks_streams_every_row(db_session):
+    task_data = {
+        "title": "Export Task",
+        "description": "Export description",
+        "full_text": "Sample full text",
+        "color": "Red",
+        "priority": "Low",
+        "status": "Pending",
+    }
+    for _ in range(5):
+        create_task(db_session, task_data)
+    rows = list(iter_tasks(db_session, batch_size=2))
+    assert len(rows) == 5
+    assert [row.id for row in rows] == sorted(row.id for row in rows)
+
+
+def test_search_tasks(db_session):
+    base = {"full_text": "Sample full text", "color": "Red", "priority": "Low", "status": "Pending"}
+    create_task(db_session, {**base, "title": "Buy milk", "description": "Groceries"})
+    walk = create_task(db_session, {**base, "title": "Walk dog", "description": "Take the dog to the park"})
+    create_task(db_session, {**base, "title": "Dog food", "description": "Order more"})
+
+    results = search_tasks(db_session, "dog park")
+    assert [row.id for row in results] == [walk.id]
+    assert "<mark>" in results[0].snippet
+
+    # The index follows updates and deletes through the triggers
+    update_task(db_session, walk.id, {"description": "Vet appointment"})
+    assert search_tasks(db_session, "park") == []
+    assert {row.title for row in search_tasks(db_session, "dog")} == {"Walk dog", "Dog food"}
+    delete_task(db_session, walk.id)
+    assert [row.title for row in search_tasks(db_session, "dog")] == ["Dog food"]
+    # The last term matches as a prefix and FTS syntax is taken literally
+    assert [row.title for row in search_tasks(db_session, "mil")] == ["Buy milk"]
+    assert search_tasks(db_session, 'milk" OR "dog') == []
+
+
+def test_search_tasks_empty_query(db_session):
+    with pytest.raises(ValueError, match="Invalid q"):
+        search_tasks(db_session, "   ")
+
+
+def test_rebuild_search_index(db_session):
+    create_task(
+        db_session,
+        {
+            "title": "Indexed later",
+            "description": "Description",
+            "full_text": "Sample full text",
+            "color": "Red",
+            "priority": "Low",
+            "status": "Pending",
+        },
+    )
+    # Simulate a database created before the search index existed
+    db_session.execute(text("DROP TABLE tasks_fts"))
+    for trigger in ("tasks_fts_insert", "tasks_fts_delete", "tasks_fts_update"):
+        db_session.execute(text(f"DROP TRIGGER {trigger}"))
+    db_session.commit()
+    rebuild_search_index(db_session)
+    assert [row.title for row in search_tasks(db_session, "indexed")] == ["Indexed later"]
+
+
+def test_list_tasks_filters_and_sorts(db_session):
+    base = {"description": "Description", "full_text": "Sample full text", "color": "Red", "priority": "Low"}
+    for i in range(6):
+        status = ["Pending", "In Progress", "Completed"][i % 3]
+        create_task(db_session, {**base, "title": f"Task {i}", "status": status})
+    db_session.execute(text("UPDATE tasks SET modified_at = datetime('now', '-' || id || ' minutes')"))
+    db_session.commit()
+
+    filters = parse_filters({"status": "Pending,Completed"})
+    assert [row.title for row in list_tasks(db_session, filters=filters)] == ["Task 0", "Task 2", "Task 3", "Task 5"]
+    # The lowest id was modified last, so ascending modified_at reverses the id order
+    rows = list_tasks(db_session, order_by="modified_at")
+    assert [row.title for row in rows] == [f"Task {i}" for i in range(5, -1, -1)]
+    rows = list_tasks(db_session, order_by="-id", limit=2)
+    assert [row.title for row in rows] == ["Task 5", "Task 4"]
+
+
+def test_list_tasks_cursor_follows_sort_order(db_session):
+    base = {"description": "Description", "full_text": "Sample full text", "color": "Red", "priority": "Low"}
+    for i in range(5):
+        create_task(db_session, {**base, "title": f"Task {i}", "status": "Pending"})
+    # Every row shares one created_at, so paging has to tie-break on id
+    seen = []
+    cursor = None
+    while True:
+        rows = list_tasks(db_session, limit=2, cursor=cursor, order_by="-created_at")
+        seen.extend(row.title for row in rows)
+        cursor = next_cursor(rows, 2, "-created_at")
+        if cursor is None:
+            break
+    assert seen == [f"Task {i}" for i in range(4, -1, -1)]
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        list_tasks(db_session, cursor=cursor or encode_cursor(1), order_by="-created_at")
+
+
+def test_parse_filters_rejects_bad_values():
+    with pytest.raises(ValueError, match="Invalid status"):
+        parse_filters({"status": "Done"})
+    with pytest.raises(ValueError, match="Invalid created_after"):
+        parse_filters({"created_after": "yesterday"})
+    assert parse_filters({"created_after": "2025-01-02T03:04:05"})["created_after"].year == 2025
+
+
+@pytest.mark.parametrize(
+    ("order_by", "params"),
+    [
+        ("id", {"status": "Pending"}),
+        ("id", {"priority": "High"}),
+        ("id", {"color": "Red"}),
+        ("created_at", {"status": "Pending"}),
+        ("-modified_at", {"status": "In Progress"}),
+        ("created_at", {"priority": "High"}),
+        ("-modified_at", {"priority": "High"}),
+        ("created_at", {"color": "Red"}),
+        ("-modified_at", {"color": "Red"}),
+        ("created_at", {"status": "Pending,Completed"}),
+        ("-modified_at", {"color": "Red,Blue", "priority": "Low,High"}),
+        ("created_at", {"created_after": "2025-01-01T00:00:00"}),
+        ("-modified_at", {"modified_after": "2025-01-01T00:00:00"}),
+    ],
+)
+def test_list_tasks_query_plans_use_indexes(db_session, order_by, params):
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    engine = db_session.get_bind()
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        list_tasks(db_session, order_by=order_by, filters=parse_filters(params))
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+    statement, parameters = statements[-1]
+    plan = [row[-1] for row in db_session.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)]
+    # Never a full table scan
+    assert all("INDEX" in step for step in plan if step.startswith(("SCAN", "SEARCH"))), plan
+    # Date sorts always read the rows in index order; ordering an equality match by id
+    # may sort the matching rows, but never the table
+    if order_by != "id":
+        assert not any("TEMP B-TREE" in step for step in plan), plan
+
+
+def test_tasks_version_counts_every_write(db_session):
+    version = tasks_version(db_session)
+    created = create_task(
+        db_session,
+        {
+            "title": "Versioned",
+            "description": "Bumps the counter",
+            "full_text": "Sample full text",
+            "color": "Red",
+            "priority": "Low",
+            "status": "Pending",
+        },
+    )
+    assert tasks_version(db_session) == version + 1
+    update_task(db_session, created.id, {"status": "Completed"})
+    assert tasks_version(db_session) == version + 2
+    delete_task(db_session, created.id)
+    assert tasks_version(db_session) == version + 3
+
+
+def make_tasks(db_session, count):
+    tasks = [
+        {
+            "title": f"Synced {n}",
+            "description": "Delta sync",
+            "full_text": "Sample full text",
+            "color": "Red",
+            "priority": "Low",
+            "status": "Pending",
+        }
+        for n in range(count)
+    ]
+    ids, errors = create_tasks(db_session, tasks)
+    assert not errors
+    return ids
+
+
+def test_list_changes(db_session):
+    first, second = make_tasks(db_session, 2)
+    # Without a token only the starting point comes back
+    start = list_changes(db_session, None)
+    assert (start.tasks, start.deleted, start.more) == ([], [], False)
+    assert start.token == str(tasks_version(db_session))
+
+    update_task(db_session, second, {"status": "Completed"})
+    delete_task(db_session, first)
+    created = make_tasks(db_session, 1)[0]
+    changes = list_changes(db_session, start.token)
+    assert [(task.id, task.status) for task in changes.tasks] == [(second, "Completed"), (created, "Pending")]
+    assert changes.deleted == [first]
+    assert changes.more is False
+    assert changes.token == str(tasks_version(db_session))
+    assert list_changes(db_session, changes.token).tasks == []
+
+    # Paging stops at the limit-th change and resumes after it
+    page = list_changes(db_session, start.token, limit=2)
+    assert ([task.id for task in page.tasks], page.deleted, page.more) == ([second], [first], True)
+    rest = list_changes(db_session, page.token, limit=2)
+    assert ([task.id for task in rest.tasks], rest.deleted, rest.more) == ([created], [], False)
+
+    # The highest id is not handed out again once it is deleted
+    delete_task(db_session, created)
+    recreated = make_tasks(db_session, 1)[0]
+    assert recreated > created
+    changes = list_changes(db_session, rest.token)
+    assert ([task.id for task in changes.tasks], changes.deleted) == ([recreated], [created])
+
+
+def test_list_changes_rejects_unknown_tokens(db_session):
+    make_tasks(db_session, 1)
+    with pytest.raises(ValueError):
+        list_changes(db_session, "not-a-token")
+    with pytest.raises(ChangeTokenExpired):
+        list_changes(db_session, str(tasks_version(db_session) + 1))
+
+
+def test_prune_tombstones(db_session):
+    ids = make_tasks(db_session, 2)
+    token = list_changes(db_session, None).token
+    for task_id in ids:
+        delete_task(db_session, task_id)
+    # Nothing is older than a day yet
+    assert prune_tombstones(db_session, 24 * 3600) == 0
+    assert list_changes(db_session, token).deleted == ids
+    db_session.execute(text("UPDATE tasks_tombstones SET deleted_at = '2020-01-01 00:00:00' WHERE id = :id"), {"id": ids[0]})
+    db_session.commit()
+    assert prune_tombstones(db_session, 24 * 3600) == 1
+    # Tokens from before the pruned deletion can no longer sync, later ones still do
+    with pytest.raises(ChangeTokenExpired):
+        list_changes(db_session, token)
+    assert list_changes(db_session, str(int(token) + 1)).deleted == [ids[1]]
+
+
+def test_task_stats(db_session):
+    ids = make_tasks(db_session, 3)
+    update_task(db_session, ids[0], {"status": "Completed", "color": "Blue"})
+    update_task(db_session, ids[1], {"title": "Renamed"})
+    delete_task(db_session, ids[2])
+    stats = task_stats(db_session, ("status", "color"))
+    assert stats["total"] == 2
+    assert stats["status"] == {"Pending": 1, "In Progress": 0, "Completed": 1}
+    assert stats["priority"] == {"Low": 2, "Medium": 0, "High": 0}
+    assert stats["color"] == {"Red": 1, "Green": 0, "Blue": 1, "Yellow": 0, "Purple": 0}
+    assert stats["crosstab"]["Completed"] == {"Red": 0, "Green": 0, "Blue": 1, "Yellow": 0, "Purple": 0}
+    assert stats["crosstab"]["Pending"]["Red"] == 1
+    assert "crosstab" not in task_stats(db_session)
+    # The counters agree with a full recount
+    assert reconcile_task_stats(db_session) == 0
+
+
+def test_reconcile_task_stats(db_session):
+    make_tasks(db_session, 2)
+    db_session.execute(text("UPDATE tasks_stats SET count = 7"))
+    # Writes made without the triggers are not counted
+    db_session.execute(text("DROP TRIGGER tasks_stats_insert"))
+    db_session.commit()
+    create_task(
+        db_session,
+        {
+            "title": "Uncounted",
+            "description": "Written without the triggers",
+            "full_text": "Sample full text",
+            "color": "Green",
+            "priority": "Low",
+            "status": "Pending",
+        },
+    )
+    assert task_stats(db_session)["total"] == 7
+    assert reconcile_task_stats(db_session) == 2
+    assert task_stats(db_session)["color"] == {"Red": 2, "Green": 1, "Blue": 0, "Yellow": 0, "Purple": 0}
+
+
+def test_parse_crosstab():
+    assert parse_crosstab(None) == ()
+    assert parse_crosstab("color, status") == ("color", "status")
+    assert parse_crosstab("status,priority,color") == ("status", "priority", "color")
+    for value in ("status", "status,status", "status,title"):
+        with pytest.raises(ValueError):
+            parse_crosstab(value)
+
+
+def make_archivable(db_session, task_ids):
+    for task_id in task_ids:
+        update_task(db_session, task_id, {"status": "Completed"})
+        db_session.execute(text("UPDATE tasks SET modified_at = '2020-01-01 00:00:00' WHERE id = :id"), {"id": task_id})
+    db_session.commit()
+
+
+def test_archive_tasks(db_session):
+    ids = make_tasks(db_session, 4)
+    make_archivable(db_session, ids[:2])
+    # Completed but recently modified, and old but still pending, both stay
+    update_task(db_session, ids[2], {"status": "Completed"})
+    db_session.execute(text("UPDATE tasks SET modified_at = '2020-01-01 00:00:00' WHERE id = :id"), {"id": ids[3]})
+    db_session.commit()
+    version = tasks_version(db_session)
+    token = list_changes(db_session, None).token
+
+    assert archive_tasks(db_session, 24 * 3600, batch_size=1) == 1
+    assert archive_tasks(db_session, 24 * 3600, batch_size=1) == 1
+    assert archive_tasks(db_session, 24 * 3600, batch_size=1) == 0
+    assert tasks_version(db_session) == version + 2
+    # Sync clients see archived tasks go, like deleted ones
+    assert sorted(list_changes(db_session, token).deleted) == ids[:2]
+    assert [task.id for task in list_tasks(db_session)] == ids[2:]
+    assert db_session.query(TaskArchive).count() == 2
+
+    # Reads by id fall through to the archive
+    archived = get_task(db_session, ids[0])
+    assert isinstance(archived, TaskArchive)
+    assert (archived.title, archived.status) == ("Synced 0", "Completed")
+    payload = get_task_payload(db_session, ids[1])[1]
+    assert json.loads(payload)["title"] == "Synced 1"
+
+    # Lists take the archive only when asked, and page across both tables
+    every = list_tasks(db_session, include_archived=True)
+    assert [task.id for task in every] == ids
+    first_page = list_tasks(db_session, limit=3, include_archived=True)
+    second_page = list_tasks(db_session, limit=3, cursor=next_cursor(first_page, 3), include_archived=True)
+    assert [task.id for task in first_page + second_page] == ids
+    completed = list_tasks(db_session, filters={"status": ["Completed"]}, order_by="-id", include_archived=True)
+    assert [task.id for task in completed] == [ids[2], ids[1], ids[0]]
+
+    # Moving tasks between the tables leaves the counts as they were
+    assert task_stats(db_session)["status"] == {"Pending": 1, "In Progress": 0, "Completed": 3}
+    assert reconcile_task_stats(db_session) == 0
+
+
+def test_update_restores_archived_task(db_session):
+    ids = make_tasks(db_session, 2)
+    make_archivable(db_session, ids)
+    assert archive_tasks(db_session, 24 * 3600) == 2
+
+    updated = update_task(db_session, ids[0], {"status": "In Progress"})
+    assert isinstance(updated, Task)
+    assert (updated.id, updated.title, updated.status) == (ids[0], "Synced 0", "In Progress")
+    assert [task.id for task in list_tasks(db_session)] == [ids[0]]
+    assert db_session.get(TaskArchive, ids[0]) is None
+
+    assert delete_task(db_session, ids[1]) is True
+    assert get_task(db_session, ids[1]) is None
+    assert db_session.query(TaskArchive).count() == 0
+    assert task_stats(db_session)["total"] == 1
+    assert reconcile_task_stats(db_session) == 0
+
+
+def test_parse_flag():
+    assert parse_flag(None) is False
+    assert parse_flag("") is False
+    assert parse_flag("true") is True
+    assert parse_flag("1") is True
+    assert parse_flag("Off") is False
+    with pytest.raises(ValueError):
+        parse_flag("maybe")
+
+
+def test_list_changes_query_plans_use_indexes(db_session):
+    plans = [
+        db_session.execute(text(f"EXPLAIN QUERY PLAN {statement}")).all()
+        for statement in (
+            "SELECT id FROM tasks WHERE change_seq > 1 AND change_seq <= 5 ORDER BY change_seq LIMIT 10",
+            "SELECT id FROM tasks_tombstones WHERE change_seq > 1 AND change_seq <= 5 ORDER BY change_seq LIMIT 10",
+        )
+    ]
+    for plan in plans:
+        steps = [row[-1] for row in plan]
+        assert any("ix_tasks_change_seq" in step or "ix_tasks_tombstones_change_seq" in step for step in steps), steps
+        assert not any("TEMP B-TREE" in step for step in steps), steps
+
+
+def test_update_and_delete_are_single_statements(db_session):
+    created = create_task(
+        db_session,
+        {
+            "title": "One round trip",
+            "description": "No read before write",
+            "full_text": "Sample full text",
+            "color": "Red",
+            "priority": "Low",
+            "status": "Pending",
+        },
+    )
+    task_id = created.id
+    db_session.execute(text("UPDATE tasks SET modified_at = '2020-01-01 00:00:00' WHERE id = :id"), {"id": task_id})
+    db_session.commit()
+    db_session.expunge_all()
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    engine = db_session.get_bind()
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        # id and unknown keys are ignored rather than written
+        updated = update_task(db_session, task_id, {"id": 999, "title": "Renamed", "owner": "nobody"})
+        update_statements = list(statements)
+        assert updated is not None
+        assert updated.id == task_id
+        assert updated.title == "Renamed"
+        assert updated.modified_at.year > 2020
+        statements.clear()
+        assert delete_task(db_session, task_id) is True
+        delete_statements = list(statements)
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+    assert len(update_statements) == 1 and update_statements[0].startswith("UPDATE")
+    assert len(delete_statements) == 1 and delete_statements[0].startswith("DELETE")
+    assert update_task(db_session, task_id, {"title": "Gone"}) is None
+
+
+def test_crud_imports_no_web_framework():
+    # crud is shared by all three backends, so importing it must not pull any of them in
+    code = "import sys, tasklist3000.crud; print(sorted({'robyn', 'fastapi', 'flask'} & set(sys.modules)))"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)  # noqa: S603
+    assert result.stdout.strip() == "[]"
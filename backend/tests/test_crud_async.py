@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from tasklist3000 import crud_async
+from tasklist3000.models import Base, Task
+
+TASK_DATA = {
+    "title": "Async Task",
+    "description": "Async description",
+    "full_text": "Sample full text",
+    "color": "Red",
+    "priority": "Low",
+    "status": "Pending",
+}
+
+
+# Async tests need a file database so several aiosqlite connections see the same data
+@pytest.fixture(scope="function")
+def async_session_factory(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'tasks.db'}")
+
+    async def create_schema():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+    asyncio.run(create_schema())
+    yield async_sessionmaker(autoflush=False, expire_on_commit=False, bind=engine)
+    asyncio.run(engine.dispose())
+
+
+def test_async_crud_round_trip(async_session_factory):
+    async def scenario():
+        async with async_session_factory() as db:
+            created = await crud_async.create_task(db, TASK_DATA)
+            updated = await crud_async.update_task(db, created.id, {"title": "Renamed"})
+            assert updated.title == "Renamed"
+            fetched = await crud_async.get_task(db, created.id)
+            assert fetched.title == "Renamed"
+            assert len(await crud_async.get_tasks(db)) == 1
+            assert await crud_async.delete_task(db, created.id) is True
+            assert await crud_async.get_task(db, created.id) is None
+
+    asyncio.run(scenario())
+
+
+def test_reads_progress_while_write_in_flight(async_session_factory):
+    async def scenario():
+        async with async_session_factory() as db:
+            await crud_async.create_task(db, TASK_DATA)
+
+        async def read():
+            async with async_session_factory() as db:
+                return await crud_async.get_tasks(db)
+
+        async def heartbeat(ticks):
+            while True:
+                ticks.append(None)
+                await asyncio.sleep(0.001)
+
+        ticks = []
+        beat = asyncio.create_task(heartbeat(ticks))
+        async with async_session_factory() as writer:
+            # Leave an uncommitted INSERT open so the write lock is held
+            await writer.execute(insert(Task).values(**TASK_DATA))
+            results = await asyncio.wait_for(asyncio.gather(*(read() for _ in range(10))), timeout=5)
+            await writer.commit()
+        beat.cancel()
+
+        # Every reader finished during the write and saw the committed snapshot
+        assert all(len(tasks) == 1 for tasks in results)
+        # The event loop kept running other coroutines while queries were in flight
+        assert len(ticks) > 1
+        async with async_session_factory() as db:
+            assert len(await crud_async.get_tasks(db)) == 2
+
+    asyncio.run(scenario())
@@ -0,0 +1,88 @@
+import asyncio
+import json
+
+import pytest
+
+from tasklist3000.events import (
+    AsyncSubscription,
+    EventBroker,
+    Subscription,
+    SyncSubscription,
+    TaskEvent,
+    format_event,
+    format_poll,
+)
+
+
+def test_publish_fans_out_in_order():
+    broker = EventBroker(history=10, max_queued=10)
+    first, second = SyncSubscription(10), SyncSubscription(10)
+    assert broker.subscribe(first) == 0
+    broker.subscribe(second)
+    broker.publish([("created", 1), ("updated", 1)])
+    expected = [TaskEvent(1, "created", 1), TaskEvent(2, "updated", 1)]
+    assert first.wait(0) == expected
+    assert second.wait(0) == expected
+    assert first.wait(0) == []
+
+
+def test_slow_subscriber_is_dropped():
+    broker = EventBroker(history=10, max_queued=2)
+    slow = SyncSubscription(2)
+    broker.subscribe(slow)
+    broker.publish([("created", 1), ("created", 2)])
+    assert not slow.dropped
+    broker.publish([("created", 3)])
+    assert slow.dropped
+    assert slow.wait(0) == []
+    assert broker.subscribers == 0
+    assert broker.dropped == 1
+
+
+def test_reconnect_replays_missed_events_or_resets():
+    broker = EventBroker(history=3, max_queued=10)
+    broker.publish([("created", 1), ("updated", 1), ("deleted", 1), ("created", 2)])
+    caught_up = SyncSubscription(10)
+    assert broker.subscribe(caught_up, last_event_id=2) == 4
+    assert caught_up.wait(0) == [TaskEvent(3, "deleted", 1), TaskEvent(4, "created", 2)]
+    # Event 1 has left the history, and 9 was never issued by this broker
+    for last_event_id in (0, 9):
+        behind = SyncSubscription(10)
+        broker.subscribe(behind, last_event_id=last_event_id)
+        assert behind.wait(0) == [TaskEvent(4, "reset", None)]
+    current = SyncSubscription(10)
+    broker.subscribe(current, last_event_id=4)
+    assert current.wait(0) == []
+
+
+def test_async_subscription_is_woken_from_another_thread():
+    broker = EventBroker(history=10, max_queued=10)
+
+    async def scenario():
+        subscription = AsyncSubscription(10)
+        broker.subscribe(subscription)
+        loop = asyncio.get_running_loop()
+        loop.call_later(0.05, lambda: loop.run_in_executor(None, broker.publish, [("created", 7)]))
+        return await subscription.wait(5)
+
+    assert asyncio.run(scenario()) == [TaskEvent(1, "created", 7)]
+
+
+def test_format_event():
+    assert format_event(TaskEvent(3, "deleted", 7)) == b'id: 3\nevent: deleted\ndata: {"id": 7}\n\n'
+    assert format_event(TaskEvent(3, "reset", None)) == b"id: 3\nevent: reset\ndata: {}\n\n"
+
+
+def test_format_poll():
+    body = json.loads(format_poll(4, [TaskEvent(5, "created", 7), TaskEvent(6, "reset", None)]))
+    assert body == {
+        "last_event_id": 6,
+        "events": [{"id": 5, "type": "created", "task_id": 7}, {"id": 6, "type": "reset", "task_id": None}],
+    }
+    # A quiet poll still reports where to resume from
+    assert json.loads(format_poll(4, [])) == {"last_event_id": 4, "events": []}
+
+
+def test_subscription_needs_a_wake():
+    with pytest.raises(TypeError):
+        Subscription(1)  # type: ignore[abstract]
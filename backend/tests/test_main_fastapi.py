@@ -10,18 +10,35 @@ import uvicorn
 from fastapi import FastAPI
 from starlette.testclient import TestClient
 
-from tasklist3000.main_fastapi import app
+from tasklist3000.main_fastapi import create_app
 from tasklist3000.models import Base, engine
 from common_test_utils import (
     test_create_task,
+    test_conditional_get,
+    test_create_tasks_bulk,
     test_delete_task,
+    test_export_tasks,
     test_get_config,
     test_get_tasks,
+    test_get_tasks_with_cursor,
+    test_metrics_endpoint,
     test_root_endpoint,
+    test_search_tasks,
+    test_server_timing_header,
     test_status_endpoint,
+    test_create_task_with_invalid_values,
+    test_filter_tasks,
+    test_include_archived,
+    test_task_stats,
+    test_compressed_responses,
+    test_task_fields,
+    test_task_changes,
+    test_task_events,
     test_update_task,
 )
 
+app = create_app()
+
 # disable parallel testing for these tests when running test command
 pytestmark = pytest.mark.serial
 
@@ -1,6 +1,8 @@
 import os
 import signal
 import socket
+import subprocess
+import sys
 import threading
 import time
 from collections.abc import Generator
@@ -10,18 +12,35 @@ import pytest
 import requests
 from flask import request
 
-from tasklist3000.main_flask import app
+from tasklist3000.main_flask import create_app
 from tasklist3000.models import Base, engine
 from common_test_utils import (
     test_create_task,
+    test_conditional_get,
+    test_create_tasks_bulk,
     test_delete_task,
+    test_export_tasks,
     test_get_config,
     test_get_tasks,
+    test_get_tasks_with_cursor,
+    test_metrics_endpoint,
     test_root_endpoint,
+    test_search_tasks,
+    test_server_timing_header,
     test_status_endpoint,
+    test_create_task_with_invalid_values,
+    test_filter_tasks,
+    test_include_archived,
+    test_task_stats,
+    test_compressed_responses,
+    test_task_fields,
+    test_task_changes,
+    test_task_events,
     test_update_task,
 )
 
+app = create_app()
+
 # disable parallel testing for these tests when running test command
 pytestmark = pytest.mark.serial
 
@@ -113,3 +132,29 @@ def setup_server_and_db() -> Generator[None, None, None]:
     
     # Teardown: Drop all tables
     Base.metadata.drop_all(bind=engine)
+
+
+def test_prefork_workers(tmp_path):
+    port = find_free_port()
+    code = (
+        "from tasklist3000.main_flask import create_app; from tasklist3000.prefork import serve_prefork; "
+        f"serve_prefork(create_app, '127.0.0.1', {port}, 2)"
+    )
+    env = {**os.environ, "DATABASE_URL": f"sqlite:///{tmp_path / 'tasks.db'}"}
+    server = subprocess.Popen([sys.executable, "-c", code], env=env)  # noqa: S603
+    try:
+        deadline = time.monotonic() + 20
+        while True:
+            try:
+                response = requests.get(f"http://127.0.0.1:{port}/status", timeout=5)
+                break
+            except requests.ConnectionError:
+                assert server.poll() is None and time.monotonic() < deadline
+                time.sleep(0.2)
+        assert response.status_code == 200
+        # SIGTERM is passed on to the workers and the parent exits once they are gone
+        server.send_signal(signal.SIGTERM)
+        assert server.wait(timeout=10) == 0
+    finally:
+        if server.poll() is None:
+            server.kill()
@@ -0,0 +1,33 @@
+from tasklist3000.metrics import Metrics
+
+
+def test_render_counts_and_histogram():
+    metrics = Metrics()
+    started = metrics.start("GET")
+    assert metrics.in_flight["GET"] == 1
+    metrics.finish("GET", "/tasks/:task_id", 200, started)
+    metrics.finish("GET", "/tasks/:task_id", 404, metrics.start("GET"))
+    lines = metrics.render().splitlines()
+    assert 'http_requests_total{method="GET",route="/tasks/:task_id",status="200"} 1' in lines
+    assert 'http_requests_total{method="GET",route="/tasks/:task_id",status="404"} 1' in lines
+    assert 'http_requests_in_flight{method="GET"} 0' in lines
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/tasks/:task_id",le="+Inf"} 2' in lines
+    assert 'http_request_duration_seconds_count{method="GET",route="/tasks/:task_id"} 2' in lines
+
+
+def test_label_values_are_escaped():
+    metrics = Metrics()
+    metrics.finish("GET", 'a"b\\c', 200, metrics.start("GET"))
+    assert 'http_requests_total{method="GET",route="a\\"b\\\\c",status="200"} 1' in metrics.render().splitlines()
+
+
+def test_write_batch_histograms():
+    metrics = Metrics()
+    assert "task_write_batch_size" not in metrics.render()
+    metrics.observe_write_batch(3, 0.004)
+    metrics.observe_write_batch(1, 0.002)
+    lines = metrics.render().splitlines()
+    assert 'task_write_batch_size_bucket{le="2"} 1' in lines
+    assert 'task_write_batch_size_bucket{le="4"} 2' in lines
+    assert "task_write_batch_size_sum 4.0" in lines
+    assert "task_write_commit_seconds_count 2" in lines
@@ -0,0 +1,166 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import QueuePool, StaticPool
+
+from tasklist3000 import crud, crud_async, models
+from tasklist3000.config import SQLITE_PRAGMAS
+from tasklist3000.models import CompactEnum, create_async_sqlite_engine, create_sqlite_engine
+
+
+def test_file_engine_applies_pragmas(tmp_path):
+    engine = create_sqlite_engine(f"sqlite:///{tmp_path / 'tasks.db'}")
+    assert isinstance(engine.pool, QueuePool)
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == SQLITE_PRAGMAS["journal_mode"].lower()
+        assert conn.execute(text("PRAGMA busy_timeout")).scalar() == SQLITE_PRAGMAS["busy_timeout"]
+        assert conn.execute(text("PRAGMA cache_size")).scalar() == SQLITE_PRAGMAS["cache_size"]
+        # synchronous=NORMAL is reported as 1
+        assert conn.execute(text("PRAGMA synchronous")).scalar() == 1
+    engine.dispose()
+
+
+def test_file_engine_reads_from_one_snapshot(tmp_path):
+    # The version and the list a handler reads come from one transaction, so a write
+    # committed between the two shows up in neither
+    url = f"sqlite:///{tmp_path / 'tasks.db'}"
+    engine = create_sqlite_engine(url)
+    async_engine = create_async_sqlite_engine(url.replace("sqlite", "sqlite+aiosqlite", 1))
+    models.Base.metadata.create_all(bind=engine)
+    task = {
+        "title": "Concurrent",
+        "description": "Written between two reads",
+        "full_text": "Sample full text",
+        "color": "Red",
+        "priority": "Low",
+        "status": "Pending",
+    }
+
+    async def scenario():
+        async with AsyncSession(async_engine) as db:
+            version = await crud_async.tasks_version(db)
+            with Session(engine) as other:
+                crud.create_task(other, task)
+            assert await crud_async.list_tasks(db) == []
+        async with AsyncSession(async_engine) as db:
+            assert await crud_async.tasks_version(db) == version + 1
+            assert len(await crud_async.list_tasks(db)) == 1
+        await async_engine.dispose()
+
+    asyncio.run(scenario())
+    engine.dispose()
+
+
+def test_memory_engine_shares_one_connection():
+    engine = create_sqlite_engine("sqlite:///:memory:")
+    assert isinstance(engine.pool, StaticPool)
+    with engine.connect() as conn:
+        conn.execute(text("CREATE TABLE shared (id INTEGER)"))
+        conn.commit()
+    # A second checkout sees the same in-memory database
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT count(*) FROM shared")).scalar() == 0
+    engine.dispose()
+
+
+def test_dispose_after_fork_replaces_pools(tmp_path, monkeypatch):
+    url = f"sqlite:///{tmp_path / 'tasks.db'}"
+    monkeypatch.setattr(models, "engine", create_sqlite_engine(url))
+    monkeypatch.setattr(models, "async_engine", create_async_sqlite_engine(url.replace("sqlite", "sqlite+aiosqlite", 1)))
+    with models.engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+    pool, async_pool = models.engine.pool, models.async_engine.pool
+    models.dispose_after_fork()
+    # The forked worker gets fresh pools; the inherited connection is left for the parent
+    assert models.engine.pool is not pool
+    assert models.async_engine.pool is not async_pool
+    assert pool.checkedin() == 1
+    pool.dispose()
+
+
+def test_create_all_upgrades_older_databases(tmp_path):
+    # A database from before change tracking: no change_seq, no pruned and the old triggers
+    engine = create_sqlite_engine(f"sqlite:///{tmp_path / 'tasks.db'}")
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE tasks (id INTEGER PRIMARY KEY, title VARCHAR NOT NULL, description VARCHAR NOT NULL, "
+            "full_text VARCHAR NOT NULL, color VARCHAR NOT NULL, priority VARCHAR NOT NULL, status VARCHAR NOT NULL, "
+            "created_at DATETIME DEFAULT CURRENT_TIMESTAMP, modified_at DATETIME DEFAULT CURRENT_TIMESTAMP)"
+        ))
+        conn.execute(text("CREATE TABLE tasks_version (id INTEGER PRIMARY KEY CHECK (id = 1), version INTEGER NOT NULL)"))
+        conn.execute(text("INSERT INTO tasks_version (id, version) VALUES (1, 1)"))
+        conn.execute(text(
+            "CREATE TRIGGER tasks_version_delete AFTER DELETE ON tasks BEGIN "
+            "UPDATE tasks_version SET version = version + 1 WHERE id = 1; END"
+        ))
+        conn.execute(text("INSERT INTO tasks VALUES (1, 'Old', 'd', 't', 'Red', 'Low', 'Pending', NULL, NULL)"))
+    models.Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        assert conn.execute(text("SELECT change_seq FROM tasks")).scalar() == 0
+        assert conn.execute(text("SELECT pruned FROM tasks_version")).scalar() == 0
+        # The counts behind /tasks/stats start from the existing rows
+        assert conn.execute(text("SELECT count FROM tasks_stats")).scalar_one() == 1
+        conn.execute(text("DELETE FROM tasks WHERE id = 1"))
+        assert conn.execute(text("SELECT id, change_seq FROM tasks_tombstones")).one() == (1, 2)
+        # The table is rebuilt with AUTOINCREMENT, so the deleted id is not handed out again
+        assert "AUTOINCREMENT" in conn.execute(text("SELECT sql FROM sqlite_master WHERE name = 'tasks'")).scalar_one()
+        conn.execute(text("INSERT INTO tasks (title, description, full_text, color, priority, status) "
+                          "VALUES ('New', 'd', 't', 'Red', 'Low', 'Pending')"))
+        assert conn.execute(text("SELECT id FROM tasks")).scalar_one() == 2
+    engine.dispose()
+
+
+def test_compact_enum_round_trip():
+    status = CompactEnum("Pending", "In Progress", "Completed", name="status_enum")
+    assert status.process_bind_param("In Progress", None) == 1
+    assert status.process_result_value(1, None) == "In Progress"
+    assert status.process_bind_param(None, None) is None
+    with pytest.raises(ValueError, match="Invalid status_enum"):
+        status.process_bind_param("Done", None)
+
+
+# Run in a fresh interpreter with COMPACT_ENUMS set: it is read once, when models is imported
+CONVERT_SCRIPT = """
+import json
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from tasklist3000 import crud, models
+from tasklist3000.models import Task
+models.Base.metadata.create_all(bind=models.engine)
+with Session(models.engine) as db:
+    if not db.query(Task).count():
+        crud.create_task(db, {"title": "Old", "description": "d", "full_text": "notes",
+                              "color": "Red", "priority": "High", "status": "In Progress"})
+    print(json.dumps({
+        "stored": db.execute(text("SELECT typeof(color), typeof(priority), typeof(status) FROM tasks")).one()._asdict(),
+        "filtered": db.query(Task).filter(Task.status == "In Progress", Task.color == "Red").count(),
+        "search": crud.search_tasks(db, "notes")[0].status,
+        "version_triggers": db.execute(text("SELECT count(*) FROM sqlite_master WHERE type = 'trigger'")).scalar(),
+    }))
+"""
+
+
+def run_convert_script(database: str, compact: bool) -> dict:
+    env = {**os.environ, "DATABASE_URL": database, "COMPACT_ENUMS": "1" if compact else "0"}
+    result = subprocess.run([sys.executable, "-c", CONVERT_SCRIPT], env=env, capture_output=True, text=True, check=True)  # noqa: S603
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def test_convert_enum_storage_both_ways(tmp_path):
+    database = f"sqlite:///{tmp_path / 'tasks.db'}"
+    strings = run_convert_script(database, compact=False)
+    assert set(strings["stored"].values()) == {"text"}
+    compact = run_convert_script(database, compact=True)
+    assert set(compact["stored"].values()) == {"integer"}
+    assert compact["filtered"] == 1
+    assert compact["search"] == "In Progress"
+    # The search and version triggers went with the old table and are back
+    assert compact["version_triggers"] == strings["version_triggers"]
+    assert run_convert_script(database, compact=False) == strings
@@ -0,0 +1,34 @@
+import logging
+
+from sqlalchemy import text
+
+from tasklist3000 import querystats
+from tasklist3000.models import create_sqlite_engine
+
+
+def test_statements_are_attributed_to_the_tracked_request():
+    engine = create_sqlite_engine("sqlite:///:memory:")
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+        stats, token = querystats.track()
+        try:
+            conn.execute(text("SELECT 1"))
+            conn.execute(text("SELECT 2"))
+        finally:
+            querystats.untrack(token)
+        conn.execute(text("SELECT 3"))
+    assert stats.count == 2
+    assert stats.seconds > 0
+    assert stats.server_timing().endswith('desc="2 queries"')
+    engine.dispose()
+
+
+def test_slow_queries_are_logged_without_parameters(monkeypatch, caplog):
+    monkeypatch.setattr(querystats, "SLOW_QUERY_MS", 0)
+    engine = create_sqlite_engine("sqlite:///:memory:")
+    with caplog.at_level(logging.WARNING, logger="tasklist3000.querystats"), engine.connect() as conn:
+        conn.execute(text("SELECT :secret"), {"secret": "hunter2"})
+    assert "SELECT ?" in caplog.text
+    assert "1 redacted parameter" in caplog.text
+    assert "hunter2" not in caplog.text
+    engine.dispose()
@@ -5,21 +5,39 @@ import time
 from collections.abc import Generator
 from contextlib import closing
 
+import httpx
 import pytest
 import requests
 
-from tasklist3000.main import app
+from tasklist3000.main import create_app
 from tasklist3000.models import Base, engine
+import common_test_utils as utils
 from common_test_utils import (
     test_create_task,
+    test_conditional_get,
+    test_create_tasks_bulk,
     test_delete_task,
+    test_export_tasks,
     test_get_config,
     test_get_tasks,
+    test_get_tasks_with_cursor,
+    test_metrics_endpoint,
     test_root_endpoint,
+    test_search_tasks,
+    test_server_timing_header,
     test_status_endpoint,
+    test_create_task_with_invalid_values,
+    test_filter_tasks,
+    test_include_archived,
+    test_task_stats,
+    test_compressed_responses,
+    test_task_fields,
+    test_task_changes,
     test_update_task,
 )
 
+app = create_app()
+
 # disable parallel testing for these tests when running test command
 pytestmark = pytest.mark.serial
 
@@ -107,3 +125,41 @@ def setup_server_and_db() -> Generator[None, None, None]:
     
     # Teardown: Drop all tables
     Base.metadata.drop_all(bind=engine)
+
+
+def test_task_events_long_poll() -> None:
+    """Test that /tasks/events answers a JSON long poll and replays from last_event_id."""
+    polled: list = []
+    poller = threading.Thread(target=lambda: polled.append(httpx.get(f"{utils.BASE_URL}/tasks/events", timeout=30)))
+    poller.start()
+    # Let the poll subscribe before writing
+    time.sleep(0.5)
+    task = {
+        "title": "Polled Task",
+        "description": "Watched through the long poll",
+        "full_text": "Sample full text",
+        "color": "Blue",
+        "priority": "High",
+        "status": "Pending",
+    }
+    response = httpx.post(f"{utils.BASE_URL}/tasks", json=task)
+    assert response.status_code == 200
+    task_id = response.json()["id"]
+    poller.join(timeout=20)
+    assert polled[0].headers["content-type"] == "application/json"
+    body = polled[0].json()
+    assert [(event["type"], event["task_id"]) for event in body["events"]] == [("created", task_id)]
+    assert body["last_event_id"] == body["events"][0]["id"]
+
+    # Changes made between polls come back on the next one
+    assert httpx.put(f"{utils.BASE_URL}/tasks/{task_id}", json={"status": "Completed"}).status_code == 200
+    assert httpx.delete(f"{utils.BASE_URL}/tasks/{task_id}").status_code == 200
+    response = httpx.get(f"{utils.BASE_URL}/tasks/events", params={"last_event_id": body["last_event_id"]}, timeout=30)
+    replayed = response.json()
+    assert [(event["type"], event["task_id"]) for event in replayed["events"]] == [
+        ("updated", task_id),
+        ("deleted", task_id),
+    ]
+    assert replayed["last_event_id"] == body["last_event_id"] + 2
+    response = httpx.get(f"{utils.BASE_URL}/tasks/events", params={"last_event_id": "soon"})
+    assert response.status_code == 400
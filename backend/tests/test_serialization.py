@@ -0,0 +1,51 @@
+import json
+from datetime import datetime
+
+from tasklist3000 import serialization
+from tasklist3000.models import Task
+
+
+def make_task(task_id):
+    return Task(
+        id=task_id,
+        title=f"Task {task_id}",
+        description="Déjà vu",
+        full_text="Sample full text",
+        color="Red",
+        priority="Low",
+        status="Pending",
+    )
+
+
+def test_dumps_tasks_matches_stdlib():
+    tasks = [make_task(i) for i in range(3)]
+    expected = [serialization.serialize_task(task) for task in tasks]
+    assert json.loads(serialization.dumps_tasks(tasks)) == expected
+    assert json.loads(serialization.dumps_task(tasks[0])) == expected[0]
+
+
+def test_dumps_tasks_projects_fields():
+    tasks = [make_task(i) for i in range(2)]
+    assert json.loads(serialization.dumps_tasks(tasks, ("id", "title"))) == [
+        {"id": 0, "title": "Task 0"},
+        {"id": 1, "title": "Task 1"},
+    ]
+    assert "full_text" not in json.loads(serialization.dumps_tasks(tasks, serialization.LIST_FIELDS))[0]
+
+
+def test_stdlib_fallback(monkeypatch):
+    monkeypatch.setattr(serialization, "orjson", None)
+    tasks = [make_task(i) for i in range(3)]
+    payload = serialization.dumps_tasks(tasks)
+    assert isinstance(payload, bytes)
+    assert json.loads(payload) == [serialization.serialize_task(task) for task in tasks]
+    # Datetimes are written as ISO 8601 like orjson does
+    assert serialization.dumps({"at": datetime(2025, 1, 2, 3, 4, 5)}) == b'{"at":"2025-01-02T03:04:05"}'
+
+
+def test_iter_ndjson_chunks_lines():
+    tasks = [make_task(i) for i in range(5)]
+    chunks = list(serialization.iter_ndjson(tasks, chunk_size=2))
+    assert len(chunks) == 3
+    lines = b"".join(chunks).splitlines()
+    assert [json.loads(line)["id"] for line in lines] == list(range(5))
@@ -0,0 +1,98 @@
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+
+from tasklist3000 import crud
+from tasklist3000.models import Base, Task, create_sqlite_engine
+from tasklist3000.writequeue import WriteQueue
+
+TASK_DATA = {
+    "title": "Queued Task",
+    "description": "Queued description",
+    "full_text": "Sample full text",
+    "color": "Red",
+    "priority": "Low",
+    "status": "Pending",
+}
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_sqlite_engine(f"sqlite:///{tmp_path / 'tasks.db'}")
+    Base.metadata.create_all(bind=engine)
+    yield engine
+    engine.dispose()
+
+
+def make_queue(engine, max_batch=16, window=0.05):
+    return WriteQueue(sessionmaker(bind=engine, autoflush=False, expire_on_commit=False), max_batch, window)
+
+
+def count_commits(engine):
+    # The COMMITs SQLite itself runs; SQLAlchemy's commit event also fires when the driver has
+    # no transaction open and commits nothing
+    statements = []
+    event.listen(engine, "checkout", lambda dbapi_connection, *_: dbapi_connection.set_trace_callback(statements.append))
+    return statements
+
+
+def test_writes_within_the_window_share_one_commit(engine):
+    write_queue = make_queue(engine)
+    commits = count_commits(engine)
+    futures = [write_queue.submit(crud.stage_create_task, {**TASK_DATA, "title": f"Task {n}"}) for n in range(5)]
+    tasks = [future.result(timeout=5) for future in futures]
+    write_queue.close()
+    assert [task.title for task in tasks] == [f"Task {n}" for n in range(5)]
+    assert len({task.id for task in tasks}) == 5
+    # Each write's savepoint is released inside the one transaction
+    assert commits.count("BEGIN") == commits.count("COMMIT") == 1
+    assert (commits[0], commits[-1]) == ("BEGIN", "COMMIT")
+
+
+def test_batch_size_caps_a_group(engine):
+    write_queue = make_queue(engine, max_batch=2, window=0.05)
+    commits = count_commits(engine)
+    futures = [write_queue.submit(crud.stage_create_task, TASK_DATA) for _ in range(5)]
+    for future in futures:
+        future.result(timeout=5)
+    write_queue.close()
+    assert commits.count("COMMIT") == 3
+
+
+def create_then_fail(db, task):
+    crud.stage_create_task(db, task)
+    raise ValueError(task["title"])
+
+
+def test_failed_write_only_fails_its_caller(engine):
+    write_queue = make_queue(engine)
+    created = write_queue.submit(crud.stage_create_task, TASK_DATA)
+    failed = write_queue.submit(create_then_fail, {**TASK_DATA, "title": "Rolled back"})
+    invalid = write_queue.submit(crud.stage_create_task, {**TASK_DATA, "color": "Pink"})
+    deleted = write_queue.submit(crud.stage_delete_task, 12345)
+    updated = write_queue.submit(crud.stage_update_task, 1, {"title": "Renamed"})
+    with pytest.raises(ValueError):
+        failed.result(timeout=5)
+    assert invalid.result(timeout=5) is None
+    assert created.result(timeout=5).id == 1
+    assert deleted.result(timeout=5) is False
+    # Rows come back detached but fully loaded
+    assert updated.result(timeout=5).title == "Renamed"
+    write_queue.close()
+    with sessionmaker(bind=engine)() as db:
+        assert [task.title for task in db.query(Task)] == ["Renamed"]
+
+
+@pytest.mark.parametrize("max_batch", [0, 16])
+def test_run_commits_with_or_without_the_queue(engine, max_batch):
+    write_queue = make_queue(engine, max_batch=max_batch)
+    task = write_queue.run(crud.stage_create_task, TASK_DATA)
+    ids, errors = write_queue.run(crud.stage_create_tasks, [TASK_DATA, {**TASK_DATA, "color": "Pink"}, TASK_DATA])
+    with pytest.raises(ValueError):
+        write_queue.run(create_then_fail, {**TASK_DATA, "title": "Rolled back"})
+    write_queue.close()
+    assert task.title == TASK_DATA["title"]
+    assert ids == [task.id + 1, None, task.id + 2]
+    assert list(errors) == [1]
+    with sessionmaker(bind=engine)() as db:
+        assert db.query(Task).count() == 3
@@ -5,5 +5,6 @@ export interface Task {
 	status: string;
 	priority: string;
 	color: string;
-	full_text: string;
+	// Left out of list responses; load the single task to get it
+	full_text?: string;
 }